@@ -9,23 +9,28 @@ logger = logger.get_logger(__name__)
 def main():
     config_mgr = ConfigManager()
     biometric_template = BiometricTemplateGenerator(config_mgr=config_mgr)
-    audio_input = InputPipeline(config=config_mgr, voice_template=biometric_template)
-
-    while True:
-        logger.debug('='*60)
-        try:
-            audio = audio_input.get_command()
-        except err.TemplateLoadError:
-            template_audio = audio_input.get_template_audio()
-            biometric_template.get_new_template(template_audio)
-            del template_audio
-            continue
-
-        command = audio_input.transcribe_audio(audio=audio)
-        logger.info(command)
-
-        run_command(command=command)
-    
+    audio_input = InputPipeline(config=config_mgr, voice_template=biometric_template,
+                                on_partial_transcript=lambda text: logger.debug(f"Partial: {text}"))
+
+    try:
+        while True:
+            logger.debug('='*60)
+            try:
+                audio = audio_input.get_command()
+            except err.TemplateLoadError:
+                template_audio = audio_input.get_template_audio()
+                biometric_template.get_new_template(template_audio)
+                del template_audio
+                continue
+
+            command = audio_input.transcribe_command(audio=audio)
+            logger.info(command)
+
+            run_command(command=command)
+    finally:
+        audio_input.close()
+        biometric_template.close()
+
 
 if __name__ == "__main__":
     main()
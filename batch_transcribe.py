@@ -0,0 +1,48 @@
+import argparse
+from config.input_pipe_config import ASRProfile, AudioConfig, VADConfig, WhisperModelConfig
+from core.batch_transcriber import BatchTranscriber, collect_inputs
+from core.transcription_pool import TranscriptionWorkerPool
+from utility import logger
+
+logger = logger.get_logger(__name__)
+
+def main(argv: list[str] | None = None) -> None:
+    model_config = WhisperModelConfig()
+    profile = model_config.command_profile
+
+    parser = argparse.ArgumentParser(description="Transcribe a directory or manifest of WAV files into a JSONL file.")
+    parser.add_argument('input', help="Directory of WAV files, or a manifest with one path (or JSON object with a \"path\") per line")
+    parser.add_argument('output', help="JSONL file to write, existing results are kept and skipped")
+    parser.add_argument('--workers', type=int, default=2, help="Transcription worker processes")
+    parser.add_argument('--prepare-threads', type=int, default=4, help="Threads that load and trim audio")
+    parser.add_argument('--model', default=profile.model_size, help="Whisper model size")
+    parser.add_argument('--beam-size', type=int, default=profile.beam_size)
+    parser.add_argument('--language', default=profile.language, help="Skip language detection")
+    parser.add_argument('--no-trim', action='store_true', help="Transcribe whole files without VAD trimming")
+    parser.add_argument('--overwrite', action='store_true', help="Start over instead of resuming")
+    args = parser.parse_args(argv)
+
+    paths = collect_inputs(args.input)
+    logger.info(f"Found {len(paths)} audio files")
+
+    profile = ASRProfile(model_size=args.model, beam_size=args.beam_size, temperature=profile.temperature, language=args.language)
+    sample_rate = AudioConfig(duration=0).sample_rate
+    with TranscriptionWorkerPool(processes=args.workers,
+                                 model_sizes=(profile.model_size,),
+                                 device=model_config.device,
+                                 compute_type=model_config.compute_type,
+                                 sample_rate=sample_rate,
+                                 task_timeout=model_config.worker_task_timeout) as pool:
+        transcriber = BatchTranscriber(pool=pool,
+                                       profile=profile,
+                                       sample_rate=sample_rate,
+                                       vad_config=None if args.no_trim else VADConfig(),
+                                       prepare_threads=args.prepare_threads)
+        summary = transcriber.run(paths, args.output, resume=not args.overwrite)
+
+    print(f"{summary.files} transcribed, {summary.skipped} skipped, {summary.failed} failed, "
+          f"{summary.audio_seconds:.0f}s of audio in {summary.wall_seconds:.0f}s ({summary.realtime_factor:.1f}x realtime)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+from config.config_manager import ConfigManager
+from core.bulk_enrollment import BulkEnroller, read_enrollment_manifest
+from core.template_generator import BiometricTemplateGenerator
+from utility.wake_word import KeywordSpotter, create_wake_word_detector
+from utility import logger
+
+logger = logger.get_logger(__name__)
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Enroll many users from recorded WAV files without prompting.")
+    parser.add_argument('manifest', help="One \"username path\" per line, or JSON objects with a \"username\" and a \"path\" or \"paths\"")
+    parser.add_argument('--batch-partials', type=int, default=256, help="1.6s windows run through the encoder per call")
+    parser.add_argument('--prepare-threads', type=int, default=4, help="Threads that load, trim and cut the audio")
+    parser.add_argument('--no-trim', action='store_true', help="Embed whole files without VAD trimming")
+    parser.add_argument('--skip-existing', action='store_true', help="Keep the templates of users that are already enrolled")
+    parser.add_argument('--dry-run', action='store_true', help="Compute the templates without saving them")
+    args = parser.parse_args(argv)
+
+    entries = read_enrollment_manifest(args.manifest)
+    config_mgr = ConfigManager(load_models=False) # Enrollment only needs the speaker encoder
+    biometric_template = BiometricTemplateGenerator(config_mgr=config_mgr)
+    try:
+        if args.skip_existing:
+            entries = [entry for entry in entries if not biometric_template.is_enrolled(entry.username)]
+        logger.info(f"Enrolling {len(entries)} users from {sum(len(entry.paths) for entry in entries)} clips")
+
+        wake_word_detector = create_wake_word_detector(config_mgr)
+        keyword_spotter = wake_word_detector if isinstance(wake_word_detector, KeywordSpotter) else None
+        enroller = BulkEnroller(encoder=biometric_template.encoder,
+                                vad_config=None if args.no_trim else config_mgr.vad_config,
+                                normalizing_peak=config_mgr.filter_config.normalizing_peak,
+                                batch_partials=args.batch_partials,
+                                prepare_threads=args.prepare_threads,
+                                keyword_spotter=keyword_spotter)
+        templates, summary = enroller.run(entries)
+        if templates and not args.dry_run:
+            biometric_template.enroll(templates)
+        if enroller.keyword_templates and not args.dry_run:
+            keyword_spotter.add_templates(enroller.keyword_templates)
+    finally:
+        biometric_template.close()
+
+    enrolled = "would be enrolled (dry run, nothing saved)" if args.dry_run else "enrolled"
+    print(f"{summary.users} users {enrolled}, {summary.failed_users} failed, {summary.failed_clips} of {summary.clips} clips skipped, "
+          f"{summary.audio_seconds:.0f}s of audio in {summary.wall_seconds:.0f}s ({summary.users_per_minute:.0f} users/min)")
+
+
+if __name__ == "__main__":
+    main()
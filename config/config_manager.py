@@ -4,10 +4,13 @@ import utility.errors as err
 
 class ConfigManager:
 
-    def __init__(self):
+    def __init__(self, load_models: bool = True):
+        """With load_models=False no Whisper model is loaded, for tools that do not transcribe."""
         self.basic_info = config.BasicInfo()
 
         self.vad_config = config.VADConfig()
+        self.endpoint_config = config.EndpointConfig()
+        self.wake_word_config = config.WakeWordConfig()
         
         audio_chunk_duration = (self.vad_config.frame_duration_ms / 1000) * 16 # Rcord chunks 16 times the size of the frames used in vad, 1000ms = 1s
         self.audio_config = config.AudioConfig(duration=audio_chunk_duration)
@@ -15,18 +18,25 @@ class ConfigManager:
         self.filter_config = config.FilterConfig()
         
         self.model_config = config.WhisperModelConfig()
-        self.model_config.model_sm = self.load_model()
+        if load_models and self.model_config.worker_processes == 0: # Otherwise every worker process loads its own models
+            self.load_model(self.model_config.wake_profile)
+            self.load_model(self.model_config.command_profile)
 
         self.biometric_config = config.VoiceBiometricConfig()
 
-    def load_model(self):
+    def load_model(self, profile: config.ASRProfile) -> WhisperModel:
+        """Loads the model a profile uses, profiles with the same model size share one instance."""
+        if profile.model_size in self.model_config.models:
+            return self.model_config.models[profile.model_size]
+
         try:
             model = WhisperModel(
-                self.model_config.model_size,
+                profile.model_size,
                 device=self.model_config.device,
                 compute_type=self.model_config.compute_type
             )
-            print("Model Loaded.")
+            self.model_config.models[profile.model_size] = model
+            print(f"Model Loaded: {profile.model_size}")
             return model
         except Exception as e:
             raise err.ModelLoadError("Failed to load model!") from e
\ No newline at end of file
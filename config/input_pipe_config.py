@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from math import ceil
 import os
 import sys
@@ -39,26 +39,62 @@ class AudioConfig:
     duration: int
     sample_rate: int = 16_000
     channels: int = 1
-    dtype: str = 'float32'
+    dtype: str = 'int16' # Captured straight into the int16 frames webrtcvad consumes
+    ring_buffer_duration: float = 5.0 # seconds of audio the capture ring buffer can hold
+    utterance_buffer_duration: float = 10.0 # initial seconds of speech the utterance buffer holds before growing
+    source: str = 'microphone' # 'microphone' or 'replay'
+    replay_path: str = '' # WAV file or directory of WAV files for the replay source
+    replay_realtime: bool = True # False replays as fast as the pipeline consumes
 
 @dataclass
 class FilterConfig:
     low_cutoff: int = 300
     high_cutoff: int = 3_400
+    order: int = 1 # Butterworth order of the band-pass filter
+
+    noise_suppression: bool = False # Spectral gating after the band-pass filter
+    noise_frame_ms: int = 30 # STFT frame length, the hop is half of it and must divide the chunk
+    noise_threshold: float = 1.5 # Bins below threshold * noise floor get attenuated
+    noise_gain_floor: float = 0.1 # Strongest attenuation applied to a bin
+    noise_smoothing: float = 0.95 # How slowly the noise floor rises, from 0 to 1
     normalizing_peak = 0.95
 
 
+@dataclass
+class ASRProfile:
+    model_size: str = 'small'
+    beam_size: int = 5
+    temperature: float | tuple[float, ...] = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0) # Fallback temperatures, a single value disables fallback
+    language: str | None = None # None detects the language on every decode
+
+
 @dataclass
 class WhisperModelConfig:
-    model_size:str = 'small'
     device:str = 'cpu'
     compute_type:str = 'int8'
-    beam_size: int = 5
-    model_sm :WhisperModel | None = None
+    # Most VAD triggers are not the wake word, so the wake check gets a tiny greedy decode
+    wake_profile: ASRProfile = field(default_factory=lambda: ASRProfile(model_size='tiny', beam_size=1, temperature=0.0, language='en'))
+    command_profile: ASRProfile = field(default_factory=ASRProfile)
+    reuse_wake_transcript: bool = True # Keep the words decoded by the wake check instead of decoding them again
+    reuse_margin: float = 0.3 # seconds before the end of the wake check audio that are always decoded again
+    reuse_min_probability: float = 0.8 # Words of a wake decode with another profile are kept only up to the first less likely one
+    streaming: bool = False # Re-decode the command while it is spoken, only the tail is left for the endpoint
+    streaming_interval: float = 1.0 # seconds of new speech between streaming decodes
+    streaming_margin: float = 0.3 # Words ending this close to the end of the audio are never committed
+    worker_processes: int = 0 # Decode in this many worker processes, 0 decodes in the capture process
+    worker_task_timeout: float = 60.0 # seconds before a stuck worker is restarted
+    models: dict[str, WhisperModel] = field(default_factory=dict) # Loaded models by size, shared between profiles
+
+    def model_for(self, profile: ASRProfile) -> WhisperModel:
+        model = self.models.get(profile.model_size)
+        if model is None:
+            raise KeyError(f"Whisper model '{profile.model_size}' is not loaded.")
+        return model
 
 
 @dataclass
 class VADConfig:
+    backend: str = 'webrtc' # 'webrtc' or 'spectral'
     aggressiveness:int = 3
     sample_rate: int = 16_000
     frame_duration_ms = 30
@@ -67,6 +103,39 @@ class VADConfig:
 
     check_wake_after_frames = 15
 
+    energy_gate: bool = True # Skip webrtcvad on frames that are obviously silent
+    gate_threshold_db: float = 6.0 # Frames must be this far above the noise floor to reach webrtcvad
+    gate_min_dbfs: float = -60.0 # Lowest noise floor the gate assumes, relative to int16 full scale
+    gate_smoothing: float = 0.95 # How slowly the noise floor rises, from 0 to 1
+
+    # Spectral backend
+    spectral_low_hz: int = 300
+    spectral_high_hz: int = 3_400
+    spectral_energy_db: float = 3.0 # Speech-band energy above the noise spectrum that counts as speech
+    spectral_flux_db: float = 6.0 # Mean log-spectral rise over the previous frame that counts as an onset
+    spectral_hangover_frames: int = 4 # Frames kept as speech after the last detected speech frame
+    spectral_noise_smoothing: float = 0.95 # How slowly the noise spectrum rises, from 0 to 1
+
+@dataclass
+class EndpointConfig:
+    adaptive: bool = True # False always waits VADConfig.silence_counter_max frames
+    min_silence_ms: int = 300 # Shortest trailing silence that ends a command
+    command_silence_ms: int = 150 # Trailing silence once the transcript already holds a known command
+    short_utterance_ms: int = 1_200 # Below this much speech (the wake word alone) the full timeout is kept
+    pause_factor: float = 1.5 # Trailing silence must beat this multiple of the mean mid-utterance pause
+    noise_reference_dbfs: float = -50.0 # Noise floors above this level add extra silence
+    noise_margin_ms_per_db: float = 10.0
+
+@dataclass
+class WakeWordConfig:
+    engine: str = 'transcript' # 'transcript' fuzzy matches the Whisper transcript, 'keyword' spots the enrolled wake word without ASR
+    threshold: float = 0.25 # Highest mean cosine distance to an enrollment utterance that counts as the wake word, untuned, see KeywordSpotter.last_score
+    n_mfcc: int = 13
+    n_mels: int = 26
+    frame_ms: int = 25
+    hop_ms: int = 10
+    template_file: str = 'keyword_templates.enc' # Encrypted enrollment features in the user data directory
+
 @dataclass
 class VoiceBiometricConfig:
     audio_sample_required: int = 3
@@ -74,6 +143,21 @@ class VoiceBiometricConfig:
     encrypt_key_length = 256
     nonce_bytes = 12 # generates a 12 nonce | AES-GCM standadizes a 12 byte nonce
     update_weight = 0.2 # from a scale from 0 to 1
+    speaker_index: bool = False # Approximate search for large enrolled populations
+    index_min_users: int = 2_000 # Below this many users the exact search is used
+    index_lists: int = 0 # k-means clusters the users are split into, 0 uses the square root of the user count
+    index_probe: int = 8 # Clusters searched per match, more is slower but finds more true matches
+    index_file: str = 'speaker_index.enc' # Encrypted cluster centroids in the user data directory
+    encoder_backend: str = 'torch' # 'torch' runs resemblyzer as is, 'torchscript' or 'onnx' run an exported graph
+    encoder_quantize: bool = False # int8 weights for everything after the first LSTM layer
+    encoder_threads: int = 0 # Intra-op threads for the encoder, 0 keeps the runtime's default
+    encoder_warmup: bool = True # Embeds a probe at startup so the first wake up does not pay for lazy initialization
+    encoder_min_similarity: float = 0.95 # An export must agree with resemblyzer at least this much to be used
+    encoder_dir: str = 'speaker_encoder' # Exported graphs in the user data directory
+    store_file: str = 'biometric_templates.store' # Every user's template, replaces the per-user .enc files
+    store_compact_ratio: float = 1.0 # Superseded bytes per live byte before the store is rewritten
+    store_decrypt_threads: int = 4 # Threads decrypting templates at startup
+    store_flush_interval: float = 5.0 # Seconds rolling template updates stay in memory before they are written
 
     def get_file_name(self, username: str) -> str:
         return f"biometric_template_{username}.enc"
@@ -2,6 +2,8 @@
 import datetime
 import subprocess
 
+# Phrases run_command understands, the endpointer ends an utterance early once one is heard
+COMMANDS = ("open browser", "open code", "show time", "open spotify", "play music")
 
 def run_command(command: str) -> None:
     command = command.lower()
@@ -0,0 +1,243 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+import json
+import os
+import time
+import numpy as np
+from config.input_pipe_config import ASRProfile, VADConfig
+from core.transcription import TranscriptionResult
+from core.transcription_pool import TranscriptionWorkerPool
+from utility.audio_filtration import float32_to_pcm16
+from utility.audio_source import load_wav
+from utility.VAD import create_vad_backend
+from utility.logger import get_logger
+import utility.errors as err
+
+logger = get_logger(__name__)
+
+AUDIO_EXTENSIONS = ('.wav',)
+
+def collect_inputs(path: str) -> list[str]:
+    """
+    Audio files to transcribe: every WAV file below a directory, or the entries of a manifest.
+
+    A manifest is either a text file with one path per line or a JSONL file
+    with a "path" field per line. Relative paths are relative to the manifest.
+    """
+    if os.path.isdir(path):
+        return sorted(os.path.join(root, name)
+                      for root, _, names in os.walk(path)
+                      for name in names if name.lower().endswith(AUDIO_EXTENSIONS))
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    paths = []
+    try:
+        with open(path, 'r', encoding='utf-8') as manifest:
+            for line in manifest:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                entry = json.loads(line)['path'] if line.startswith('{') else line
+                paths.append(os.path.join(base_dir, entry))
+    except (OSError, json.JSONDecodeError, KeyError) as e:
+        raise err.FileAccessError(f"Could not read manifest {path}") from e
+    return paths
+
+
+def completed_paths(output_path: str) -> set[str]:
+    """Paths that already have a successful result in output_path, a torn last line is ignored."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path, 'r', encoding='utf-8') as output:
+        for line in output:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'error' not in record:
+                done.add(record['path'])
+    return done
+
+
+def _ends_with_newline(path: str) -> bool:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return True
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def speech_bounds(audio: np.ndarray, sample_rate: int, vad_config: VADConfig, padding_ms: int = 200) -> tuple[int, int]:
+    """Sample range from the first to the last speech frame plus padding, (0, 0) when there is no speech."""
+    frame_samples = int(sample_rate * vad_config.frame_duration_ms / 1000)
+    n_frames = len(audio) // frame_samples
+    if n_frames == 0:
+        return 0, 0
+
+    pcm = float32_to_pcm16(audio[:n_frames * frame_samples])
+    speech = np.flatnonzero(create_vad_backend(vad_config).is_speech_batch(pcm.reshape(n_frames, frame_samples)))
+    if len(speech) == 0:
+        return 0, 0
+
+    padding = int(sample_rate * padding_ms / 1000)
+    return max(0, speech[0] * frame_samples - padding), min(len(audio), (speech[-1] + 1) * frame_samples + padding)
+
+
+@dataclass
+class PreparedAudio:
+    path: str
+    audio: np.ndarray | None
+    duration: float
+    speech_start: float
+    speech_duration: float
+    load_ms: float
+    trim_ms: float
+    error: str | None = None
+
+
+@dataclass
+class BatchSummary:
+    files: int = 0
+    skipped: int = 0
+    failed: int = 0
+    audio_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @property
+    def realtime_factor(self) -> float:
+        """Seconds of audio transcribed per second of wall time."""
+        return self.audio_seconds / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+
+class BatchTranscriber:
+    """
+    Transcribes many audio files with the worker pool and appends one JSON line per file.
+
+    Loading, resampling and VAD trimming run on prepare_threads threads while
+    earlier files are decoded in the worker processes. At most max_in_flight
+    files are held in memory at once. Lines are flushed as soon as a file is
+    done, so an interrupted run resumes from completed_paths(). Files that
+    failed are tried again on the next run.
+    """
+
+    def __init__(self, pool: TranscriptionWorkerPool, profile: ASRProfile, sample_rate: int,
+                 vad_config: VADConfig | None = None, prepare_threads: int = 4, max_in_flight: int | None = None):
+        self._pool = pool
+        self._profile = profile
+        self._sample_rate = sample_rate
+        self._vad_config = vad_config
+        self._prepare_threads = prepare_threads
+        self._max_in_flight = max_in_flight or 4 * pool.processes
+
+    def run(self, paths: list[str], output_path: str, resume: bool = True) -> BatchSummary:
+        summary = BatchSummary()
+        done = completed_paths(output_path) if resume else set()
+        remaining = [path for path in paths if path not in done]
+        summary.skipped = len(paths) - len(remaining)
+        todo = iter(remaining)
+        if summary.skipped:
+            logger.info(f"Resuming, {summary.skipped} files already transcribed")
+
+        if resume and not _ends_with_newline(output_path): # Interrupted mid-line, keep the next record on its own line
+            with open(output_path, 'a', encoding='utf-8') as output:
+                output.write('\n')
+
+        started = time.perf_counter()
+        preparing: deque[Future] = deque()
+        transcribing: dict[Future, tuple[PreparedAudio, float]] = {}
+
+        with ThreadPoolExecutor(max_workers=self._prepare_threads, thread_name_prefix='BatchPrepare') as executor, \
+             open(output_path, 'a' if resume else 'w', encoding='utf-8') as output:
+
+            def write(record: dict) -> None:
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                output.flush()
+
+            while True:
+                while len(preparing) + len(transcribing) < self._max_in_flight:
+                    path = next(todo, None)
+                    if path is None:
+                        break
+                    preparing.append(executor.submit(self._prepare, path))
+
+                if not preparing and not transcribing:
+                    break
+                # Only the oldest file can be handed on, waiting on later ones would spin
+                oldest = [preparing[0]] if preparing else []
+                wait([*oldest, *transcribing], return_when=FIRST_COMPLETED)
+
+                while preparing and preparing[0].done(): # Handed to the pool in input order
+                    prepared = preparing.popleft().result()
+                    summary.files += 1
+                    summary.audio_seconds += prepared.duration
+                    if prepared.error is not None:
+                        summary.failed += 1
+                        write({'path': prepared.path, 'error': prepared.error})
+                    elif prepared.speech_duration == 0: # Nothing for Whisper to hallucinate on
+                        write(self._record(prepared, None, 0.0))
+                    else:
+                        future = self._pool.submit(prepared.audio, self._profile, offset=prepared.speech_start)
+                        transcribing[future] = (prepared, time.perf_counter())
+                        prepared.audio = None # The pool holds its own copy
+
+                for future in [future for future in transcribing if future.done()]:
+                    prepared, submitted = transcribing.pop(future)
+                    transcribe_ms = (time.perf_counter() - submitted) * 1000
+                    try:
+                        write(self._record(prepared, future.result(), transcribe_ms))
+                    except err.InputPipelineError as e:
+                        summary.failed += 1
+                        write({'path': prepared.path, 'error': str(e)})
+
+        summary.wall_seconds = time.perf_counter() - started
+        logger.info(f"Transcribed {summary.files} files ({summary.failed} failed) at {summary.realtime_factor:.1f}x realtime")
+        return summary
+
+    def _prepare(self, path: str) -> PreparedAudio:
+        """Loads and trims one file. Any failure is returned as the file's error, one bad file never ends the run."""
+        try:
+            return self._load_and_trim(path)
+        except err.InvalidAudioError as e:
+            error = f"{e}: {e.__cause__}"
+        except Exception as e:
+            logger.error(f"Unexpected error while preparing {path}: {e}")
+            error = f"{type(e).__name__}: {e}"
+        return PreparedAudio(path=path, audio=None, duration=0.0, speech_start=0.0, speech_duration=0.0,
+                             load_ms=0.0, trim_ms=0.0, error=error)
+
+    def _load_and_trim(self, path: str) -> PreparedAudio:
+        start = time.perf_counter()
+        audio = load_wav(path, sample_rate=self._sample_rate)
+        loaded = time.perf_counter()
+
+        begin, end = 0, len(audio)
+        if self._vad_config is not None:
+            begin, end = speech_bounds(audio, self._sample_rate, self._vad_config)
+
+        return PreparedAudio(path=path,
+                             audio=audio[begin:end],
+                             duration=len(audio) / self._sample_rate,
+                             speech_start=begin / self._sample_rate,
+                             speech_duration=(end - begin) / self._sample_rate,
+                             load_ms=(loaded - start) * 1000,
+                             trim_ms=(time.perf_counter() - loaded) * 1000)
+
+    def _record(self, prepared: PreparedAudio, result: TranscriptionResult | None, transcribe_ms: float) -> dict:
+        record = {
+            'path': prepared.path,
+            'text': result.text.strip() if result is not None else '',
+            'language': result.language if result is not None else None,
+            'duration_s': round(prepared.duration, 3),
+            'speech_s': round(prepared.speech_duration, 3),
+            'load_ms': round(prepared.load_ms, 1),
+            'trim_ms': round(prepared.trim_ms, 1),
+            'transcribe_ms': round(transcribe_ms, 1),
+            'segments': [],
+        }
+        if result is not None:
+            record['segments'] = [{'start': round(segment.start, 2), 'end': round(segment.end, 2), 'text': segment.text}
+                                  for segment in result.segments]
+        return record
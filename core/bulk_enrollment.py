@@ -0,0 +1,204 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+import json
+import os
+import time
+import numpy as np
+from config.input_pipe_config import VADConfig
+from core.batch_transcriber import speech_bounds
+from core.speaker_encoder import SAMPLE_RATE, SpeakerEncoder, partial_mels
+from utility.audio_filtration import normalize_audio
+from utility.audio_source import load_wav
+from utility.logger import get_logger
+from utility.wake_word import KeywordSpotter
+import utility.errors as err
+
+logger = get_logger(__name__)
+
+@dataclass
+class EnrollmentEntry:
+    username: str
+    paths: list[str]
+
+
+def read_enrollment_manifest(path: str) -> list[EnrollmentEntry]:
+    """
+    Users and their enrollment clips from a manifest, in the order they first appear.
+
+    Each line is either a JSON object with a "username" and a "path" or a list
+    of "paths", or plain text "username path". A user may appear on several
+    lines. Relative paths are relative to the manifest.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    entries: dict[str, EnrollmentEntry] = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as manifest:
+            for number, line in enumerate(manifest, start=1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if line.startswith('{'):
+                    record = json.loads(line)
+                    username = record['username']
+                    paths = record['paths'] if 'paths' in record else [record['path']]
+                else:
+                    fields = line.split(maxsplit=1)
+                    if len(fields) != 2:
+                        raise ValueError(f"line {number} needs a username and a path")
+                    username, paths = fields[0], [fields[1]]
+
+                username = username.strip()
+                if not username:
+                    raise ValueError(f"line {number} has no username")
+                entry = entries.setdefault(username, EnrollmentEntry(username=username, paths=[]))
+                entry.paths.extend(os.path.join(base_dir, clip) for clip in paths)
+    except (OSError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        raise err.FileAccessError(f"Could not read enrollment manifest {path}: {e}") from e
+    return list(entries.values())
+
+
+@dataclass
+class PreparedClip:
+    path: str
+    mels: np.ndarray | None # (n_partials, PARTIAL_FRAMES, MEL_CHANNELS)
+    duration: float
+    error: str | None = None
+    audio: np.ndarray | None = None # Trimmed and normalized, only kept for keyword enrollment
+
+
+@dataclass
+class EnrollmentSummary:
+    users: int = 0
+    failed_users: int = 0
+    clips: int = 0
+    failed_clips: int = 0
+    partials: int = 0
+    keyword_templates: int = 0
+    batches: int = 0
+    audio_seconds: float = 0.0
+    embed_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @property
+    def users_per_minute(self) -> float:
+        return 60 * self.users / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+
+class BulkEnroller:
+    """
+    Computes speaker templates for many users from recorded clips.
+
+    Clips are loaded, VAD trimmed, peak normalized like live enrollment audio
+    and cut into mel partials on prepare_threads threads. The partials of
+    consecutive clips, across users, are stacked into batches of about
+    batch_partials and run through the encoder in one call each. A clip's
+    embedding is the normalized mean of its partials, the same as
+    SpeakerEncoder.embed_utterance, and a user's template the normalized mean
+    of their clip embeddings. At most max_in_flight clips are held in memory.
+
+    With a keyword_spotter, the MFCC features of every usable clip are kept in
+    keyword_templates as well, ready for keyword_spotter.add_templates().
+    """
+
+    def __init__(self, encoder: SpeakerEncoder, vad_config: VADConfig | None = None, normalizing_peak: float = 0.95,
+                 batch_partials: int = 256, prepare_threads: int = 4, max_in_flight: int | None = None,
+                 keyword_spotter: KeywordSpotter | None = None):
+        self._encoder = encoder
+        self._vad_config = vad_config
+        self._normalizing_peak = normalizing_peak
+        self._batch_partials = batch_partials
+        self._prepare_threads = prepare_threads
+        self._max_in_flight = max_in_flight or max(64, 4 * prepare_threads)
+        self._keyword_spotter = keyword_spotter
+        self.keyword_templates: list[np.ndarray] = []
+
+    def run(self, entries: list[EnrollmentEntry]) -> tuple[dict[str, np.ndarray], EnrollmentSummary]:
+        """Templates of every user with at least one usable clip, and what it took to compute them."""
+        summary = EnrollmentSummary()
+        self.keyword_templates = []
+        started = time.perf_counter()
+        clips = [(entry.username, path) for entry in entries for path in entry.paths]
+        embeddings: dict[str, list[np.ndarray]] = {entry.username: [] for entry in entries}
+
+        batch: list[tuple[str, np.ndarray]] = []
+        batch_size = 0
+
+        def embed_batch() -> None:
+            nonlocal batch, batch_size
+            embed_start = time.perf_counter()
+            partials = self._encoder.embed_partials(np.concatenate([mels for _, mels in batch]))
+            summary.embed_seconds += time.perf_counter() - embed_start
+            summary.batches += 1
+
+            offset = 0
+            for username, mels in batch:
+                embedding = partials[offset:offset + len(mels)].mean(axis=0)
+                embeddings[username].append(embedding / np.linalg.norm(embedding))
+                offset += len(mels)
+            batch, batch_size = [], 0
+
+        todo = iter(clips)
+        preparing: deque[tuple[str, Future]] = deque()
+        with ThreadPoolExecutor(max_workers=self._prepare_threads, thread_name_prefix='EnrollPrepare') as executor:
+            while True:
+                while len(preparing) < self._max_in_flight:
+                    clip = next(todo, None)
+                    if clip is None:
+                        break
+                    preparing.append((clip[0], executor.submit(self._prepare, clip[1])))
+                if not preparing:
+                    break
+
+                username, future = preparing.popleft()
+                prepared = future.result()
+                summary.clips += 1
+                summary.audio_seconds += prepared.duration
+                if prepared.error is not None:
+                    summary.failed_clips += 1
+                    logger.warning(f"Skipping {prepared.path} of {username}: {prepared.error}")
+                    continue
+
+                if self._keyword_spotter is not None: # On this thread, the spotter's extractor keeps state
+                    self.keyword_templates.append(self._keyword_spotter.features(prepared.audio))
+                    summary.keyword_templates += 1
+                batch.append((username, prepared.mels))
+                batch_size += len(prepared.mels)
+                summary.partials += len(prepared.mels)
+                if batch_size >= self._batch_partials:
+                    embed_batch()
+
+        if batch:
+            embed_batch()
+
+        templates = {}
+        for username, clip_embeddings in embeddings.items():
+            if not clip_embeddings:
+                summary.failed_users += 1
+                logger.error(f"No usable clip for {username}, not enrolled")
+                continue
+            template = np.mean(np.stack(clip_embeddings), axis=0)
+            templates[username] = (template / np.linalg.norm(template)).astype(np.float32)
+        summary.users = len(templates)
+
+        summary.wall_seconds = time.perf_counter() - started
+        logger.info(f"Computed {summary.users} templates from {summary.clips} clips in {summary.batches} batches, "
+                    f"{summary.embed_seconds:.1f}s of {summary.wall_seconds:.1f}s spent in the encoder")
+        return templates, summary
+
+    def _prepare(self, path: str) -> PreparedClip:
+        try:
+            audio = load_wav(path, sample_rate=SAMPLE_RATE)
+        except err.InvalidAudioError as e:
+            return PreparedClip(path=path, mels=None, duration=0.0, error=f"{e}: {e.__cause__}")
+        duration = len(audio) / SAMPLE_RATE
+
+        if self._vad_config is not None:
+            begin, end = speech_bounds(audio, SAMPLE_RATE, self._vad_config)
+            audio = audio[begin:end]
+        if len(audio) == 0 or not np.any(audio):
+            return PreparedClip(path=path, mels=None, duration=duration, error="no speech")
+
+        audio = normalize_audio(audio=audio, target_peak=self._normalizing_peak).astype(np.float32)
+        return PreparedClip(path=path, mels=partial_mels(audio), duration=duration,
+                            audio=audio if self._keyword_spotter is not None else None)
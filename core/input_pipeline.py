@@ -1,125 +1,387 @@
 # Library
 import sys
-import sounddevice as sd
 import numpy as np
-from threading import Thread, Event, enumerate as thread_enumerate
-import queue
+from concurrent.futures import Future
+from threading import Thread, Event, Condition, enumerate as thread_enumerate
+from typing import Callable
 
 # Local
-from utility.VAD import SpeechVAD
-from core.template_generator import BiometricTemplateGenerator
-import stubs.wake_up_detection as wud
+from utility.VAD import EnergyGate, create_vad_backend
+from core.template_generator import BiometricTemplateGenerator, SpeakerMatch
 from config.config_manager import ConfigManager
+from config.input_pipe_config import ASRProfile
 from utility.logger import get_logger
 import utility.errors as err
-from utility.thread_manager import ThreadManager, ThreadStatus
-from utility.audio_filtration import normalize_audio, bandpass_filter, filter_audio
+from utility.thread_manager import ThreadManager
+from utility.audio_filtration import normalize_audio, StreamingBandpassFilter, SpectralNoiseSuppressor, pcm16_to_float32, float32_to_pcm16
+from utility.ring_buffer import AudioRingBuffer
+from utility.audio_source import AudioSource, create_audio_source
+from utility.utterance_buffer import UtteranceBuffer
+from utility.endpointing import Endpointer
+from utility.wake_word import WakeWordDetector, TranscriptWakeWordDetector, create_wake_word_detector
+from core.assistant import COMMANDS
+from core.transcription import TranscriptionResult, StreamingTranscriber, transcribe, committed_prefix
+from core.transcription_pool import TranscriptionWorkerPool
 
 class WakeUpChecks:
+    """
+    Wake word and speaker check results of one utterance.
+
+    Both checks run on their own executor and report here as they finish. The
+    first failure decides the outcome and cancels the check that has not
+    started yet, wait() returns once a check failed or both passed.
+    """
+
     def __init__(self):
         self.wake_up: bool = False
         self.biometric_pass: bool = False
+        self.transcript: str = ''
+        self.transcription: TranscriptionResult | None = None
+        self.speaker_match: SpeakerMatch | None = None
+        self.cancelled: bool = False
+        self._wake_done = False
+        self._biometric_done = False
+        self._futures: list[Future] = []
+        self._cond = Condition()
+
+    @property
+    def wake_failed(self) -> bool:
+        return self._wake_done and not self.wake_up
+
+    @property
+    def speaker_failed(self) -> bool:
+        return self._biometric_done and not self.biometric_pass
+
+    @property
+    def failed(self) -> bool:
+        return self.wake_failed or self.speaker_failed
+
+    @property
+    def done(self) -> bool:
+        return self.failed or (self._wake_done and self._biometric_done)
+
+    @property
+    def passed(self) -> bool:
+        return self.done and not self.failed
+
+    def track(self, future: Future) -> None:
+        with self._cond:
+            self._futures.append(future)
+            if self.failed:
+                future.cancel()
+
+    def set_wake_up(self, wake_up: bool, transcription: TranscriptionResult | None = None) -> None:
+        with self._cond:
+            if transcription is not None:
+                self.transcription = transcription
+                self.transcript = transcription.text
+            self.wake_up = wake_up
+            self._wake_done = True
+            self._settle()
+
+    def set_speaker(self, match: SpeakerMatch | None) -> None:
+        with self._cond:
+            self.speaker_match = match
+            self.biometric_pass = match is not None
+            self._biometric_done = True
+            self._settle()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Blocks until the outcome is known, returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.done, timeout=timeout)
+
+    def cancel(self) -> None:
+        """Drops the checks of a superseded utterance, one that already runs skips its work if it can."""
+        with self._cond:
+            self.cancelled = True
+            for future in self._futures:
+                future.cancel()
+
+    def _settle(self) -> None:
+        # Caller must hold self._cond
+        if self.failed:
+            for future in self._futures: # A check that already runs finishes, its result is ignored
+                future.cancel()
+        self._cond.notify_all()
 
 logger = get_logger(__name__)
 
 class InputPipeline:
     _STREAM_THREAD_NAME = 'AudioStreamThread'
+    _TRANSCRIBE_THREAD_NAME = 'StreamingTranscriptionThread'
+    _WAKE_POOL_NAME = 'WakeCheck'
+    _SPEAKER_POOL_NAME = 'SpeakerCheck'
+    _CHECK_QUEUE_LIMIT = 2 # Checks of older utterances are cancelled, a longer queue means the pool is stuck
 
-    def __init__(self, config:ConfigManager, voice_template: BiometricTemplateGenerator):
+    def __init__(self, config:ConfigManager, voice_template: BiometricTemplateGenerator, audio_source: AudioSource | None = None,
+                 on_partial_transcript: Callable[[str], None] | None = None):
         self._config = config
-        self.queue = queue.Queue()
+        self.audio_source = audio_source if audio_source is not None else create_audio_source(config.audio_config)
+        sample_rate = config.audio_config.sample_rate
+        self.ring_buffer = AudioRingBuffer(capacity=int(sample_rate * config.audio_config.ring_buffer_duration),
+                                           dtype=np.int16)
+
+        # Every chunk is read into these reused buffers. The int16 chunk is the canonical
+        # frame format, the float32 one only exists for filtering.
+        chunk_samples = int(sample_rate * config.audio_config.duration)
+        self._chunk = np.zeros(chunk_samples, dtype=np.int16)
+        self._chunk_bytes = memoryview(self._chunk).cast('B')
+        self._float_chunk = np.zeros(chunk_samples, dtype=np.float32)
+        self.utterance = UtteranceBuffer(initial_capacity=int(sample_rate * config.audio_config.utterance_buffer_duration))
         self.thread_manager = ThreadManager()
         self.voice_template = voice_template
-        self.vad = SpeechVAD(self._config.vad_config)
+        self.wake_word_detector = create_wake_word_detector(config)
+        self._transcript_detector = TranscriptWakeWordDetector() # Used until the keyword spotter is enrolled
+        self._spotted_samples = 0
+        self.vad = create_vad_backend(self._config.vad_config)
+        self.energy_gate = EnergyGate(self._config.vad_config) if self._config.vad_config.energy_gate else None
         self.silence_frame_counter = 0
-        self.audio_filter = bandpass_filter(sample_rate=config.audio_config.sample_rate,
-                                            low_cutoff=config.filter_config.low_cutoff,
-                                            high_cutoff=config.filter_config.high_cutoff)
+        self.wake_transcription: TranscriptionResult | None = None # Wake check decode of the last accepted command
+        self.endpointer = Endpointer(config=self._config.endpoint_config,
+                                     frame_duration_ms=self._config.vad_config.frame_duration_ms,
+                                     max_frames=self._config.vad_config.silence_counter_max,
+                                     known_commands=COMMANDS)
+        self.audio_filter = StreamingBandpassFilter(sample_rate=config.audio_config.sample_rate,
+                                                    low_cutoff=config.filter_config.low_cutoff,
+                                                    high_cutoff=config.filter_config.high_cutoff,
+                                                    order=config.filter_config.order)
+        self.noise_suppressor = None
+        if config.filter_config.noise_suppression:
+            self.noise_suppressor = SpectralNoiseSuppressor(sample_rate=sample_rate,
+                                                            frame_duration_ms=config.filter_config.noise_frame_ms,
+                                                            threshold=config.filter_config.noise_threshold,
+                                                            gain_floor=config.filter_config.noise_gain_floor,
+                                                            noise_smoothing=config.filter_config.noise_smoothing)
 
-    def transcribe_audio(self, audio: np.ndarray) -> str:
+        model_config = config.model_config
+        self.transcription_pool = None
+        if model_config.worker_processes > 0:
+            self.transcription_pool = TranscriptionWorkerPool(processes=model_config.worker_processes,
+                                                              model_sizes=(model_config.wake_profile.model_size,
+                                                                           model_config.command_profile.model_size),
+                                                              device=model_config.device,
+                                                              compute_type=model_config.compute_type,
+                                                              sample_rate=sample_rate,
+                                                              task_timeout=model_config.worker_task_timeout)
+
+        self.streaming_transcriber = None
+        if config.model_config.streaming:
+            self.streaming_transcriber = StreamingTranscriber(decode=lambda audio, offset: self._transcribe(audio=audio, offset=offset, word_timestamps=True),
+                                                              sample_rate=sample_rate,
+                                                              interval=config.model_config.streaming_interval,
+                                                              margin=config.model_config.streaming_margin,
+                                                              on_partial=on_partial_transcript)
+
+        # One pool per check, so the speaker embedding never queues behind a wake decode
+        self._wake_pool = self.thread_manager.get_worker_pool(self._WAKE_POOL_NAME, max_workers=1,
+                                                              max_queue=self._CHECK_QUEUE_LIMIT)
+        self._speaker_pool = self.thread_manager.get_worker_pool(self._SPEAKER_POOL_NAME, max_workers=1,
+                                                                 max_queue=self._CHECK_QUEUE_LIMIT)
+        self._wake_up_checks: WakeUpChecks | None = None # Of the utterance being checked
+
+    def transcribe_audio(self, audio: np.ndarray, profile: ASRProfile | None = None) -> str:
+        """Transcribes audio with profile, the command profile by default."""
+        return self._transcribe(audio=audio, profile=profile).text
+
+    def _transcribe(self, audio: np.ndarray, profile: ASRProfile | None = None, offset: float = 0.0,
+                    word_timestamps: bool = False) -> TranscriptionResult:
         try:
             model_config = self._config.model_config
-            segments, info = model_config.model_sm.transcribe(audio=audio, beam_size=model_config.beam_size)
-            logger.info(f"Detected language '{info.language}' with probability {info.language_probability}")
-
-            transcribed_text = ''
-            for i, segment in enumerate(segments):
-                logger.info(f"[{segment.start:.2f}s -> {segment.end:.2f}s]: Segment {i+1}")
-                transcribed_text += segment.text
-            return transcribed_text
+            profile = model_config.command_profile if profile is None else profile
+            if self.transcription_pool is not None:
+                return self.transcription_pool.transcribe(audio=audio, profile=profile, offset=offset,
+                                                          word_timestamps=word_timestamps)
+            return transcribe(model=model_config.model_for(profile),
+                              audio=audio,
+                              sample_rate=self._config.audio_config.sample_rate,
+                              profile=profile,
+                              offset=offset,
+                              word_timestamps=word_timestamps)
         except Exception as e:
             raise err.TranscriptionError("Failed to transcribe Audio") from e
+
+    def transcribe_command(self, audio: np.ndarray) -> str:
+        """
+        Transcribes the audio returned by get_command.
+
+        The wake check already decoded the start of the same utterance. Words
+        that ended at least reuse_margin seconds before that decode was cut off
+        are kept, and only the audio after them is decoded again. Words from a
+        wake check with a different profile are only kept up to the first one
+        below reuse_min_probability. In streaming mode most of the command is
+        already committed and only the tail is left.
+        """
+        wake_transcription, self.wake_transcription = self.wake_transcription, None
+        if self.streaming_transcriber is not None:
+            return self.streaming_transcriber.finalize(audio)
+
+        model_config = self._config.model_config
+        if wake_transcription is None or not self._reuses_wake_transcript():
+            return self.transcribe_audio(audio=audio)
+
+        same_profile = model_config.wake_profile == model_config.command_profile
+        committed_text, committed_end = committed_prefix(wake_transcription,
+                                                         cutoff=wake_transcription.duration - model_config.reuse_margin,
+                                                         min_probability=0.0 if same_profile else model_config.reuse_min_probability)
+        if not committed_text:
+            return self.transcribe_audio(audio=audio)
+
+        start = int(committed_end * self._config.audio_config.sample_rate)
+        if start >= len(audio):
+            return committed_text
+
+        logger.debug(f"Reusing {committed_end:.2f}s of the wake check transcription")
+        return committed_text + self._transcribe(audio=audio[start:], offset=committed_end).text
     
-    def byte_to_float32_audio(self, byte_audio: list[bytes]) -> np.ndarray:
-        if not byte_audio:
-            raise err.InvalidAudioError("Byte audio is not valid")
-        return np.frombuffer(b''.join(byte_audio), dtype=np.int16).astype(np.float32) / np.iinfo(np.int16).max
+    def _reuses_wake_transcript(self) -> bool:
+        return self._config.model_config.reuse_wake_transcript and self.streaming_transcriber is None
+
+    def close(self) -> None:
+        self.thread_manager.stop_all_threads()
+        self.thread_manager.shutdown_worker_pools(cancel_futures=True)
+        if self.transcription_pool is not None:
+            self.transcription_pool.close()
+
+    def _reset_utterance(self) -> None:
+        self.utterance.clear()
+        self.endpointer.reset()
+        self.wake_word_detector.reset()
+        self._spotted_samples = 0
+        if self.streaming_transcriber is not None:
+            self.streaming_transcriber.reset()
+
+    def _utterance_audio(self, stop: int | None = None) -> np.ndarray:
+        """Read-only float32 view of the utterance collected so far, valid until the utterance is cleared."""
+        if len(self.utterance) == 0:
+            raise err.InvalidAudioError("Utterance audio is empty")
+        return self.utterance.view(stop=stop)
     
     def _record_audio_stream(self) -> None:
         config = self._config
 
-        frame_duration_sec = config.audio_config.duration
-        frame_samples = int(config.audio_config.sample_rate * frame_duration_sec)
-
         if config.audio_config.channels != 1: # Checks if the audio is mono 
             raise ValueError("Only mono audio (1 channel) supported for VAD.")
         
         try:
-            # Discard first frame to remove startup noise
-            sd.rec(frames=frame_samples,
-                samplerate=config.audio_config.sample_rate, 
-                channels=config.audio_config.channels, 
-                dtype=config.audio_config.dtype)
-            sd.wait()
-
-            logger.debug("Starting recording...")
             stop_event = self.thread_manager.active_threads.get(self._STREAM_THREAD_NAME).stop_event
             if stop_event is None:
                 logger.critical(f"The stream must be run on {self._STREAM_THREAD_NAME}")
                 raise err.AudioStreamError("Failed to stream audio")
-            while not stop_event.is_set():
-                recording = sd.rec(frames=frame_samples,
-                                samplerate=config.audio_config.sample_rate,
-                                channels=config.audio_config.channels,
-                                dtype=config.audio_config.dtype)
-                sd.wait()
-                recording = recording.flatten()
-                self.queue.put(filter_audio(audio=recording, sos_filter=self.audio_filter))
+
+            self.audio_source.stream(ring_buffer=self.ring_buffer, stop_event=stop_event)
         except Exception as e:
             raise err.AudioStreamError("There was an Error recording audio...") from e
 
+    def _stream_transcription(self) -> None:
+        stop_event = self.thread_manager.active_threads.get(self._TRANSCRIBE_THREAD_NAME).stop_event
+        self.streaming_transcriber.run(stop_event=stop_event)
+
+    @property
+    def active_wake_word_detector(self) -> WakeWordDetector:
+        return self.wake_word_detector if self.wake_word_detector.ready else self._transcript_detector
+
     def wake_up_validation(self, audio:np.ndarray, wake_up_checks: WakeUpChecks) -> None:
-            transcript = self.transcribe_audio(audio=audio)
-            audio = normalize_audio(audio=audio, target_peak=self._config.filter_config.normalizing_peak)
-            logger.debug("Wake Up prompt: " + transcript)
-            wake_up_checks.wake_up = wud.wake_up_detection_stub(ip=transcript)
+        """
+        Starts the wake word and speaker checks side by side and returns, results land in wake_up_checks.
+
+        The speaker embedding no longer waits for the wake decode. A wake word
+        the keyword spotter already heard is not checked again. The checks get
+        their own copy of audio, a check still running after its utterance was
+        dropped must not read the next one being written into the same buffer.
+        """
+        audio = np.array(audio, dtype=np.float32)
+        detector = self.active_wake_word_detector
+        if detector.needs_transcript or not wake_up_checks.wake_up:
+            try:
+                wake_up_checks.track(self._wake_pool.submit(self._check_wake_word, audio, detector, wake_up_checks))
+            except err.ThreadError as e:
+                logger.error(f"Wake word check not started: {e}")
+                wake_up_checks.set_wake_up(False)
+        else:
+            wake_up_checks.set_wake_up(True)
 
-            if wake_up_checks.wake_up:
-                wake_up_checks.biometric_pass = self.voice_template.match_embedding(audio=audio)
+        try:
+            wake_up_checks.track(self._speaker_pool.submit(self._check_speaker, audio, wake_up_checks))
+        except err.ThreadError as e:
+            logger.error(f"Speaker check not started: {e}")
+            wake_up_checks.set_speaker(None)
+
+    def _new_wake_up_checks(self) -> WakeUpChecks:
+        """Checks of the next utterance. Queued checks of the previous one are dropped so they never delay or crowd out these."""
+        if self._wake_up_checks is not None:
+            self._wake_up_checks.cancel()
+        self._wake_up_checks = WakeUpChecks()
+        return self._wake_up_checks
+
+    def _check_wake_word(self, audio: np.ndarray, detector: WakeWordDetector, wake_up_checks: WakeUpChecks) -> None:
+        if wake_up_checks.cancelled or wake_up_checks.failed: # Popped just before the cancel
+            return
+        try:
+            if not detector.needs_transcript: # Not spotted while the audio arrived
+                wake_up_checks.set_wake_up(detector.detect(audio=audio))
+                return
+
+            transcription = self._transcribe(audio=audio,
+                                             profile=self._config.model_config.wake_profile,
+                                             word_timestamps=self._reuses_wake_transcript()) # Only paid for when they are used
+            logger.debug("Wake Up prompt: " + transcription.text)
+            wake_up_checks.set_wake_up(detector.detect(audio=audio, transcript=transcription.text), transcription)
+        except Exception as e:
+            logger.error(f"Wake word check failed: {e}")
+            wake_up_checks.set_wake_up(False)
 
-    def _process_audio_to_bytes(self) -> bytes:
+    def _check_speaker(self, audio: np.ndarray, wake_up_checks: WakeUpChecks) -> None:
+        if wake_up_checks.cancelled or wake_up_checks.failed: # The embedding is the expensive part, skip it when it can not matter
+            return
         try:
-            chunk = self.queue.get(timeout=5)
-            return (chunk * np.iinfo(np.int16).max).astype(np.int16).tobytes()
-        except queue.Empty:
+            audio = normalize_audio(audio=audio, target_peak=self._config.filter_config.normalizing_peak)
+            wake_up_checks.set_speaker(self.voice_template.verify_speaker(audio=audio))
+        except Exception as e:
+            logger.error(f"Speaker check failed: {e}")
+            wake_up_checks.set_speaker(None)
+
+    def _read_audio_frames(self) -> memoryview:
+        """Reads and filters the next chunk in place. The returned view is overwritten by the next call."""
+        if not self.ring_buffer.read_into(self._chunk, timeout=5):
+            if self.ring_buffer.closed:
+                logger.info("Audio source has no more audio")
+                self.thread_manager.stop_all_threads()
+                raise err.AudioSourceExhaustedError("Audio source is exhausted")
+
             logger.critical("Queue is empty, Exiting...")
             self.thread_manager.stop_all_threads()
             raise err.QueueEmptyError("Audio queue is empty")
 
-    def _voice_activity_detector(self, speech_frames: list[bytes]) -> bool:
-        audio_bytes = self._process_audio_to_bytes()
-        frame_size = int(self._config.audio_config.sample_rate * (self._config.vad_config.frame_duration_ms / 1000.0) * np.dtype(np.int16).itemsize) # 1000ms = 1s
+        pcm16_to_float32(self._chunk, out=self._float_chunk)
+        self.audio_filter.process(self._float_chunk, out=self._float_chunk)
+        if self.noise_suppressor is not None:
+            self.noise_suppressor.process(self._float_chunk, out=self._float_chunk)
+        float32_to_pcm16(self._float_chunk, out=self._chunk, clip_in_place=True)
+        return self._chunk_bytes
+
+    def _voice_activity_detector(self, utterance: UtteranceBuffer) -> bool:
+        audio_bytes = self._read_audio_frames()
+        frame_samples = int(self._config.audio_config.sample_rate * (self._config.vad_config.frame_duration_ms / 1000.0)) # 1000ms = 1s
         speech_detected = False
         silence_detected = False
 
-        for i in range(0, len(audio_bytes), frame_size):
-            frame = audio_bytes[i:i + frame_size]
+        samples = np.frombuffer(audio_bytes, dtype=np.int16)
+        full_frames = len(samples) // frame_samples
+        if len(samples) % frame_samples:
+            logger.error("Invalid Audio")
+        frames = samples[:full_frames * frame_samples].reshape(full_frames, frame_samples) # view, no copy
+
+        candidates = None
+        if self.energy_gate is not None:
+            candidates = self.energy_gate.mask(frames)
+            self.endpointer.observe_noise(self.energy_gate.noise_floor_dbfs)
+        speech_mask = self.vad.is_speech_batch(frames, candidates)
 
-            if len(frame) < frame_size:
-                logger.error("Invalid Audio")
-                continue
-            if self.vad.isSpeech(frame):
-                speech_frames.append(frame)
+        for frame, is_speech in zip(frames, speech_mask):
+            self.endpointer.observe(bool(is_speech))
+            if is_speech:
+                utterance.append_pcm16(frame)
                 speech_detected = True
                 self.silence_frame_counter = 0
             
@@ -128,7 +390,7 @@ class InputPipeline:
                     logger.debug("Silence Detected")
                 self.silence_frame_counter += 1
                 
-                if self.silence_frame_counter >= self._config.vad_config.silence_counter_max:
+                if self.silence_frame_counter >= self.endpointer.silence_limit():
                     logger.debug("stopping VAD")
                     self.silence_frame_counter = 0
                     silence_detected = True
@@ -137,46 +399,62 @@ class InputPipeline:
         return speech_detected or (not silence_detected) # returns false when prolonged silence is detected from collected speech frames.
 
     def _wake_up_detect(self) -> np.ndarray: 
-        speech_frames = []
+        self._reset_utterance()
         check_wake = True
-        wake_up_check_thread = None
-        wake_up_checks = WakeUpChecks()
+        wake_up_checks = self._new_wake_up_checks()
         
         logger.debug("VAD running...")
         while True:
-            vad_active = self._voice_activity_detector(speech_frames=speech_frames)
-
-            if len(speech_frames) >= self._config.vad_config.check_wake_after_frames and check_wake:
-                audio = self.byte_to_float32_audio(speech_frames)
-
-                wake_up_check_thread = self.thread_manager.create_new_thread(target=self.wake_up_validation,
-                                                                            args=(audio, wake_up_checks),
-                                                                            name="WakeCheckThread",
-                                                                            autostart=True)
-                if wake_up_check_thread is None:
-                    raise err.WakeUpError("Could not check for Error!")
-                        
+            vad_active = self._voice_activity_detector(utterance=self.utterance)
+
+            if wake_up_checks.transcript:
+                self.endpointer.observe_transcript(wake_up_checks.transcript)
+
+            if self.streaming_transcriber is not None and wake_up_checks.wake_up: # Only command audio is decoded ahead
+                self.streaming_transcriber.update(self._utterance_audio())
+                self.endpointer.observe_transcript(self.streaming_transcriber.partial_text)
+
+            detector = self.active_wake_word_detector
+            if detector.needs_transcript:
+                check_ready = self.utterance.frame_count >= self._config.vad_config.check_wake_after_frames
+            elif check_wake and len(self.utterance) > self._spotted_samples:
+                # Scoring the new speech costs milliseconds, so it runs on every chunk
+                wake_up_checks.wake_up = detector.push(self.utterance.view(start=self._spotted_samples))
+                self._spotted_samples = len(self.utterance)
+                check_ready = wake_up_checks.wake_up
+            else:
+                check_ready = False
+
+            if check_ready and check_wake:
+                self.wake_up_validation(audio=self._utterance_audio(), wake_up_checks=wake_up_checks)
                 check_wake = False
             
             if vad_active == False:
-                if self.thread_manager.get_thread_status(wake_up_check_thread) != ThreadStatus.NOT_FOUND:
-                    self.thread_manager.stop_thread(wake_up_check_thread)
+                if not check_wake:
+                    wake_up_checks.wait()
 
-                if wake_up_checks.wake_up == False or wake_up_checks.biometric_pass == False:
-                    if not wake_up_checks.wake_up:
+                if not wake_up_checks.passed:
+                    if not wake_up_checks.speaker_failed or wake_up_checks.wake_failed:
                         logger.warning('No wake up detected!')
                     else:        
                         logger.warning('Biometric Failed!')
                     
-                    speech_frames.clear()
+                    self._reset_utterance()
                     check_wake = True
-                    wake_up_checks = WakeUpChecks()
+                    wake_up_checks = self._new_wake_up_checks()
                     continue
                 break
 
-        return self.byte_to_float32_audio(speech_frames)
+        self.voice_template.accept_match(wake_up_checks.speaker_match) # Only a fully accepted wake up updates the template
+        self.wake_transcription = wake_up_checks.transcription
+
+        return self._utterance_audio()
 
     def get_command(self) -> np.ndarray:
+        """
+        Returns a read-only view of the command utterance, valid until the next get_command call.
+        Pass it to transcribe_command to reuse the wake check transcription.
+        """
         if not self.voice_template.is_template:
             raise err.TemplateLoadError("No biometric template found or loaded!")
 
@@ -188,22 +466,34 @@ class InputPipeline:
         if recording_thread is None:
             raise err.AudioStreamError("Audio could not be streamed")
 
+        transcription_thread = None
+        if self.streaming_transcriber is not None:
+            transcription_thread = self.thread_manager.create_new_thread(target=self._stream_transcription,
+                                                                         name=self._TRANSCRIBE_THREAD_NAME,
+                                                                         autostart=True)
+
         audio = self._wake_up_detect()
 
+        if transcription_thread is not None:
+            self.thread_manager.stop_thread(transcription_thread)
+
         try:
             self.thread_manager.stop_thread(recording_thread)
         except err.ThreadNotFoundError as e:
             logger.critical(f"Audio Not recorded: {e}")
             return np.array([], dtype=np.float32)
 
-        self.queue = queue.Queue() # Reset the Queue
+        self.ring_buffer.clear() # Reset the buffer
+        self.audio_filter.reset()
+        if self.noise_suppressor is not None:
+            self.noise_suppressor.reset()
         return audio
     
     def get_template_audio(self) -> list[np.ndarray]:
-        speech_frames: list[bytes] = []
         audio_samples_count = 0
         audio_samples: list[np.ndarray] = []
         self.thread_manager.stop_all_threads()
+        self._reset_utterance()
 
         logger.info("Recording Info for Template generation...")
         recording_thread = self.thread_manager.create_new_thread(target=self._record_audio_stream,
@@ -215,21 +505,21 @@ class InputPipeline:
 
         logger.debug("VAD running...")
         while audio_samples_count < self._config.biometric_config.audio_sample_required:
-            vad_active = self._voice_activity_detector(speech_frames=speech_frames)
+            vad_active = self._voice_activity_detector(utterance=self.utterance)
 
             if not vad_active:
-                audio = self.byte_to_float32_audio(speech_frames)
-                transcription = self.transcribe_audio(audio=audio)
-                if wud.wake_up_detection_stub(ip=transcription):
+                audio = self._utterance_audio()
+                transcription = self.transcribe_audio(audio=audio, profile=self._config.model_config.wake_profile)
+                if self._transcript_detector.detect(audio=audio, transcript=transcription):
                     audio = normalize_audio(audio=audio, target_peak=self._config.filter_config.normalizing_peak)
-                    audio_samples.append(audio)
+                    audio_samples.append(np.array(audio)) # Own copy, the utterance buffer is reused for the next sample
                     logger.info(f'detected prompt: {transcription}')
                     audio_samples_count += 1
                     logger.info(f'Audio Recorded: {audio_samples_count}/{self._config.biometric_config.audio_sample_required}')
                 else:
                     logger.warning("That was not a valid keyword. Try again...")
                 
-                speech_frames.clear()
+                self._reset_utterance()
         
         try:
             self.thread_manager.stop_thread(recording_thread)
@@ -237,7 +527,11 @@ class InputPipeline:
             logger.critical(f"Audio Not recorded: {e}")
             raise err.BiometricError("Failed to get audio")
         
-        self.queue = queue.Queue() # Reset the Queue
+        self.ring_buffer.clear() # Reset the buffer
+        self.audio_filter.reset()
+        if self.noise_suppressor is not None:
+            self.noise_suppressor.reset()
+        self.wake_word_detector.enroll(audio_samples)
         return audio_samples
     
     
@@ -0,0 +1,195 @@
+from abc import ABC, abstractmethod
+import os
+import time
+import numpy as np
+import librosa
+from config.input_pipe_config import VoiceBiometricConfig
+from utility.logger import get_logger
+import utility.errors as err
+
+logger = get_logger(__name__)
+
+# resemblyzer's hyperparameters, embeddings only match the enrolled templates with these exact values
+SAMPLE_RATE = 16_000
+MEL_WINDOW_MS = 25
+MEL_STEP_MS = 10
+MEL_CHANNELS = 40
+PARTIAL_FRAMES = 160 # 1.6s per partial utterance
+EMBEDDING_SIZE = 256
+
+def wav_to_mel(wav: np.ndarray) -> np.ndarray:
+    """(n_frames, MEL_CHANNELS) mel power spectrogram, the same as resemblyzer.wav_to_mel_spectrogram."""
+    frames = librosa.feature.melspectrogram(y=wav,
+                                            sr=SAMPLE_RATE,
+                                            n_fft=SAMPLE_RATE * MEL_WINDOW_MS // 1000,
+                                            hop_length=SAMPLE_RATE * MEL_STEP_MS // 1000,
+                                            n_mels=MEL_CHANNELS)
+    return frames.astype(np.float32).T
+
+
+def partial_slices(n_samples: int, rate: float = 1.3, min_coverage: float = 0.75) -> tuple[list[slice], list[slice]]:
+    """Waveform and mel slices of the partial utterances, the same as VoiceEncoder.compute_partial_slices."""
+    samples_per_frame = SAMPLE_RATE * MEL_STEP_MS // 1000
+    n_frames = int(np.ceil((n_samples + 1) / samples_per_frame))
+    frame_step = int(np.round((SAMPLE_RATE / rate) / samples_per_frame))
+    if not 0 < frame_step <= PARTIAL_FRAMES:
+        raise ValueError(f"Partial utterance rate {rate} is out of range")
+
+    steps = max(1, n_frames - PARTIAL_FRAMES + frame_step + 1)
+    mel_slices = [slice(start, start + PARTIAL_FRAMES) for start in range(0, steps, frame_step)]
+    wav_slices = [slice(mel.start * samples_per_frame, mel.stop * samples_per_frame) for mel in mel_slices]
+
+    last = wav_slices[-1]
+    coverage = (n_samples - last.start) / (last.stop - last.start)
+    if coverage < min_coverage and len(mel_slices) > 1: # Too little audio left for the last partial
+        return wav_slices[:-1], mel_slices[:-1]
+    return wav_slices, mel_slices
+
+
+def partial_mels(wav: np.ndarray, rate: float = 1.3, min_coverage: float = 0.75) -> np.ndarray:
+    """(n, PARTIAL_FRAMES, MEL_CHANNELS) mels of the partial utterances, the audio is zero padded to cover the last one."""
+    wav_slices, mel_slices = partial_slices(len(wav), rate, min_coverage)
+    if wav_slices[-1].stop >= len(wav):
+        wav = np.pad(wav, (0, wav_slices[-1].stop - len(wav)))
+
+    mel = wav_to_mel(wav)
+    return np.stack([mel[s] for s in mel_slices])
+
+
+def probe_audio(f0: float = 140.0, seconds: float = 2.0) -> np.ndarray:
+    """Deterministic voiced sound for warmup and for checking other backends against resemblyzer."""
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    phase = 2 * np.pi * np.cumsum(f0 * (1 + 0.05 * np.sin(2 * np.pi * 3 * t))) / SAMPLE_RATE
+    wav = sum(np.sin(k * phase) / k for k in range(1, 20)) * np.sin(np.pi * t / seconds) ** 2
+    wav += 0.01 * np.random.default_rng(0).standard_normal(len(t))
+    return (0.1 * wav / np.abs(wav).max()).astype(np.float32)
+
+
+class SpeakerEncoder(ABC):
+    """
+    resemblyzer's utterance embedding on top of an exchangeable network runtime.
+
+    embed_utterance() cuts the audio into 1.6s partials and averages their
+    embeddings exactly like resemblyzer.VoiceEncoder, so every backend stays
+    comparable with the 256-d templates enrolled before. Backends only run the
+    network on a batch of mel partials.
+    """
+
+    def embed_utterance(self, wav: np.ndarray, rate: float = 1.3, min_coverage: float = 0.75) -> np.ndarray:
+        partials = self.embed_partials(partial_mels(wav, rate, min_coverage))
+        embedding = partials.mean(axis=0)
+        return embedding / np.linalg.norm(embedding)
+
+    @abstractmethod
+    def embed_partials(self, mels: np.ndarray) -> np.ndarray:
+        """(n, PARTIAL_FRAMES, MEL_CHANNELS) float32 mels to (n, EMBEDDING_SIZE) L2-normalized embeddings."""
+
+    def warmup(self) -> None:
+        """Runs one embedding, so allocations and kernel selection do not land on the first wake up."""
+        self.embed_utterance(probe_audio())
+
+
+class TorchSpeakerEncoder(SpeakerEncoder):
+    """Runs a torch module: resemblyzer's VoiceEncoder, its int8 version or a TorchScript export."""
+
+    def __init__(self, model, device: str = 'cpu'):
+        self._model = model
+        self._device = device
+
+    def embed_partials(self, mels: np.ndarray) -> np.ndarray:
+        import torch
+        with torch.no_grad():
+            return self._model(torch.from_numpy(mels).to(self._device)).cpu().numpy()
+
+
+class OnnxSpeakerEncoder(SpeakerEncoder):
+    """Runs an ONNX export with onnxruntime, torch is never imported."""
+
+    def __init__(self, path: str, threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise err.ModelLoadError("The onnx speaker encoder needs onnxruntime") from e
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def embed_partials(self, mels: np.ndarray) -> np.ndarray:
+        return self._session.run(None, {'mels': mels})[0]
+
+
+def similarity_to(reference: SpeakerEncoder, candidate: SpeakerEncoder) -> float:
+    """Lowest cosine similarity between the two encoders' embeddings of a low and a high voice."""
+    probes = (probe_audio(f0=110.0), probe_audio(f0=220.0))
+    return min(float(reference.embed_utterance(probe) @ candidate.embed_utterance(probe)) for probe in probes)
+
+
+def exported_encoder_path(config: VoiceBiometricConfig, usr_data_dir: str) -> str:
+    name = 'voice_encoder' + ('_int8' if config.encoder_quantize else '')
+    extension = '.onnx' if config.encoder_backend == 'onnx' else '.pt'
+    return os.path.join(usr_data_dir, config.encoder_dir, name + extension)
+
+
+def _set_torch_threads(threads: int) -> None:
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads) # Process wide, Whisper runs on CTranslate2 and is not affected
+
+
+def _load_encoder(config: VoiceBiometricConfig, usr_data_dir: str) -> SpeakerEncoder:
+    backend = config.encoder_backend
+    if backend == 'torch':
+        from core.voice_encoder_export import load_voice_encoder, quantize_encoder
+        _set_torch_threads(config.encoder_threads)
+        if not config.encoder_quantize:
+            model = load_voice_encoder()
+            return TorchSpeakerEncoder(model, device=model.device)
+
+        reference = load_voice_encoder(device='cpu') # Dynamic quantization only runs on the CPU
+        encoder = TorchSpeakerEncoder(quantize_encoder(reference))
+        similarity = similarity_to(TorchSpeakerEncoder(reference), encoder)
+        if similarity < config.encoder_min_similarity:
+            raise err.ModelLoadError(f"Quantized speaker encoder only reaches similarity {similarity:.4f}")
+        return encoder
+
+    path = exported_encoder_path(config, usr_data_dir)
+    if not os.path.exists(path): # Only the first start pays for exporting
+        from core.voice_encoder_export import export_voice_encoder
+        export_voice_encoder(path=path, backend=backend, quantize=config.encoder_quantize,
+                             min_similarity=config.encoder_min_similarity)
+
+    if backend == 'onnx':
+        return OnnxSpeakerEncoder(path, threads=config.encoder_threads)
+    import torch
+    _set_torch_threads(config.encoder_threads)
+    return TorchSpeakerEncoder(torch.jit.load(path, map_location='cpu'))
+
+
+def create_speaker_encoder(config: VoiceBiometricConfig, usr_data_dir: str) -> SpeakerEncoder:
+    """
+    The speaker encoder configured by encoder_backend, warmed up if encoder_warmup is set.
+
+    'torchscript' and 'onnx' export resemblyzer's weights once into encoder_dir
+    and load that file on later starts. An export or int8 model that disagrees
+    with resemblyzer by more than encoder_min_similarity is not used, the
+    eager encoder takes over so enrolled templates keep matching.
+    """
+    if config.encoder_backend not in ('torch', 'torchscript', 'onnx'):
+        raise ValueError(f"Unknown speaker encoder backend: {config.encoder_backend}")
+
+    try:
+        encoder = _load_encoder(config, usr_data_dir)
+    except err.ModelLoadError as e:
+        logger.error(f"Falling back to the eager speaker encoder: {e}")
+        from core.voice_encoder_export import load_voice_encoder
+        model = load_voice_encoder()
+        encoder = TorchSpeakerEncoder(model, device=model.device)
+
+    if config.encoder_warmup:
+        start = time.perf_counter()
+        encoder.warmup()
+        logger.info(f"Speaker encoder ({config.encoder_backend}) warmed up in {(time.perf_counter() - start) * 1000:.0f}ms")
+    return encoder
@@ -1,41 +1,317 @@
+from collections.abc import Iterable, MutableMapping
+from dataclasses import dataclass
+from io import BytesIO
+from threading import Lock
 import numpy as np
-from resemblyzer import VoiceEncoder
 from config.config_manager import ConfigManager
+from core.speaker_encoder import SpeakerEncoder, create_speaker_encoder
 from utility import logger
 from utility.encrypt import CryptManager
+from utility.template_store import FlushStats, TemplateStore, TemplateWriteBehind
 import os
 import utility.errors as err
-from utility.thread_manager import ThreadManager, ThreadStatus
 
 logger = logger.get_logger(__name__)
 
+@dataclass
+class SpeakerMatch:
+    username: str
+    similarity: float
+    embedding: np.ndarray
+
+
+class TemplateSnapshot:
+    """
+    Immutable view of the templates at one point in time.
+
+    Rows of matrix belong to usernames in order. Nothing in a snapshot is
+    ever written after it was published, so any number of threads can score
+    against it without a lock while a newer snapshot replaces it.
+    """
+
+    def __init__(self, usernames: tuple[str, ...], rows: dict[str, int], data: np.ndarray):
+        self.usernames = usernames
+        self._rows = rows
+        self.matrix = data[:len(usernames)]
+        self.matrix.flags.writeable = False
+
+    def __getitem__(self, username: str) -> np.ndarray:
+        return self.matrix[self._rows[username]]
+
+    def __contains__(self, username: object) -> bool:
+        return username in self._rows
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+    def scores(self, embedding: np.ndarray) -> tuple[tuple[str, ...], np.ndarray]:
+        """Cosine similarity of a normalized embedding to every user."""
+        return self.usernames, self.matrix @ embedding.astype(np.float32)
+
+    def top_k(self, embedding: np.ndarray, k: int = 1) -> list[tuple[str, float]]:
+        """The k most similar users, best first."""
+        if len(self.usernames) == 0:
+            return []
+        usernames, scores = self.scores(embedding)
+        k = min(k, len(usernames))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(usernames[i], float(scores[i])) for i in best]
+
+
+class TemplateMatrix(MutableMapping):
+    """
+    username -> template mapping published as copy-on-write TemplateSnapshots.
+
+    Readers take the current snapshot by reference and never lock, so a
+    match is never held up by a template update. Writers serialize on a lock,
+    build the next snapshot and swap it in with one reference assignment.
+    Adding a user writes into spare rows no published snapshot can see
+    (capacity doubles), so it costs no copy. Updating or removing one copies
+    the matrix once, removal moves the last row into the gap.
+    """
+
+    def __init__(self, dim: int, templates: dict[str, np.ndarray] | None = None):
+        self._dim = dim
+        self._data = np.zeros((max(1, len(templates or {})), dim), dtype=np.float32) # Rows past the snapshot are spare
+        self._lock = Lock() # Writers only
+        self._snapshot = TemplateSnapshot((), {}, self._data)
+        for username, template in (templates or {}).items():
+            self[username] = template
+
+    @property
+    def snapshot(self) -> TemplateSnapshot:
+        return self._snapshot
+
+    def __getitem__(self, username: str) -> np.ndarray:
+        return self._snapshot[username].copy()
+
+    def __setitem__(self, username: str, template: np.ndarray) -> None:
+        template = np.asarray(template, dtype=np.float32).reshape(self._dim)
+        with self._lock:
+            current = self._snapshot
+            rows = dict(current._rows)
+            usernames = current.usernames
+            row = rows.get(username)
+            if row is None:
+                row = len(usernames)
+                if row == len(self._data):
+                    grown = np.zeros((2 * len(self._data), self._dim), dtype=np.float32)
+                    grown[:row] = current.matrix
+                    self._data = grown
+                rows[username] = row
+                usernames += (username,)
+            else: # The row is visible to readers, write a copy
+                self._data = self._data.copy()
+            self._data[row] = template
+            self._snapshot = TemplateSnapshot(usernames, rows, self._data)
+
+    def __delitem__(self, username: str) -> None:
+        with self._lock:
+            current = self._snapshot
+            rows = dict(current._rows)
+            row = rows.pop(username)
+            usernames = list(current.usernames)
+            last = len(usernames) - 1
+            self._data = self._data.copy()
+            if row != last: # Fill the gap with the last row
+                moved = usernames[last]
+                self._data[row] = self._data[last]
+                usernames[row] = moved
+                rows[moved] = row
+            usernames.pop()
+            self._snapshot = TemplateSnapshot(tuple(usernames), rows, self._data)
+
+    def __contains__(self, username: object) -> bool:
+        return username in self._snapshot
+
+    def __iter__(self):
+        return iter(self._snapshot.usernames)
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Read-only (N, dim) view, row i belongs to usernames[i]."""
+        return self._snapshot.matrix
+
+    @property
+    def usernames(self) -> list[str]:
+        return list(self._snapshot.usernames)
+
+    def scores(self, embedding: np.ndarray) -> tuple[tuple[str, ...], np.ndarray]:
+        """Cosine similarity of a normalized embedding to every user."""
+        return self._snapshot.scores(embedding)
+
+    def top_k(self, embedding: np.ndarray, k: int = 1) -> list[tuple[str, float]]:
+        """The k most similar users, best first."""
+        return self._snapshot.top_k(embedding, k)
+
+
+class SpeakerIndex:
+    """
+    Inverted-file (IVF) index for approximate speaker search.
+
+    Users are split into n_lists clusters by spherical k-means, each cluster
+    holding its members in its own TemplateMatrix. A search scores the
+    centroids, then only the members of the n_probe closest clusters, so its
+    cost grows with n_lists + n_probe * N / n_lists instead of N. Adding,
+    updating or removing a user only touches its cluster. The centroids are
+    kept across restarts, the members are re-assigned from the templates.
+
+    Like the clusters, the index is read without a lock: training and
+    rebuilding publish centroids and clusters together in one assignment, and
+    a user moving between clusters is added to the new one before it leaves
+    the old one, so a concurrent search never misses it.
+    """
+
+    def __init__(self, dim: int, n_lists: int, n_probe: int):
+        self._dim = dim
+        self._n_lists = n_lists
+        self.n_probe = n_probe
+        self._state: tuple[np.ndarray, list[TemplateMatrix]] | None = None # Centroids and their clusters
+        self._assignment: dict[str, int] = {}
+
+    @property
+    def trained(self) -> bool:
+        return self._state is not None
+
+    def __len__(self) -> int:
+        return len(self._assignment)
+
+    def train(self, templates: TemplateMatrix | TemplateSnapshot, iterations: int = 10, seed: int = 0) -> None:
+        snapshot = templates.snapshot if isinstance(templates, TemplateMatrix) else templates
+        data = np.array(snapshot.matrix)
+        n_lists = min(self._n_lists or int(np.sqrt(len(data))), len(data))
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(len(data), n_lists, replace=False)]
+
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, data)
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()))] # Re-seed clusters that lost every member
+            centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+
+        self.rebuild(snapshot, centroids=centroids.astype(np.float32))
+        logger.info(f"Speaker index trained on {len(data)} users with {n_lists} clusters")
+
+    def set_centroids(self, centroids: np.ndarray) -> None:
+        self._state = (centroids, [TemplateMatrix(dim=self._dim) for _ in range(len(centroids))])
+        self._assignment = {}
+
+    def rebuild(self, templates: TemplateMatrix | TemplateSnapshot, centroids: np.ndarray | None = None) -> None:
+        """Re-assigns every user, to new centroids if given. Searches see the old clusters until it is done."""
+        snapshot = templates.snapshot if isinstance(templates, TemplateMatrix) else templates
+        centroids = self._state[0] if centroids is None else centroids
+        members: list[dict[str, np.ndarray]] = [{} for _ in range(len(centroids))]
+        assignment = {}
+        matrix = snapshot.matrix
+        for username, cluster, template in zip(snapshot.usernames, np.argmax(matrix @ centroids.T, axis=1), matrix):
+            members[cluster][username] = template
+            assignment[username] = int(cluster)
+        self._state = (centroids, [TemplateMatrix(dim=self._dim, templates=cluster) for cluster in members])
+        self._assignment = assignment
+
+    def add(self, username: str, template: np.ndarray) -> None:
+        """Adds a user, or moves an updated one to its nearest cluster."""
+        centroids, lists = self._state
+        cluster = int(np.argmax(centroids @ template))
+        previous = self._assignment.get(username)
+        lists[cluster][username] = template
+        self._assignment[username] = cluster
+        if previous is not None and previous != cluster:
+            del lists[previous][username]
+
+    def remove(self, username: str) -> None:
+        cluster = self._assignment.pop(username, None)
+        if cluster is not None:
+            del self._state[1][cluster][username]
+
+    def search(self, embedding: np.ndarray, k: int = 1) -> list[tuple[str, float]]:
+        centroids, lists = self._state
+        n_probe = min(self.n_probe, len(lists))
+        probed = np.argpartition(-(centroids @ embedding), n_probe - 1)[:n_probe]
+        best: dict[str, float] = {} # A user moving between clusters can briefly be in both
+        for cluster in probed:
+            for username, score in lists[cluster].top_k(embedding, k):
+                best[username] = max(score, best.get(username, score))
+        return sorted(best.items(), key=lambda match: match[1], reverse=True)[:k]
+
+    def recall(self, queries: np.ndarray, exact: TemplateMatrix | TemplateSnapshot, k: int = 1) -> float:
+        """Share of the exact top-k users that search() also returns."""
+        if len(queries) == 0:
+            return 1.0
+        found = 0
+        for query in queries:
+            expected = {username for username, _ in exact.top_k(query, k)}
+            found += len(expected & {username for username, _ in self.search(query, k)})
+        return found / (len(queries) * min(k, len(exact)))
+
+    def to_bytes(self) -> bytes:
+        buffer = BytesIO()
+        np.save(buffer, self._state[0], allow_pickle=False)
+        return buffer.getvalue()
+
+    def load_centroids(self, data: bytes) -> None:
+        centroids = np.load(BytesIO(data), allow_pickle=False)
+        if centroids.ndim != 2 or centroids.shape[1] != self._dim:
+            raise ValueError(f"Speaker index has shape {centroids.shape}, expected (n, {self._dim})")
+        self.set_centroids(centroids.astype(np.float32))
+
+
 class BiometricTemplateGenerator:
     _EMBEDDING_SIZE = 256
-    _UPDATE_TEMPLATE_THREAD = 'UpdateTemplateThread'
 
     def __init__(self, config_mgr: ConfigManager):
         self._config_mgr = config_mgr
         self._crypt_mgr = CryptManager(config=config_mgr)
-        self.thread_mgr = ThreadManager()
-        self._template: dict[str, np.ndarray] = {}
+        biometric_config = config_mgr.biometric_config
+        self._store = TemplateStore(path=os.path.join(config_mgr.basic_info.usr_data_dir, biometric_config.store_file),
+                                    crypt_mgr=self._crypt_mgr,
+                                    dim=self._EMBEDDING_SIZE,
+                                    compact_ratio=biometric_config.store_compact_ratio,
+                                    decrypt_threads=biometric_config.store_decrypt_threads)
+        self._writer = TemplateWriteBehind(self._store, flush_interval=biometric_config.store_flush_interval)
 
         try:
-            self._encoder = VoiceEncoder()
+            self._encoder = create_speaker_encoder(config=config_mgr.biometric_config,
+                                                   usr_data_dir=config_mgr.basic_info.usr_data_dir)
         except Exception as e:
-            logger.critical(f"VoiceEncoder init failed: {e}")
+            logger.critical(f"Speaker encoder init failed: {e}")
             raise err.BiometricError("Failed to initialize encoder")
         
-        self._template = self._load_embedding()
+        self._template = TemplateMatrix(dim=self._EMBEDDING_SIZE, templates=self._load_embedding())
+        self._index: SpeakerIndex | None = None
+        if config_mgr.biometric_config.speaker_index:
+            self._load_index()
         """
-        Waits for any active template update thread to finish.
-
-        Call sync_template_update_thread before accessing templates if consistency is critical.
+        Template updates apply to memory right away and reach the store through
+        the write-behind buffer, within store_flush_interval seconds. Call
+        close() to write the updates still buffered.
         """
 
     @property
     def is_template(self) -> bool:
         return bool(self._template)
 
+    def is_enrolled(self, username: str) -> bool:
+        return username in self._template
+
+    @property
+    def encoder(self) -> SpeakerEncoder:
+        return self._encoder
+
+    @property
+    def flush_stats(self) -> FlushStats:
+        return self._writer.stats
+
+    def close(self) -> None:
+        """Writes the template updates still held in memory."""
+        self._writer.close()
+
     def get_new_template(self, audio_list: list[np.ndarray]) -> None:
 
         for audio in audio_list:
@@ -55,7 +331,7 @@ class BiometricTemplateGenerator:
             return
 
         try:
-            template = np.mean(np.stack(embeddings), axis=0)
+            template = self._normalize(np.mean(np.stack(embeddings), axis=0)) # A mean of unit vectors is shorter, stored at unit norm like enroll()
         except (ValueError, TypeError):
             raise err.TemplateGenerationError("Failed to create template from embeddings")
         
@@ -65,6 +341,7 @@ class BiometricTemplateGenerator:
         username = self._get_username()
 
         self._template[username] = template
+        self._update_index(username)
 
         self._save_template(username=username, embedding=template)
 
@@ -77,81 +354,202 @@ class BiometricTemplateGenerator:
                     return username
                 logger.error("Invalid Username! Try again...")
     
+    def enroll(self, templates: dict[str, np.ndarray]) -> None:
+        """Adds or replaces many users at once, their templates are written in one store transaction."""
+        for username, template in templates.items():
+            self._template[username] = self._normalize(template)
+        for username in templates: # Trains the index on everyone at once if it was not trained yet
+            self._update_index(username)
+
+        self._save_templates({username: self._template[username] for username in templates})
+
     def _save_template(self, username: str, embedding: np.ndarray) -> None:
+        self._save_templates({username: embedding})
+
+    def _save_templates(self, templates: dict[str, np.ndarray]) -> None:
+        for username, embedding in templates.items(): # Flushed with any pending update, in order
+            self._writer.write(username=username, embedding=embedding)
         for attempt_num in range(3): # Tries to save the template 3 times
             try:
-                filename = os.path.join(self._config_mgr.basic_info.usr_data_dir,
-                                        self._config_mgr.biometric_config.get_file_name(username=username))
-                
-                cipher = self._crypt_mgr.encrypt(embedding.tobytes())
-
-                with open(filename, 'wb') as f:
-                    f.write(cipher)
-                logger.info("New biometric template generated and saved.")
+                self._writer.flush()
+                if len(templates) == 1:
+                    logger.info("New biometric template generated and saved.")
+                else:
+                    logger.info(f"{len(templates)} biometric templates saved.")
                 break
 
-            except (OSError, IOError):
+            except err.FileAccessError:
                 if attempt_num < 2:
                     logger.error(f"Could not save template. Failed Attempt: {attempt_num+1}. Retrying...")
                 else:
                     raise err.FileAccessError(f"Failed write on Disk. After {attempt_num+1}")
            
     def _load_embedding(self) -> dict[str, np.ndarray]:
+        templates = {username: self._normalize(embedding) for username, embedding in self._store.load().items()}
+
         file_list = self._get_template_files(self._config_mgr.basic_info.usr_data_dir)
-        dic = {}
+        if file_list:
+            templates.update(self._migrate_template_files(file_list, skip=templates.keys()))
+        return templates
+
+    def _migrate_template_files(self, file_list: list[str], skip: Iterable[str]) -> dict[str, np.ndarray]:
+        """Moves templates from the old one file per user layout into the store in one transaction."""
+        loaded = self._load_template_files(file_list)
+        skip = set(skip) # Already in the store, a previous migration stopped before cleaning up
+        legacy = {username: embedding for username, embedding in loaded.items() if username not in skip}
+        self._store.commit(puts=legacy)
+
+        for file_name in file_list:
+            if self._config_mgr.biometric_config.extract_username(file_name) not in loaded:
+                continue # Unreadable, left for the user to inspect
+            try:
+                os.remove(os.path.join(self._config_mgr.basic_info.usr_data_dir, file_name))
+            except OSError as e:
+                logger.warning(f"Could not remove migrated template {file_name}: {e}")
+        logger.info(f"Migrated {len(legacy)} templates into {self._store.path}")
+        return legacy
+
+    def _load_template_files(self, file_list: list[str]) -> dict[str, np.ndarray]:
+        ciphers = {}
         for file_name in file_list:
             try:
                 with open(os.path.join(self._config_mgr.basic_info.usr_data_dir, file_name), 'rb') as file_content:
-                    decrypted = self._crypt_mgr.decrypt(file_content.read())
-                    embedding = np.frombuffer(decrypted, dtype=np.float32)
-                    embedding = embedding.reshape((self._EMBEDDING_SIZE,)) 
-                    username = self._config_mgr.biometric_config.extract_username(file_name)
-                    dic[username] = self._normalize(embedding)
-            except (FileNotFoundError, IOError, ValueError) as e:
+                    ciphers[file_name] = file_content.read()
+            except (FileNotFoundError, IOError) as e:
+                logger.warning(f"Skipping file {file_name} due to error: {e}")
+
+        dic = {}
+        decrypted_files = self._crypt_mgr.decrypt_many(list(ciphers.values()),
+                                                       threads=self._config_mgr.biometric_config.store_decrypt_threads,
+                                                       strict=False)
+        for file_name, decrypted in zip(ciphers, decrypted_files):
+            try:
+                if decrypted is None:
+                    raise ValueError("decryption failed")
+                embedding = np.frombuffer(decrypted, dtype=np.float32)
+                embedding = embedding.reshape((self._EMBEDDING_SIZE,))
+                username = self._config_mgr.biometric_config.extract_username(file_name)
+                dic[username] = self._normalize(embedding)
+            except ValueError as e:
                 logger.warning(f"Skipping file {file_name} due to error: {e}")
                 continue
 
         return dic
-    
+
     def match_embedding(self, audio: np.ndarray) -> bool:
+        match = self.verify_speaker(audio)
+        if match is None:
+            return False
+
+        self.accept_match(match)
+        return True
+
+    def verify_speaker(self, audio: np.ndarray) -> SpeakerMatch | None:
+        """The best matching user over the threshold, without updating their template yet."""
+        new_embedding_norm = self._embed(audio)
+        if new_embedding_norm is None:
+            return None
+
+        matches = self._search(new_embedding_norm, k=1)
+        if not matches:
+            return None
+
+        username, similarity = matches[0]
+        logger.debug(f'Similarity: {similarity}')
+        if similarity >= self._config_mgr.biometric_config.threshold:
+            logger.debug(f'Matched with: {username}')
+            return SpeakerMatch(username=username, similarity=similarity, embedding=new_embedding_norm)
+
+        return None
+
+    def accept_match(self, match: SpeakerMatch) -> None:
+        """Rolls the embedding into the user's template, once every other check passed as well."""
+        self._roll_template_update(username=match.username, embedding=match.embedding)
+
+    def top_matches(self, audio: np.ndarray, k: int = 1) -> list[tuple[str, float]]:
+        """The k enrolled users most similar to audio with their scores, best first. No threshold is applied."""
+        new_embedding_norm = self._embed(audio)
+        if new_embedding_norm is None:
+            return []
+        return self._search(new_embedding_norm, k=k)
+
+    def _search(self, embedding: np.ndarray, k: int) -> list[tuple[str, float]]:
+        if self._index is not None and self._index.trained:
+            return self._index.search(embedding, k=k)
+        return self._template.top_k(embedding, k=k)
+
+    def _index_path(self) -> str:
+        return os.path.join(self._config_mgr.basic_info.usr_data_dir, self._config_mgr.biometric_config.index_file)
+
+    def _load_index(self) -> None:
+        config = self._config_mgr.biometric_config
+        self._index = SpeakerIndex(dim=self._EMBEDDING_SIZE, n_lists=config.index_lists, n_probe=config.index_probe)
+        try:
+            with open(self._index_path(), 'rb') as f:
+                self._index.load_centroids(self._crypt_mgr.decrypt(f.read()))
+            self._index.rebuild(self._template)
+        except FileNotFoundError:
+            self._train_index()
+        except (OSError, ValueError, err.EncryptionError) as e:
+            logger.warning(f"Retraining speaker index, the stored one could not be loaded: {e}")
+            self._train_index()
+
+    def _train_index(self) -> None:
+        if len(self._template) < self._config_mgr.biometric_config.index_min_users:
+            return
+        self._index.train(self._template)
+        try:
+            with open(self._index_path(), 'wb') as f:
+                f.write(self._crypt_mgr.encrypt(self._index.to_bytes()))
+        except OSError as e:
+            logger.error(f"Could not save speaker index: {e}")
+
+    def _update_index(self, username: str) -> None:
+        if self._index is None:
+            return
+        if self._index.trained:
+            self._index.add(username, self._template[username])
+        else:
+            self._train_index()
+
+    def index_recall(self, k: int = 1, sample: int = 200, noise: float = 0.05, seed: int = 0) -> float:
+        """
+        Recall of the speaker index against the exact search, logged and returned.
+
+        Queries are enrolled templates with Gaussian noise added, standing in
+        for fresh embeddings of the same speakers.
+        """
+        if self._index is None or not self._index.trained:
+            return 1.0
+        rng = np.random.default_rng(seed)
+        snapshot = self._template.snapshot
+        matrix = snapshot.matrix
+        queries = matrix[rng.choice(len(matrix), min(sample, len(matrix)), replace=False)]
+        queries = queries + rng.normal(scale=noise, size=queries.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        recall = self._index.recall(queries, snapshot, k=k)
+        logger.info(f"Speaker index recall@{k}: {recall:.3f} over {len(queries)} queries")
+        return recall
+
+    def _embed(self, audio: np.ndarray) -> np.ndarray | None:
         if len(self._template) == 0:
             logger.critical("No Embedding Found")
-            return False
+            return None
         
         try:
             assert audio.dtype == np.float32, "Audio must be float32"
             assert audio.ndim == 1, "Audio must be mono (1D ndarray)"
         except AssertionError as e:
             logger.error(f"Invalid Audio data: {e}")
-            return False
+            return None
 
-        
         try:
             new_embedding = self._encoder.embed_utterance(audio)
-            new_embedding_norm = self._normalize(new_embedding)
+            return self._normalize(new_embedding).astype(np.float32)
         except Exception as e:
             logger.error(f"Embedding generation failed: {e}")
-            return False
-
-        for username in self._template:
-            similarity = np.dot(new_embedding_norm, self._template[username])
-
-            if similarity >= self._config_mgr.biometric_config.threshold:
-                logger.debug(f'Similarity: {similarity}')
-                logger.debug(f'Matched with: {username}')
-                self.start_template_update_thread(username=username, embedding=new_embedding_norm)
-                return True
-        
-        return False
-
-    def start_template_update_thread(self, username: str, embedding: np.ndarray) -> None:
-        if self.thread_mgr.get_thread_status(self._UPDATE_TEMPLATE_THREAD) != ThreadStatus.NOT_FOUND:
-            self.thread_mgr.stop_thread(self._UPDATE_TEMPLATE_THREAD)
-        
-        self.thread_mgr.create_new_thread(target=self._roll_template_update,
-                                          args=(username, embedding),
-                                          name=self._UPDATE_TEMPLATE_THREAD,
-                                          autostart=True)
+            return None
 
     def _normalize(self, embedding: np.ndarray) -> np.ndarray:
         norm = np.linalg.norm(embedding)
@@ -182,9 +580,27 @@ class BiometricTemplateGenerator:
         updated_embedding = self._normalize(updated_embedding)
 
         self._template[username] = updated_embedding
-        self._save_template(username=username, embedding=updated_embedding)
+        self._update_index(username)
+        self._writer.write(username=username, embedding=updated_embedding) # Written behind, see store_flush_interval
+
+    def _delete_template(self, username: str) -> None:
+        if username not in self._template:
+            return
+        self._forget(username)
+        self._writer.delete(username)
+        self._writer.flush()
+        logger.info(f"Deleted template of {username}")
+
+    def _forget(self, username: str) -> None:
+        del self._template[username]
+        if self._index is not None:
+            self._index.remove(username)
 
     def _delete_all_templates(self) -> None:
+        self._writer.discard()
+        self._store.clear()
+        for username in self._template.usernames:
+            self._forget(username)
         file_list = self._get_template_files(self._config_mgr.basic_info.usr_data_dir)
         for file_name in file_list:
             try:
@@ -193,4 +609,13 @@ class BiometricTemplateGenerator:
                 logger.warning(f"Skipping file {file_name} due to error: {e}")
                 continue
 
+        if self._index is not None:
+            self._index = SpeakerIndex(dim=self._EMBEDDING_SIZE,
+                                       n_lists=self._config_mgr.biometric_config.index_lists,
+                                       n_probe=self._config_mgr.biometric_config.index_probe)
+            try:
+                os.remove(self._index_path())
+            except FileNotFoundError:
+                pass
+
         logger.info("Deleted All templates")
\ No newline at end of file
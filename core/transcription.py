@@ -0,0 +1,189 @@
+from dataclasses import dataclass, field
+from threading import Condition, Event
+from typing import Callable
+import numpy as np
+from config.input_pipe_config import ASRProfile
+from utility.logger import get_logger
+import utility.errors as err
+
+logger = get_logger(__name__)
+
+@dataclass
+class TranscribedWord:
+    start: float
+    end: float
+    text: str
+    probability: float = 1.0
+
+@dataclass
+class TranscribedSegment:
+    start: float
+    end: float
+    text: str
+    words: list[TranscribedWord] = field(default_factory=list)
+
+@dataclass
+class TranscriptionResult:
+    """Plain-data copy of a faster-whisper decode, times are in seconds from the start of the utterance."""
+    text: str
+    segments: list[TranscribedSegment]
+    duration: float
+    language: str | None = None
+    language_probability: float | None = None
+
+
+def transcribe(model, audio: np.ndarray, sample_rate: int, profile: ASRProfile, offset: float = 0.0,
+               word_timestamps: bool = False) -> TranscriptionResult:
+    """Runs the model and shifts every timestamp by offset, so partial decodes line up with the full utterance."""
+    segments, info = model.transcribe(audio=audio,
+                                      beam_size=profile.beam_size,
+                                      temperature=profile.temperature,
+                                      language=profile.language,
+                                      word_timestamps=word_timestamps)
+    logger.info(f"Detected language '{info.language}' with probability {info.language_probability}")
+
+    result = []
+    for i, segment in enumerate(segments):
+        logger.info(f"[{segment.start + offset:.2f}s -> {segment.end + offset:.2f}s]: Segment {i+1}")
+        words = [TranscribedWord(start=word.start + offset, end=word.end + offset, text=word.word, probability=word.probability)
+                 for word in (segment.words or [])]
+        result.append(TranscribedSegment(start=segment.start + offset, end=segment.end + offset,
+                                         text=segment.text, words=words))
+
+    return TranscriptionResult(text=''.join(segment.text for segment in result),
+                               segments=result,
+                               duration=offset + len(audio) / sample_rate,
+                               language=info.language,
+                               language_probability=info.language_probability)
+
+
+def committed_prefix(result: TranscriptionResult, cutoff: float, min_probability: float = 0.0) -> tuple[str, float]:
+    """
+    Text of the words that end at or before cutoff, and the time they end at.
+
+    Whole segments are used when the decode has no word timestamps. Anything
+    after the returned time has to be decoded again, because words close to
+    the end of the audio may have been cut off. With min_probability the
+    prefix also stops at the first word the model was less sure of, and at
+    segments without words, whose confidence is unknown.
+    """
+    text, end = '', 0.0
+    for segment in result.segments:
+        if not segment.words and min_probability > 0:
+            return text, end
+        units = segment.words or [TranscribedWord(start=segment.start, end=segment.end, text=segment.text)]
+        for unit in units:
+            if unit.end > cutoff or unit.probability < min_probability:
+                return text, end
+            text += unit.text
+            end = unit.end
+    return text, end
+
+
+class StreamingTranscriber:
+    """
+    Re-decodes the utterance while the user is still speaking.
+
+    update() hands over the audio collected so far and run() (on its own
+    thread) decodes everything after the committed words whenever interval
+    seconds of new audio arrived. Words that two consecutive decodes agree on
+    and that end margin seconds before the end of the audio are committed, so
+    they are never decoded again. After the endpoint, finalize() only has to
+    decode the uncommitted tail. Every decode passes committed words plus the
+    current guess to on_partial.
+    """
+
+    def __init__(self, decode: Callable[[np.ndarray, float], TranscriptionResult], sample_rate: int,
+                 interval: float = 1.0, margin: float = 0.3, on_partial: Callable[[str], None] | None = None):
+        self._decode = decode
+        self._sample_rate = sample_rate
+        self._interval = interval
+        self._margin = margin
+        self._on_partial = on_partial
+        self._cond = Condition()
+        self._generation = 0
+        self.reset()
+
+    def reset(self) -> None:
+        with self._cond:
+            self._audio: np.ndarray | None = None
+            self._decoded_samples = 0
+            self._committed_text = ''
+            self._committed_end = 0.0
+            self._hypothesis: list[TranscribedWord] = []
+            self._generation += 1 # Results of a decode that is still running get dropped
+
+    @property
+    def committed_text(self) -> str:
+        with self._cond:
+            return self._committed_text
+
+    @property
+    def partial_text(self) -> str:
+        with self._cond:
+            return self._committed_text + ''.join(word.text for word in self._hypothesis)
+
+    def update(self, audio: np.ndarray) -> None:
+        """audio must stay unchanged until the next reset(), a view of the utterance buffer is fine."""
+        with self._cond:
+            self._audio = audio
+            self._cond.notify_all()
+
+    def run(self, stop_event: Event) -> None:
+        interval_samples = int(self._interval * self._sample_rate)
+        has_work = lambda: self._audio is not None and len(self._audio) - self._decoded_samples >= interval_samples
+
+        while not stop_event.is_set():
+            with self._cond:
+                if not self._cond.wait_for(has_work, timeout=0.1):
+                    continue
+                audio, generation, committed_end = self._audio, self._generation, self._committed_end
+                self._decoded_samples = len(audio)
+
+            try:
+                result = self._decode(audio[int(committed_end * self._sample_rate):], committed_end)
+            except err.TranscriptionError as e:
+                logger.warning(f"Streaming decode failed, the tail is decoded at the endpoint instead: {e}")
+                continue
+
+            with self._cond:
+                if generation != self._generation:
+                    continue
+                self._agree(result)
+
+            if self._on_partial is not None:
+                self._on_partial(self.partial_text)
+
+    def finalize(self, audio: np.ndarray) -> str:
+        """Decodes the audio after the committed words and returns the full transcript. Call once run() has stopped."""
+        with self._cond:
+            text, committed_end = self._committed_text, self._committed_end
+
+        start = int(committed_end * self._sample_rate)
+        if start < len(audio):
+            logger.debug(f"Streaming committed {committed_end:.2f}s, decoding the remaining {(len(audio) - start) / self._sample_rate:.2f}s")
+            text += self._decode(audio[start:], committed_end).text
+
+        self.reset()
+        return text
+
+    def _agree(self, result: TranscriptionResult) -> None:
+        # Caller must hold self._cond
+        words = [word for segment in result.segments
+                 for word in (segment.words or [TranscribedWord(segment.start, segment.end, segment.text)])]
+        cutoff = result.duration - self._margin
+
+        agreed = 0
+        for previous, current in zip(self._hypothesis, words):
+            if current.end > cutoff or _normalize(previous.text) != _normalize(current.text):
+                break
+            agreed += 1
+
+        if agreed:
+            self._committed_text += ''.join(word.text for word in words[:agreed])
+            self._committed_end = words[agreed - 1].end
+        self._hypothesis = words[agreed:]
+
+
+def _normalize(word: str) -> str:
+    return word.strip().lower().strip('.,!?')
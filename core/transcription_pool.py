@@ -0,0 +1,322 @@
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+import multiprocessing as mp
+from multiprocessing import connection
+from multiprocessing.shared_memory import SharedMemory
+from threading import Thread, Lock, Event
+from typing import Callable
+import numpy as np
+from config.input_pipe_config import ASRProfile
+from core.transcription import TranscriptionResult, transcribe
+from utility.logger import get_logger
+import utility.errors as err
+
+logger = get_logger(__name__)
+
+def load_whisper_model(model_size: str, device: str, compute_type: str):
+    from faster_whisper import WhisperModel # Imported in the worker, the capture process never loads CTranslate2
+    return WhisperModel(model_size, device=device, compute_type=compute_type)
+
+
+def _worker_main(conn: connection.Connection, model_sizes: tuple[str, ...], device: str, compute_type: str,
+                 sample_rate: int, model_factory: Callable) -> None:
+    models = {}
+    try:
+        for model_size in model_sizes:
+            models[model_size] = model_factory(model_size, device, compute_type)
+    except Exception as e:
+        conn.send(('failed', f"{type(e).__name__}: {e}"))
+        return
+    conn.send(('ready', None))
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError: # Parent went away
+            return
+        if task is None:
+            return
+        if task == 'ping':
+            conn.send(('pong', None))
+            continue
+
+        shm_name, length, profile, offset, word_timestamps = task
+        shm = SharedMemory(name=shm_name) # Spawned workers share the parent's resource tracker, the parent unlinks the block
+        try:
+            audio = np.ndarray((length,), dtype=np.float32, buffer=shm.buf)
+            if profile.model_size not in models:
+                models[profile.model_size] = model_factory(profile.model_size, device, compute_type)
+            reply = ('done', transcribe(model=models[profile.model_size], audio=audio, sample_rate=sample_rate,
+                                        profile=profile, offset=offset, word_timestamps=word_timestamps))
+        except Exception as e:
+            reply = ('error', f"{type(e).__name__}: {e}")
+        audio = None # Release the view before closing the block
+        shm.close()
+        conn.send(reply)
+
+
+@dataclass
+class _Task:
+    future: Future
+    shm: SharedMemory
+    length: int
+    profile: ASRProfile
+    offset: float
+    word_timestamps: bool
+    attempts: int = 0
+    started: float = 0.0
+
+    def release(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+class _Worker:
+    def __init__(self, index: int):
+        self.index = index
+        self.process: mp.process.BaseProcess | None = None
+        self.conn: connection.Connection | None = None
+        self.task: _Task | None = None
+        self.ready = False
+        self.start_failures = 0 # Consecutive deaths before the worker got ready
+        self.ping_sent: float | None = None
+        self.last_seen = 0.0
+
+
+class TranscriptionWorkerPool:
+    """
+    Runs Whisper in worker processes so inference never competes with capture for the GIL.
+
+    Every worker loads its own models and takes one task at a time. Audio is
+    copied once into a shared memory block that the worker decodes in place,
+    and submit() returns a Future for the TranscriptionResult. A monitor
+    thread hands tasks to idle workers, pings idle workers every
+    health_interval seconds and restarts workers that died, stopped answering
+    or spent more than task_timeout seconds on one task. A task that was
+    running on a crashed worker is retried once on another worker.
+    """
+
+    _MAX_ATTEMPTS = 2
+    _MAX_START_FAILURES = 3
+
+    def __init__(self, processes: int, model_sizes: tuple[str, ...], device: str, compute_type: str, sample_rate: int,
+                 task_timeout: float = 60.0, health_interval: float = 5.0, model_factory: Callable = load_whisper_model):
+        if processes <= 0:
+            raise ValueError("Transcription pool needs at least one worker process.")
+
+        self._context = mp.get_context('spawn') # Forking a process that runs torch and PortAudio threads is unsafe
+        self._model_sizes = tuple(dict.fromkeys(model_sizes))
+        self._device = device
+        self._compute_type = compute_type
+        self._sample_rate = sample_rate
+        self._task_timeout = task_timeout
+        self._health_interval = health_interval
+        self._model_factory = model_factory
+
+        self._pending: deque[_Task] = deque()
+        self._lock = Lock()
+        self._closing = Event()
+        self._wakeup_reader, self._wakeup_writer = self._context.Pipe(duplex=False)
+        self.restarts = 0
+        self._failed_workers = 0
+
+        self._workers = [_Worker(index) for index in range(processes)]
+        for worker in self._workers:
+            self._start_worker(worker)
+
+        self._monitor_thread = Thread(target=self._monitor, name='TranscriptionPoolMonitor', daemon=True)
+        self._monitor_thread.start()
+
+    @property
+    def processes(self) -> int:
+        return len(self._workers)
+
+    def submit(self, audio: np.ndarray, profile: ASRProfile, offset: float = 0.0, word_timestamps: bool = False) -> Future:
+        if self._closing.is_set():
+            raise err.TranscriptionWorkerError("Transcription pool is closed")
+        if self._failed_workers == len(self._workers):
+            raise err.ModelLoadError("No transcription worker could load its models")
+
+        audio = np.asarray(audio, dtype=np.float32)
+        shm = SharedMemory(create=True, size=max(1, audio.nbytes))
+        np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+
+        task = _Task(future=Future(), shm=shm, length=len(audio), profile=profile,
+                     offset=offset, word_timestamps=word_timestamps)
+        task.future.set_running_or_notify_cancel()
+        with self._lock:
+            self._pending.append(task)
+            self._wakeup_writer.send_bytes(b'\0')
+        return task.future
+
+    def transcribe(self, audio: np.ndarray, profile: ASRProfile, offset: float = 0.0, word_timestamps: bool = False,
+                   timeout: float | None = None) -> TranscriptionResult:
+        return self.submit(audio, profile, offset, word_timestamps).result(timeout=timeout)
+
+    def close(self) -> None:
+        if self._closing.is_set():
+            return
+        self._closing.set()
+        with self._lock:
+            self._wakeup_writer.send_bytes(b'\0')
+        self._monitor_thread.join()
+
+        for worker in self._workers:
+            if worker.task is not None:
+                self._finish(worker.task, error=err.TranscriptionWorkerError("Transcription pool closed"))
+                worker.task = None
+            self._stop_worker(worker)
+
+        self._fail_pending(err.TranscriptionWorkerError("Transcription pool closed"))
+        logger.info("Transcription pool closed")
+
+    def __enter__(self) -> 'TranscriptionWorkerPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _start_worker(self, worker: _Worker) -> None:
+        parent_conn, child_conn = self._context.Pipe()
+        worker.process = self._context.Process(target=_worker_main,
+                                               args=(child_conn, self._model_sizes, self._device, self._compute_type,
+                                                     self._sample_rate, self._model_factory),
+                                               name=f'TranscriptionWorker-{worker.index}',
+                                               daemon=True)
+        worker.process.start()
+        child_conn.close()
+        worker.conn = parent_conn
+        worker.ready = False
+        worker.ping_sent = None
+        worker.last_seen = time.monotonic()
+        logger.info(f"Started transcription worker {worker.index} (pid {worker.process.pid})")
+
+    def _stop_worker(self, worker: _Worker) -> None:
+        if worker.process is None:
+            return
+        try:
+            worker.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        worker.process.join(timeout=2)
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join()
+        worker.conn.close()
+        worker.process = None
+        worker.conn = None
+
+    def _restart_worker(self, worker: _Worker, reason: str) -> None:
+        task, worker.task = worker.task, None
+        if worker.process is not None and worker.process.is_alive():
+            worker.process.terminate()
+        self._stop_worker(worker)
+
+        if not worker.ready:
+            worker.start_failures += 1
+            if worker.start_failures >= self._MAX_START_FAILURES: # Dies while starting up, restarting will not help
+                self._mark_failed(worker, reason)
+                return
+        logger.error(f"Restarting transcription worker {worker.index}: {reason}")
+
+        if task is not None:
+            if task.attempts < self._MAX_ATTEMPTS:
+                with self._lock:
+                    self._pending.appendleft(task)
+            else:
+                self._finish(task, error=err.TranscriptionWorkerError(f"Transcription worker failed: {reason}"))
+
+        self.restarts += 1
+        self._start_worker(worker)
+
+    def _monitor(self) -> None:
+        while not self._closing.is_set():
+            conns = {worker.conn: worker for worker in self._workers if worker.conn is not None}
+            for ready in connection.wait([self._wakeup_reader, *conns], timeout=self._health_interval / 2):
+                if ready is self._wakeup_reader:
+                    while self._wakeup_reader.poll():
+                        self._wakeup_reader.recv_bytes()
+                else:
+                    self._receive(conns[ready])
+
+            self._check_health()
+            self._dispatch()
+
+    def _receive(self, worker: _Worker) -> None:
+        try:
+            kind, payload = worker.conn.recv()
+        except (EOFError, OSError):
+            self._restart_worker(worker, "worker process exited")
+            return
+
+        worker.last_seen = time.monotonic()
+        if kind == 'ready':
+            worker.ready = True
+            worker.start_failures = 0
+        elif kind == 'pong':
+            worker.ping_sent = None
+        elif kind == 'failed':
+            self._stop_worker(worker) # Not restarted, it would fail the same way
+            self._mark_failed(worker, f"could not load its models: {payload}")
+        elif worker.task is not None:
+            task, worker.task = worker.task, None
+            if kind == 'done':
+                self._finish(task, result=payload)
+            else:
+                self._finish(task, error=err.TranscriptionError(f"Failed to transcribe Audio: {payload}"))
+
+    def _mark_failed(self, worker: _Worker, reason: str) -> None:
+        logger.critical(f"Transcription worker {worker.index} failed: {reason}")
+        self._failed_workers += 1
+        if self._failed_workers == len(self._workers):
+            self._fail_pending(err.ModelLoadError(f"No transcription worker could start: {reason}"))
+
+    def _check_health(self) -> None:
+        now = time.monotonic()
+        for worker in self._workers:
+            if worker.process is None:
+                continue
+            if not worker.process.is_alive():
+                if worker.conn.poll(): # Read what it sent before exiting, a model load failure must not be restarted
+                    self._receive(worker)
+                    continue
+                self._restart_worker(worker, f"worker process died with exit code {worker.process.exitcode}")
+            elif worker.task is not None and now - worker.task.started > self._task_timeout:
+                self._restart_worker(worker, f"task exceeded {self._task_timeout}s")
+            elif worker.ping_sent is not None and now - worker.ping_sent > self._health_interval:
+                self._restart_worker(worker, "worker stopped answering health checks")
+            elif worker.ready and worker.task is None and worker.ping_sent is None and now - worker.last_seen > self._health_interval:
+                worker.ping_sent = now
+                worker.conn.send('ping')
+
+    def _dispatch(self) -> None:
+        for worker in self._workers:
+            if worker.process is None or not worker.ready or worker.task is not None or worker.ping_sent is not None:
+                continue
+            with self._lock:
+                if not self._pending:
+                    return
+                task = self._pending.popleft()
+
+            task.attempts += 1
+            task.started = time.monotonic()
+            worker.task = task
+            try:
+                worker.conn.send((task.shm.name, task.length, task.profile, task.offset, task.word_timestamps))
+            except (OSError, ValueError):
+                self._restart_worker(worker, "could not send task")
+
+    def _fail_pending(self, error: Exception) -> None:
+        with self._lock:
+            pending, self._pending = list(self._pending), deque()
+        for task in pending:
+            self._finish(task, error=error)
+
+    def _finish(self, task: _Task, result: TranscriptionResult | None = None, error: Exception | None = None) -> None:
+        task.release()
+        if error is not None:
+            task.future.set_exception(error)
+        else:
+            task.future.set_result(result)
@@ -0,0 +1,106 @@
+import os
+import torch
+from torch import nn
+from resemblyzer import VoiceEncoder
+from core.speaker_encoder import (SpeakerEncoder, TorchSpeakerEncoder, OnnxSpeakerEncoder, similarity_to,
+                                  partial_mels, probe_audio)
+from utility.logger import get_logger
+import utility.errors as err
+
+logger = get_logger(__name__)
+
+def load_voice_encoder(device: str | None = None) -> VoiceEncoder:
+    """resemblyzer's pretrained encoder, on CUDA when available unless device is given."""
+    return VoiceEncoder(device=device, verbose=False).eval()
+
+
+class LayeredVoiceEncoder(nn.Module):
+    """
+    VoiceEncoder with its stacked LSTM split into one module per layer.
+
+    Same weights and outputs, but quantization can now skip the first layer.
+    Its input is a mel power spectrogram whose range int8 activations can not
+    hold, quantizing it drops the similarity to the float model below 0.5. The
+    later layers only see tanh outputs and lose almost nothing.
+    """
+
+    def __init__(self, encoder: VoiceEncoder):
+        super().__init__()
+        lstm = encoder.lstm
+        self.layers = nn.ModuleList()
+        for i in range(lstm.num_layers):
+            layer = nn.LSTM(lstm.input_size if i == 0 else lstm.hidden_size, lstm.hidden_size, batch_first=True)
+            layer.load_state_dict({f'{name}_l0': getattr(lstm, f'{name}_l{i}').detach().cpu()
+                                   for name in ('weight_ih', 'weight_hh', 'bias_ih', 'bias_hh')})
+            self.layers.append(layer)
+        self.linear = nn.Linear(encoder.linear.in_features, encoder.linear.out_features)
+        self.linear.load_state_dict({name: value.detach().cpu() for name, value in encoder.linear.state_dict().items()})
+
+    def forward(self, mels: torch.Tensor) -> torch.Tensor:
+        output = mels
+        for layer in self.layers:
+            output, (hidden, _) = layer(output)
+        embeds = torch.relu(self.linear(hidden[-1]))
+        return embeds / torch.norm(embeds, dim=1, keepdim=True)
+
+
+def quantize_encoder(encoder: VoiceEncoder) -> nn.Module:
+    """int8 dynamic quantization of every LSTM layer but the first and of the output projection."""
+    layered = LayeredVoiceEncoder(encoder).eval()
+    modules = {f'layers.{i}' for i in range(1, len(layered.layers))} | {'linear'}
+    return torch.ao.quantization.quantize_dynamic(layered, modules, dtype=torch.qint8)
+
+
+def _quantize_onnx(source: str, target: str) -> None:
+    try:
+        import onnx
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise err.ModelLoadError("Quantizing the onnx speaker encoder needs onnx and onnxruntime") from e
+
+    first_lstm = next(node.name for node in onnx.load(source).graph.node if node.op_type == 'LSTM')
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8, nodes_to_exclude=[first_lstm])
+
+
+def export_voice_encoder(path: str, backend: str, quantize: bool, min_similarity: float) -> None:
+    """
+    Exports resemblyzer's weights to a TorchScript or ONNX file at path.
+
+    The export is compared with the eager encoder on probe audio and only
+    moved into place when it agrees at least min_similarity, so a half
+    written or incompatible file is never loaded.
+    """
+    reference = load_voice_encoder(device='cpu')
+    layered = LayeredVoiceEncoder(reference).eval()
+    example = torch.from_numpy(partial_mels(probe_audio()))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = path + '.tmp'
+
+    try:
+        with torch.no_grad():
+            if backend == 'torchscript':
+                model = quantize_encoder(reference) if quantize else layered
+                torch.jit.trace(model, example).save(staging)
+            elif backend == 'onnx':
+                float_path = staging + '.float' if quantize else staging
+                torch.onnx.export(layered, (example,), float_path,
+                                  input_names=['mels'], output_names=['embeds'],
+                                  dynamic_axes={'mels': {0: 'partials'}, 'embeds': {0: 'partials'}},
+                                  opset_version=17, dynamo=False)
+                if quantize:
+                    _quantize_onnx(float_path, staging)
+                    os.remove(float_path)
+            else:
+                raise ValueError(f"Can not export the speaker encoder to {backend}")
+    except (ImportError, RuntimeError) as e: # torch.onnx reports a missing onnx package as a RuntimeError
+        raise err.ModelLoadError(f"Failed to export the speaker encoder to {backend}") from e
+
+    candidate: SpeakerEncoder = (OnnxSpeakerEncoder(staging) if backend == 'onnx'
+                                 else TorchSpeakerEncoder(torch.jit.load(staging, map_location='cpu')))
+    similarity = similarity_to(TorchSpeakerEncoder(reference), candidate)
+    if similarity < min_similarity:
+        os.remove(staging)
+        raise err.ModelLoadError(f"Exported speaker encoder only reaches similarity {similarity:.4f}")
+
+    os.replace(staging, path)
+    logger.info(f"Exported speaker encoder to {path} (similarity {similarity:.4f})")
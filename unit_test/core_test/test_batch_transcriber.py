@@ -0,0 +1,108 @@
+import json
+import pytest
+import numpy as np
+import scipy.io.wavfile as wav
+from concurrent.futures import Future
+from unittest.mock import MagicMock
+from config.input_pipe_config import ASRProfile, VADConfig
+from core.batch_transcriber import BatchTranscriber, collect_inputs, completed_paths, speech_bounds
+from core.transcription import TranscribedSegment, TranscriptionResult
+import utility.errors as err
+
+SAMPLE_RATE = 16000
+
+def tone(seconds, amplitude=0.5):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+@pytest.fixture
+def wav_dir(tmp_path):
+    for i in range(3):
+        wav.write(str(tmp_path / f"clip_{i}.wav"), SAMPLE_RATE, tone(0.5 + i * 0.25))
+    (tmp_path / "notes.txt").write_text("not audio")
+    return tmp_path
+
+@pytest.fixture
+def pool():
+    def submit(audio, profile, offset=0.0, word_timestamps=False):
+        future = Future()
+        duration = len(audio) / SAMPLE_RATE
+        if duration > 0.9:
+            future.set_exception(err.TranscriptionWorkerError("worker crashed"))
+        else:
+            future.set_result(TranscriptionResult(text=f" {len(audio)} samples", duration=offset + duration, language="en",
+                                                  segments=[TranscribedSegment(offset, offset + duration, f" {len(audio)} samples")]))
+        return future
+
+    pool = MagicMock(processes=2)
+    pool.submit.side_effect = submit
+    return pool
+
+def read_records(path):
+    records = {}
+    with open(path) as f:
+        for line in f:
+            if line.startswith('{"path": "torn'): # Left behind by an interrupted run
+                continue
+            record = json.loads(line)
+            records[record['path']] = record
+    return records
+
+def test_collect_inputs_from_directory_and_manifest(wav_dir):
+    paths = collect_inputs(str(wav_dir))
+    assert [p.split('/')[-1] for p in paths] == ["clip_0.wav", "clip_1.wav", "clip_2.wav"]
+
+    manifest = wav_dir / "manifest.jsonl"
+    manifest.write_text('{"path": "clip_1.wav"}\n\n# comment\nclip_2.wav\n')
+    assert collect_inputs(str(manifest)) == [str(wav_dir / "clip_1.wav"), str(wav_dir / "clip_2.wav")]
+
+def test_speech_bounds_trims_silence():
+    config = VADConfig(backend='spectral')
+    audio = np.concatenate([np.zeros(SAMPLE_RATE, dtype=np.float32), tone(0.6), np.zeros(SAMPLE_RATE, dtype=np.float32)])
+    start, stop = speech_bounds(audio, SAMPLE_RATE, config, padding_ms=0)
+    assert start == pytest.approx(SAMPLE_RATE, abs=480)
+    assert stop - start == pytest.approx(int(0.6 * SAMPLE_RATE), abs=480 * (config.spectral_hangover_frames + 1))
+    assert speech_bounds(np.zeros(SAMPLE_RATE, dtype=np.float32), SAMPLE_RATE, config) == (0, 0)
+
+def test_batch_writes_results_and_errors(wav_dir, pool, tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    paths = collect_inputs(str(wav_dir)) + [str(wav_dir / "missing.wav")]
+
+    summary = BatchTranscriber(pool, ASRProfile(), SAMPLE_RATE, prepare_threads=2).run(paths, output)
+
+    records = read_records(output)
+    assert summary.files == 4 and summary.failed == 2
+    assert records[paths[0]]['text'] == "8000 samples"
+    assert records[paths[0]]['duration_s'] == 0.5
+    assert {'load_ms', 'trim_ms', 'transcribe_ms'} <= records[paths[0]].keys()
+    assert records[paths[2]]['error'] == "worker crashed"
+    assert 'error' in records[paths[3]]
+
+def test_batch_resumes_after_completed_files(wav_dir, pool, tmp_path):
+    output = tmp_path / "out.jsonl"
+    paths = collect_inputs(str(wav_dir))
+    output.write_text(json.dumps({'path': paths[0], 'text': 'done'}) + '\n{"path": "torn')
+
+    summary = BatchTranscriber(pool, ASRProfile(), SAMPLE_RATE).run(paths, str(output))
+
+    assert summary.skipped == 1
+    assert [call.args[0].size for call in pool.submit.call_args_list] == [12000, 16000]
+    assert completed_paths(str(output)) == {paths[0], paths[1]}
+    assert read_records(str(output))[paths[0]]['text'] == 'done'
+
+def test_unexpected_prepare_error_fails_only_that_file(wav_dir, pool, tmp_path, monkeypatch):
+    output = str(tmp_path / "out.jsonl")
+    paths = collect_inputs(str(wav_dir))
+    real_bounds = speech_bounds
+    def odd_file(audio, sample_rate, vad_config):
+        if len(audio) == int(0.75 * SAMPLE_RATE):
+            raise MemoryError("odd file")
+        return real_bounds(audio, sample_rate, vad_config)
+    monkeypatch.setattr("core.batch_transcriber.speech_bounds", odd_file)
+
+    summary = BatchTranscriber(pool, ASRProfile(), SAMPLE_RATE, vad_config=VADConfig(backend='spectral')).run(paths, output)
+
+    records = read_records(output)
+    assert summary.files == 3 and summary.failed == 1
+    assert records[paths[1]]['error'] == "MemoryError: odd file"
+    assert 'text' in records[paths[0]] and 'text' in records[paths[2]] # The files after it were still transcribed
@@ -0,0 +1,83 @@
+import json
+import pytest
+import numpy as np
+import scipy.io.wavfile as wav
+from core.bulk_enrollment import BulkEnroller, EnrollmentEntry, read_enrollment_manifest
+from config.input_pipe_config import WakeWordConfig
+from core.speaker_encoder import EMBEDDING_SIZE, MEL_CHANNELS, SpeakerEncoder, probe_audio
+from utility.wake_word import KeywordSpotter
+import utility.errors as err
+
+class ProjectionEncoder(SpeakerEncoder):
+    """Fixed random projection of each partial's mean mel frame, records the batch sizes it was called with."""
+
+    def __init__(self):
+        self._projection = np.random.default_rng(0).normal(size=(MEL_CHANNELS, EMBEDDING_SIZE)).astype(np.float32)
+        self.batches = []
+
+    def embed_partials(self, mels):
+        self.batches.append(len(mels))
+        embeds = np.log1p(mels).mean(axis=1) @ self._projection
+        return embeds / np.linalg.norm(embeds, axis=1, keepdims=True)
+
+def clip_audio(i):
+    return probe_audio(f0=110.0 + 40 * i, seconds=2.0 + i)
+
+@pytest.fixture
+def clips(tmp_path):
+    paths = {}
+    for i in range(4):
+        path = tmp_path / f"clip_{i}.wav"
+        wav.write(str(path), 16000, clip_audio(i))
+        paths[i] = str(path)
+    return paths
+
+def test_read_manifest(tmp_path):
+    manifest = tmp_path / "staff.txt"
+    manifest.write_text("# staff\n"
+                        "alice clips/a 1.wav\n"
+                        + json.dumps({"username": "bob", "paths": ["b1.wav", "b2.wav"]}) + "\n"
+                        + json.dumps({"username": "alice", "path": "/abs/a2.wav"}) + "\n")
+
+    entries = read_enrollment_manifest(str(manifest))
+    assert [entry.username for entry in entries] == ["alice", "bob"]
+    assert entries[0].paths == [str(tmp_path / "clips/a 1.wav"), "/abs/a2.wav"]
+    assert entries[1].paths == [str(tmp_path / "b1.wav"), str(tmp_path / "b2.wav")]
+
+    manifest.write_text("alice\n")
+    with pytest.raises(err.FileAccessError):
+        read_enrollment_manifest(str(manifest))
+
+def test_batched_templates_match_per_clip_embedding(clips):
+    encoder = ProjectionEncoder()
+    enroller = BulkEnroller(encoder, batch_partials=6, prepare_threads=2)
+    templates, summary = enroller.run([EnrollmentEntry("alice", [clips[0], clips[1]]),
+                                       EnrollmentEntry("bob", [clips[2], clips[3]])])
+
+    assert summary.users == 2 and summary.clips == 4 and summary.failed_clips == 0
+    assert summary.batches == len(encoder.batches) < summary.clips # Partials of several clips share a call
+    assert sum(encoder.batches) == summary.partials
+
+    for username, indices in (("alice", (0, 1)), ("bob", (2, 3))):
+        normalized = [0.95 * clip_audio(i) / np.abs(clip_audio(i)).max() for i in indices] # Like live enrollment audio
+        expected = np.mean([encoder.embed_utterance(audio) for audio in normalized], axis=0)
+        assert np.allclose(templates[username], expected / np.linalg.norm(expected), atol=1e-4)
+
+def test_unusable_clips_are_skipped(clips, tmp_path):
+    silent = tmp_path / "silent.wav"
+    wav.write(str(silent), 16000, np.zeros(16000, dtype=np.float32))
+    templates, summary = BulkEnroller(ProjectionEncoder()).run([EnrollmentEntry("alice", [clips[0], str(tmp_path / "missing.wav")]),
+                                                                EnrollmentEntry("bob", [str(silent)])])
+
+    assert list(templates) == ["alice"]
+    assert summary.failed_clips == 2 and summary.failed_users == 1
+
+def test_keyword_features_are_collected_per_clip(clips):
+    spotter = KeywordSpotter(WakeWordConfig(), sample_rate=16000)
+    enroller = BulkEnroller(ProjectionEncoder(), keyword_spotter=spotter)
+    _, summary = enroller.run([EnrollmentEntry("alice", [clips[0]]), EnrollmentEntry("bob", [clips[1], clips[2]])])
+
+    assert summary.keyword_templates == len(enroller.keyword_templates) == 3
+    normalized = 0.95 * clip_audio(1) / np.abs(clip_audio(1)).max()
+    np.testing.assert_allclose(enroller.keyword_templates[1], spotter.features(normalized.astype(np.float32)), atol=1e-3)
+    assert not spotter.ready # Only added once the caller decides to save them
@@ -1,7 +1,12 @@
 import pytest
 import numpy as np
+from threading import Event
 from unittest.mock import MagicMock, patch
 from core.input_pipeline import InputPipeline, WakeUpChecks
+from config.input_pipe_config import ASRProfile, WhisperModelConfig
+from utility.audio_source import ReplaySource
+from utility.VAD import EnergyGate
+from utility.worker_pool import WorkerPool
 import utility.errors as err
 
 @pytest.fixture
@@ -9,19 +14,36 @@ def mock_config():
     mock_cfg = MagicMock()
     mock_cfg.audio_config.sample_rate = 16000
     mock_cfg.audio_config.channels = 1
-    mock_cfg.audio_config.dtype = 'float32'
+    mock_cfg.audio_config.dtype = 'int16'
     mock_cfg.audio_config.duration = 1.0
+    mock_cfg.audio_config.ring_buffer_duration = 2.0
+    mock_cfg.audio_config.utterance_buffer_duration = 1.0
+    mock_cfg.audio_config.source = 'microphone'
 
+    mock_cfg.vad_config.backend = 'webrtc'
     mock_cfg.vad_config.frame_duration_ms = 30
     mock_cfg.vad_config.silence_counter_max = 3
     mock_cfg.vad_config.check_wake_after_frames = 3
+    mock_cfg.vad_config.energy_gate = False
+
+    mock_cfg.endpoint_config.adaptive = False
+
+    mock_cfg.wake_word_config.engine = 'transcript'
 
     mock_cfg.filter_config.normalizing_peak = 0.99
     mock_cfg.filter_config.low_cutoff = 100
     mock_cfg.filter_config.high_cutoff = 3000
+    mock_cfg.filter_config.order = 1
+    mock_cfg.filter_config.noise_suppression = False
 
-    mock_cfg.model_config.model_sm.transcribe.return_value = ([MagicMock(start=0, end=1, text="hello")], MagicMock(language="en", language_probability=0.99))
-    mock_cfg.model_config.beam_size = 5
+    mock_cfg.model_config.model_for.return_value.transcribe.return_value = ([MagicMock(start=0, end=1, text="hello")], MagicMock(language="en", language_probability=0.99))
+    mock_cfg.model_config.wake_profile = ASRProfile(model_size='tiny', beam_size=1, temperature=0.0, language='en')
+    mock_cfg.model_config.command_profile = ASRProfile()
+    mock_cfg.model_config.reuse_wake_transcript = True
+    mock_cfg.model_config.reuse_margin = 0.3
+    mock_cfg.model_config.reuse_min_probability = 0.8
+    mock_cfg.model_config.streaming = False
+    mock_cfg.model_config.worker_processes = 0
 
     mock_cfg.biometric_config.audio_sample_required = 1
 
@@ -30,72 +52,355 @@ def mock_config():
 @pytest.fixture
 def mock_template():
     mock_template = MagicMock()
-    mock_template.match_embedding.return_value = True
+    mock_template.verify_speaker.return_value = MagicMock(username='user', similarity=0.9)
     mock_template.is_template = True
     return mock_template
 
 @pytest.fixture
 def pipeline(mock_config, mock_template):
-    with patch("core.input_pipeline.ThreadManager") as mock_thread_mgr_class, \
-         patch("core.input_pipeline.bandpass_filter", return_value="filter"):
+    with patch("core.input_pipeline.ThreadManager") as mock_thread_mgr_class:
         mock_thread_mgr = MagicMock()
         mock_thread_mgr.active_threads = {'AudioStreamThread': MagicMock(stop_event=MagicMock(is_set=MagicMock(return_value=True)))}
         mock_thread_mgr.create_new_thread.return_value = MagicMock()
         mock_thread_mgr.get_thread_status.return_value = MagicMock()
         mock_thread_mgr.stop_thread = MagicMock()
         mock_thread_mgr.stop_all_threads = MagicMock()
+        mock_thread_mgr.get_worker_pool.side_effect = lambda name, **kwargs: WorkerPool(name=name, **kwargs)
 
         mock_thread_mgr_class.return_value = mock_thread_mgr
 
         return InputPipeline(mock_config, mock_template)
 
-def test_byte_to_float32_audio_valid(pipeline):
-    raw_bytes = (np.ones(16000, dtype=np.int16)).tobytes()
-    result = pipeline.byte_to_float32_audio([raw_bytes])
+def test_utterance_audio_valid(pipeline):
+    pipeline.utterance.append_pcm16(np.ones(16000, dtype=np.int16).tobytes())
+    result = pipeline._utterance_audio()
     assert isinstance(result, np.ndarray)
     assert result.dtype == np.float32
+    assert len(result) == 16000
 
-def test_byte_to_float32_audio_invalid(pipeline):
+def test_utterance_audio_invalid(pipeline):
     with pytest.raises(err.InvalidAudioError):
-        pipeline.byte_to_float32_audio([])
+        pipeline._utterance_audio()
+
+def test_read_audio_frames(pipeline):
+    audio_chunk = np.full(16000, 1000, dtype=np.int16)
+    pipeline.ring_buffer.write(audio_chunk)
+    with patch.object(pipeline.audio_filter, "process", side_effect=lambda audio, out=None: audio):
+        result = pipeline._read_audio_frames()
+
+    assert isinstance(result, memoryview)
+    assert len(result) == 16000 * np.dtype(np.int16).itemsize
+    assert np.all(np.frombuffer(result, dtype=np.int16) == 1000)
+
+def test_read_audio_frames_reuses_chunk_buffer(pipeline):
+    pipeline.ring_buffer.write(np.zeros(32000, dtype=np.int16))
+    with patch.object(pipeline.audio_filter, "process", side_effect=lambda audio, out=None: audio):
+        first = pipeline._read_audio_frames()
+        second = pipeline._read_audio_frames()
 
-def test_process_audio_to_bytes(pipeline):
-    audio_chunk = np.ones(16000, dtype=np.float32)
-    pipeline.queue.put(audio_chunk)
-    result = pipeline._process_audio_to_bytes()
-    assert isinstance(result, bytes)
+    assert first.obj is second.obj is pipeline._chunk
 
-def test_process_audio_to_bytes_queue_empty(pipeline):
-    with pytest.raises(err.QueueEmptyError, match="Audio queue is empty"):
-        pipeline._process_audio_to_bytes()
+def test_read_audio_frames_queue_empty(pipeline):
+    with patch.object(pipeline.ring_buffer, "read_into", return_value=False), \
+         pytest.raises(err.QueueEmptyError, match="Audio queue is empty"):
+        pipeline._read_audio_frames()
+
+def test_replay_source_feeds_pipeline(pipeline):
+    pipeline.audio_source = ReplaySource([np.full(16000, 0.5, dtype=np.float32)], sample_rate=16000, realtime=False)
+    pipeline.audio_source.stream(ring_buffer=pipeline.ring_buffer, stop_event=Event())
+
+    with patch.object(pipeline.audio_filter, "process", side_effect=lambda audio, out=None: audio):
+        result = pipeline._read_audio_frames()
+        assert np.all(np.frombuffer(result, dtype=np.int16) == int(0.5 * np.iinfo(np.int16).max))
+
+        with pytest.raises(err.AudioSourceExhaustedError):
+            pipeline._read_audio_frames()
 
 def test_wake_up_validation(pipeline):
     audio = np.ones(16000, dtype=np.float32)
     checks = WakeUpChecks()
-    with patch("core.input_pipeline.wud.wake_up_detection_stub", return_value=True):
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=True):
         pipeline.wake_up_validation(audio, checks)
+        assert checks.wait(timeout=5)
+    assert checks.passed
     assert checks.wake_up is True
     assert checks.biometric_pass is True
 
+def test_wake_up_validation_keeps_transcription(pipeline):
+    checks = WakeUpChecks()
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=True):
+        pipeline.wake_up_validation(np.ones(16000, dtype=np.float32), checks)
+        checks.wait(timeout=5)
+    assert checks.transcription.text == "hello"
+    assert checks.transcription.duration == pytest.approx(1.0)
+
+def test_transcribe_command_reuses_wake_words(pipeline, mock_config):
+    mock_config.model_config.wake_profile = mock_config.model_config.command_profile
+    word = lambda start, end, text: MagicMock(start=start, end=end, word=text, probability=0.5)
+    wake_segment = MagicMock(start=0.0, end=1.0, text=" hey melody op",
+                             words=[word(0.0, 0.3, " hey"), word(0.3, 0.6, " melody"), word(0.6, 1.0, " op")])
+    tail_segment = MagicMock(start=0.0, end=1.4, text=" open browser", words=[])
+    info = MagicMock(language="en", language_probability=0.99)
+    model = mock_config.model_config.model_for.return_value
+    model.transcribe.side_effect = [([wake_segment], info), ([tail_segment], info)]
+
+    checks = WakeUpChecks()
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=True):
+        pipeline.wake_up_validation(np.ones(16000, dtype=np.float32), checks)
+        checks.wait(timeout=5)
+    pipeline.wake_transcription = checks.transcription
+
+    command = pipeline.transcribe_command(np.ones(32000, dtype=np.float32))
+
+    assert command == " hey melody open browser"
+    assert len(model.transcribe.call_args.kwargs["audio"]) == 32000 - int(0.6 * 16000) # Only the audio after "melody"
+    assert pipeline.wake_transcription is None
+
+def wake_decode(pipeline, mock_config, words):
+    """Runs a wake check whose decode returned words, a list of (start, end, text, probability)."""
+    segment = MagicMock(start=0.0, end=1.0, text="".join(word[2] for word in words),
+                        words=[MagicMock(start=start, end=end, word=text, probability=probability)
+                               for start, end, text, probability in words])
+    tail = MagicMock(start=0.0, end=1.4, text=" open browser", words=[])
+    info = MagicMock(language="en", language_probability=0.99)
+    model = mock_config.model_config.model_for.return_value
+    model.transcribe.side_effect = [([segment], info), ([tail], info)]
+
+    checks = WakeUpChecks()
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=True):
+        pipeline.wake_up_validation(np.ones(16000, dtype=np.float32), checks)
+        checks.wait(timeout=5)
+    pipeline.wake_transcription = checks.transcription
+    return model
+
+def test_default_config_reuses_confident_wake_words(pipeline, mock_config):
+    defaults = WhisperModelConfig()
+    for name in ("wake_profile", "command_profile", "reuse_wake_transcript", "reuse_margin", "reuse_min_probability"):
+        setattr(mock_config.model_config, name, getattr(defaults, name))
+
+    model = wake_decode(pipeline, mock_config, [(0.0, 0.3, " hey", 0.95), (0.3, 0.6, " melody", 0.9), (0.6, 1.0, " op", 0.4)])
+    assert model.transcribe.call_args_list[0].kwargs["word_timestamps"] is True
+
+    assert pipeline.transcribe_command(np.ones(32000, dtype=np.float32)) == " hey melody open browser"
+    assert model.transcribe.call_args.kwargs["beam_size"] == defaults.command_profile.beam_size
+    assert len(model.transcribe.call_args.kwargs["audio"]) == 32000 - int(0.6 * 16000)
+
+def test_unsure_wake_words_are_decoded_again(pipeline, mock_config):
+    model = wake_decode(pipeline, mock_config, [(0.0, 0.3, " hey", 0.95), (0.3, 0.6, " melon", 0.5)])
+
+    pipeline.transcribe_command(np.ones(32000, dtype=np.float32))
+    assert len(model.transcribe.call_args.kwargs["audio"]) == 32000 - int(0.3 * 16000) # Only " hey" is kept
+
+def test_transcribe_command_without_committed_words(pipeline, mock_config):
+    pipeline.wake_transcription = None
+    assert pipeline.transcribe_command(np.ones(16000, dtype=np.float32)) == "hello"
+    assert len(mock_config.model_config.model_for.return_value.transcribe.call_args.kwargs["audio"]) == 16000
+
+def test_wake_check_uses_wake_profile(pipeline, mock_config):
+    model_config = mock_config.model_config
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=False):
+        checks = WakeUpChecks()
+        pipeline.wake_up_validation(np.ones(16000, dtype=np.float32), checks)
+        checks.wait(timeout=5)
+    model_config.model_for.assert_called_with(model_config.wake_profile)
+    assert model_config.model_for.return_value.transcribe.call_args.kwargs["beam_size"] == 1
+
+    pipeline.transcribe_command(np.ones(16000, dtype=np.float32))
+    model_config.model_for.assert_called_with(model_config.command_profile)
+    assert model_config.model_for.return_value.transcribe.call_args.kwargs["beam_size"] == 5
+
+def test_keyword_spotter_triggers_wake_check_without_asr(pipeline, mock_config):
+    spotter = MagicMock(ready=True, needs_transcript=False)
+    spotter.push.side_effect = [False, True]
+    pipeline.wake_word_detector = spotter
+
+    def detect_speech(utterance):
+        utterance.append_pcm16(np.full(480, 1000, dtype=np.int16).tobytes())
+        return utterance.frame_count < 3
+
+    with patch.object(pipeline, "_voice_activity_detector", side_effect=detect_speech):
+        audio = pipeline._wake_up_detect()
+
+    assert len(audio) == 3 * 480
+    assert spotter.push.call_count == 2 # Stops scoring once the wake word was spotted
+    mock_config.model_config.model_for.return_value.transcribe.assert_not_called()
+    spotter.detect.assert_not_called() # Already heard, only the speaker was checked
+    pipeline.voice_template.accept_match.assert_called_once_with(pipeline.voice_template.verify_speaker.return_value)
+
+def test_streaming_starts_once_the_wake_word_was_heard(pipeline):
+    spotter = MagicMock(ready=True, needs_transcript=False)
+    spotter.push.side_effect = [False, True]
+    pipeline.wake_word_detector = spotter
+    pipeline.streaming_transcriber = MagicMock(partial_text="")
+
+    def detect_speech(utterance):
+        utterance.append_pcm16(np.full(480, 1000, dtype=np.int16).tobytes())
+        return utterance.frame_count < 3
+
+    with patch.object(pipeline, "_voice_activity_detector", side_effect=detect_speech):
+        pipeline._wake_up_detect()
+
+    pipeline.streaming_transcriber.update.assert_called_once() # Not for the frames before the wake word
+    assert len(pipeline.streaming_transcriber.update.call_args.args[0]) == 3 * 480
+
+def test_speaker_check_runs_during_wake_decode(pipeline, mock_config, mock_template):
+    decode_started, release_decode = Event(), Event()
+    model = mock_config.model_config.model_for.return_value
+    wake_result = model.transcribe.return_value
+
+    def slow_transcribe(**kwargs):
+        decode_started.set()
+        release_decode.wait(timeout=5)
+        return wake_result
+    model.transcribe.side_effect = slow_transcribe
+
+    checks = WakeUpChecks()
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=True):
+        pipeline.wake_up_validation(np.ones(16000, dtype=np.float32), checks)
+        assert decode_started.wait(timeout=5)
+        assert not checks.wait(timeout=0.2) # Still decoding
+        assert checks.biometric_pass and checks.speaker_match is mock_template.verify_speaker.return_value
+        release_decode.set()
+        assert checks.wait(timeout=5)
+    assert checks.passed
+    mock_template.accept_match.assert_not_called() # Left to the caller once the utterance is accepted
+
+def test_failed_speaker_check_decides_without_wake_decode(pipeline, mock_config, mock_template):
+    release_decode = Event()
+    model = mock_config.model_config.model_for.return_value
+    model.transcribe.side_effect = lambda **kwargs: release_decode.wait(timeout=5) and model.transcribe.return_value
+    mock_template.verify_speaker.return_value = None
+
+    checks = WakeUpChecks()
+    pipeline.wake_up_validation(np.ones(16000, dtype=np.float32), checks)
+    assert checks.wait(timeout=5)
+    assert checks.failed and checks.speaker_failed and not checks.wake_failed
+    release_decode.set()
+
+def test_failed_wake_check_cancels_queued_speaker_check(pipeline, mock_template):
+    busy, release = Event(), Event()
+    pipeline._speaker_pool.submit(lambda: busy.set() or release.wait(timeout=5))
+    assert busy.wait(timeout=5)
+
+    checks = WakeUpChecks()
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=False):
+        pipeline.wake_up_validation(np.ones(16000, dtype=np.float32), checks)
+        assert checks.wait(timeout=5)
+    release.set()
+    pipeline._speaker_pool.submit(lambda: None).result(timeout=5)
+
+    assert checks.wake_failed
+    mock_template.verify_speaker.assert_not_called()
+
+def test_stuck_speaker_pool_fails_the_check(pipeline, mock_template):
+    busy, release = Event(), Event()
+    pipeline._speaker_pool.submit(lambda: busy.set() or release.wait(timeout=5))
+    assert busy.wait(timeout=5)
+    for _ in range(2): # Fills the queue
+        pipeline._speaker_pool.submit(release.wait, 5)
+
+    checks = WakeUpChecks()
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=True):
+        pipeline.wake_up_validation(np.ones(16000, dtype=np.float32), checks)
+        assert checks.wait(timeout=5)
+    release.set()
+
+    assert checks.speaker_failed and not checks.passed
+    assert pipeline._speaker_pool.stats.rejected == 1
+
+def test_back_to_back_utterances_drop_stale_checks(pipeline, mock_config, mock_template):
+    releases = []
+    for pool in (pipeline._wake_pool, pipeline._speaker_pool): # Both busy with an earlier utterance
+        busy, release = Event(), Event()
+        pool.submit(lambda busy=busy, release=release: busy.set() or release.wait(timeout=5))
+        assert busy.wait(timeout=5)
+        releases.append(release)
+
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=True):
+        stale = []
+        for _ in range(3): # Each new utterance cancels the queued checks of the one before
+            stale.append(pipeline._new_wake_up_checks())
+            pipeline.wake_up_validation(np.ones(16000, dtype=np.float32), stale[-1])
+        current = pipeline._new_wake_up_checks()
+        pipeline.wake_up_validation(np.ones(16000, dtype=np.float32), current)
+        for release in releases:
+            release.set()
+        assert current.wait(timeout=5)
+
+    assert current.passed
+    assert all(checks.cancelled for checks in stale)
+    mock_template.verify_speaker.assert_called_once() # Only the current utterance is embedded
+    assert mock_config.model_config.model_for.return_value.transcribe.call_count == 1
+    assert pipeline._wake_pool.stats.rejected == 0 and pipeline._speaker_pool.stats.rejected == 0
+
+def test_checks_keep_their_audio_when_the_buffer_is_reused(pipeline, mock_template):
+    busy, release = Event(), Event()
+    pipeline._speaker_pool.submit(lambda: busy.set() or release.wait(timeout=5))
+    assert busy.wait(timeout=5)
+    seen = []
+    mock_template.verify_speaker.side_effect = lambda audio: seen.append(audio.copy())
+
+    buffer = np.full(16000, 0.5, dtype=np.float32)
+    checks = WakeUpChecks()
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=True):
+        pipeline.wake_up_validation(buffer, checks)
+        buffer[:] = -0.25 # The next utterance overwrites the buffer while the check still waits
+        release.set()
+        assert checks.wait(timeout=5)
+
+    assert len(seen) == 1 and np.all(seen[0] > 0)
+
+def test_transcription_goes_through_worker_pool(pipeline, mock_config):
+    pipeline.transcription_pool = MagicMock()
+    pipeline.transcription_pool.transcribe.return_value.text = " show time"
+
+    assert pipeline.transcribe_audio(np.ones(16000, dtype=np.float32)) == " show time"
+    assert pipeline.transcription_pool.transcribe.call_args.kwargs["profile"] is mock_config.model_config.command_profile
+    mock_config.model_config.model_for.return_value.transcribe.assert_not_called()
+
+def test_transcribe_command_finalizes_streaming(pipeline):
+    pipeline.streaming_transcriber = MagicMock()
+    pipeline.streaming_transcriber.finalize.return_value = " open browser"
+    audio = np.ones(16000, dtype=np.float32)
+
+    assert pipeline.transcribe_command(audio) == " open browser"
+    pipeline.streaming_transcriber.finalize.assert_called_once_with(audio)
+
 def test_voice_activity_detector_speech_then_silence(pipeline):
     frame_size = 960  # based on your config
     silence_trigger = pipeline._config.vad_config.silence_counter_max
 
     # Make audio with 5 speech frames, then silence_trigger + 1 silent frames
     total_frames = 5 + silence_trigger + 1
-    dummy_audio = b'\x01' * (frame_size * total_frames)  # fake audio bytes
+    dummy_audio = memoryview(b'\x01' * (frame_size * total_frames))  # fake audio frames
 
     # Simulate: speech → silence → triggers silence stop
     speech_pattern = [True] * 5 + [False] * (silence_trigger + 1)
 
-    with patch.object(pipeline, "_process_audio_to_bytes", return_value=dummy_audio), \
+    with patch.object(pipeline, "_read_audio_frames", return_value=dummy_audio), \
          patch.object(pipeline.vad, "isSpeech", side_effect=speech_pattern):
 
-        speech_frames = []
-        result = pipeline._voice_activity_detector(speech_frames)
+        result = pipeline._voice_activity_detector(pipeline.utterance)
 
         assert result is False
-        assert len(speech_frames) == 5
+        assert pipeline.utterance.frame_count == 5
+        assert len(pipeline.utterance) == 5 * frame_size // 2
+
+def test_voice_activity_detector_energy_gate_skips_silent_frames(pipeline, mock_config):
+    mock_config.vad_config.gate_threshold_db = 6.0
+    mock_config.vad_config.gate_min_dbfs = -60.0
+    mock_config.vad_config.gate_smoothing = 0.95
+    pipeline.energy_gate = EnergyGate(mock_config.vad_config)
+
+    loud, quiet = np.full(480, 8000, dtype=np.int16), np.zeros(480, dtype=np.int16)
+    audio = memoryview(np.concatenate([quiet, loud, loud, quiet]).tobytes())
+
+    with patch.object(pipeline, "_read_audio_frames", return_value=audio), \
+         patch.object(pipeline.vad, "isSpeech", return_value=True) as is_speech:
+        pipeline._voice_activity_detector(pipeline.utterance)
+
+    assert is_speech.call_count == 2
+    assert pipeline.utterance.frame_count == 2
 
 def test_get_command_success(pipeline):
     with patch.object(pipeline, "_record_audio_stream"), \
@@ -110,15 +415,18 @@ def test_get_command_no_template(pipeline, mock_template):
         pipeline.get_command()
 
 def test_get_template_audio_success(pipeline):
+    def detect_one_utterance(utterance):
+        utterance.append_pcm16(np.full(480, 1000, dtype=np.int16).tobytes())
+        return False
+
     with patch.object(pipeline, "_record_audio_stream"), \
-         patch.object(pipeline, "byte_to_float32_audio", return_value=np.ones(16000, dtype=np.float32)), \
          patch.object(pipeline, "transcribe_audio", return_value="placeholder for transcription"), \
-         patch.object(pipeline, "_voice_activity_detector", side_effect=[False, False]), \
-         patch("core.input_pipeline.wud.wake_up_detection_stub", return_value=True):
+         patch.object(pipeline, "_voice_activity_detector", side_effect=detect_one_utterance), \
+         patch("utility.wake_word.wud.wake_up_detection_stub", return_value=True):
         
         result = pipeline.get_template_audio()
 
     assert isinstance(result, list)
     assert all(isinstance(i, np.ndarray) for i in result)
     assert len(result) == pipeline._config.biometric_config.audio_sample_required
-
+    assert all(sample.flags.writeable for sample in result) # Copied out of the shared utterance buffer
@@ -0,0 +1,75 @@
+import pytest
+import numpy as np
+from unittest.mock import MagicMock, patch
+from resemblyzer import VoiceEncoder, wav_to_mel_spectrogram
+from config.input_pipe_config import VoiceBiometricConfig
+from core.speaker_encoder import (TorchSpeakerEncoder, OnnxSpeakerEncoder, create_speaker_encoder, exported_encoder_path,
+                                  partial_slices, probe_audio, similarity_to, wav_to_mel)
+from core.voice_encoder_export import LayeredVoiceEncoder, load_voice_encoder
+import utility.errors as err
+
+@pytest.fixture(scope="module")
+def voice_encoder():
+    return load_voice_encoder(device='cpu')
+
+@pytest.fixture
+def encoder_config():
+    config = VoiceBiometricConfig()
+    config.encoder_warmup = False
+    config.encoder_threads = 1
+    return config
+
+def test_preprocessing_matches_resemblyzer():
+    wav = probe_audio(f0=120.0, seconds=3.3)
+    assert np.array_equal(wav_to_mel(wav), wav_to_mel_spectrogram(wav))
+    for n_samples in (100, 16_000, 26_000, 53_000):
+        assert partial_slices(n_samples) == VoiceEncoder.compute_partial_slices(n_samples, rate=1.3, min_coverage=0.75)
+
+def test_torch_encoder_matches_voice_encoder(voice_encoder):
+    wav = probe_audio(f0=120.0, seconds=3.3)
+    assert np.allclose(TorchSpeakerEncoder(voice_encoder).embed_utterance(wav), voice_encoder.embed_utterance(wav), atol=1e-6)
+    assert np.allclose(TorchSpeakerEncoder(LayeredVoiceEncoder(voice_encoder)).embed_utterance(wav),
+                       voice_encoder.embed_utterance(wav), atol=1e-5)
+
+def test_quantized_encoder_stays_compatible(encoder_config, voice_encoder, tmp_path):
+    encoder_config.encoder_quantize = True
+    encoder = create_speaker_encoder(encoder_config, str(tmp_path))
+    assert similarity_to(TorchSpeakerEncoder(voice_encoder), encoder) >= encoder_config.encoder_min_similarity
+
+def test_torchscript_export_is_reused(encoder_config, voice_encoder, tmp_path):
+    encoder_config.encoder_backend = 'torchscript'
+    encoder = create_speaker_encoder(encoder_config, str(tmp_path))
+    wav = probe_audio(f0=180.0, seconds=4.0) # More partials than the traced example
+    assert float(encoder.embed_utterance(wav) @ voice_encoder.embed_utterance(wav)) == pytest.approx(1.0, abs=1e-5)
+
+    with patch("core.voice_encoder_export.export_voice_encoder") as export:
+        create_speaker_encoder(encoder_config, str(tmp_path))
+    export.assert_not_called()
+
+def test_onnx_export(encoder_config, voice_encoder, tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    encoder_config.encoder_backend = 'onnx'
+    encoder = create_speaker_encoder(encoder_config, str(tmp_path))
+    wav = probe_audio(f0=180.0, seconds=4.0)
+    assert isinstance(encoder, OnnxSpeakerEncoder)
+    assert float(encoder.embed_utterance(wav) @ voice_encoder.embed_utterance(wav)) == pytest.approx(1.0, abs=1e-5)
+
+def test_incompatible_export_falls_back_to_eager(encoder_config, tmp_path):
+    encoder_config.encoder_backend = 'torchscript'
+    encoder_config.encoder_min_similarity = 1.1
+    encoder = create_speaker_encoder(encoder_config, str(tmp_path))
+    assert isinstance(encoder, TorchSpeakerEncoder)
+    assert not (tmp_path / encoder_config.encoder_dir).joinpath('voice_encoder.pt').exists()
+    assert not [path for path in (tmp_path / encoder_config.encoder_dir).iterdir()] # No staging file left behind
+
+def test_unknown_backend(encoder_config, tmp_path):
+    encoder_config.encoder_backend = 'tensorrt'
+    with pytest.raises(ValueError):
+        create_speaker_encoder(encoder_config, str(tmp_path))
+
+def test_warmup_runs_once(encoder_config, tmp_path):
+    encoder_config.encoder_warmup = True
+    with patch("core.speaker_encoder._load_encoder") as load:
+        create_speaker_encoder(encoder_config, str(tmp_path))
+    load.return_value.warmup.assert_called_once()
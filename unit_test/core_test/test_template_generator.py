@@ -1,19 +1,24 @@
+import threading
 import pytest
 import numpy as np
 from unittest.mock import MagicMock, patch
-from core.template_generator import BiometricTemplateGenerator
-import builtins
-from io import BytesIO
+from core.template_generator import BiometricTemplateGenerator, SpeakerMatch, TemplateMatrix, SpeakerIndex
+import utility.errors as err
 
 @pytest.fixture
-def mock_config_mgr():
+def mock_config_mgr(tmp_path):
     mock_cfg = MagicMock()
-    mock_cfg.basic_info.usr_data_dir = "/tmp"
+    mock_cfg.basic_info.usr_data_dir = str(tmp_path)
     mock_cfg.biometric_config.get_file_name.return_value = "test_user.biotemplate"
     mock_cfg.biometric_config.get_file_pattern.return_value = ("", ".biotemplate")
     mock_cfg.biometric_config.extract_username.return_value = "test_user"
     mock_cfg.biometric_config.threshold = 0.7
     mock_cfg.biometric_config.update_weight = 0.5
+    mock_cfg.biometric_config.speaker_index = False
+    mock_cfg.biometric_config.store_file = "templates.store"
+    mock_cfg.biometric_config.store_compact_ratio = 1.0
+    mock_cfg.biometric_config.store_decrypt_threads = 2
+    mock_cfg.biometric_config.store_flush_interval = 60.0
     return mock_cfg
 
 @pytest.fixture
@@ -31,25 +36,23 @@ def mock_encoder(mock_embedding):
 
     return mock_encoder
 
-@pytest.fixture
-def mock_thread_mgr():
-    mock_thread_mgr = MagicMock()
-    return mock_thread_mgr
-
 @pytest.fixture
 def mock_crypt_mgr(mock_embedding):
     mock_crypt_mgr = MagicMock()
     mock_crypt_mgr.decrypt.return_value = mock_embedding.tobytes()
     mock_crypt_mgr.encrypt.return_value = b"encrypted_data"
+    mock_crypt_mgr.decrypt_many.side_effect = lambda items, threads=4, strict=True: [mock_crypt_mgr.decrypt(item) for item in items]
+    mock_crypt_mgr.encrypt_many.side_effect = lambda items, threads=4: [mock_crypt_mgr.encrypt(item) for item in items]
     
     return mock_crypt_mgr
 
 @pytest.fixture
-def bt(mock_config_mgr, mock_encoder, mock_crypt_mgr, mock_thread_mgr):
-    with patch("core.template_generator.VoiceEncoder", return_value=mock_encoder), \
-         patch("core.template_generator.CryptManager", return_value=mock_crypt_mgr), \
-         patch("core.template_generator.ThreadManager", return_value=mock_thread_mgr):
-        return BiometricTemplateGenerator(mock_config_mgr)
+def bt(mock_config_mgr, mock_encoder, mock_crypt_mgr):
+    with patch("core.template_generator.create_speaker_encoder", return_value=mock_encoder), \
+         patch("core.template_generator.CryptManager", return_value=mock_crypt_mgr):
+        generator = BiometricTemplateGenerator(mock_config_mgr)
+    yield generator
+    generator.close()
     
 
 @patch("core.template_generator.os.listdir", return_value=["test_user.biotemplate"])
@@ -67,7 +70,19 @@ def test_get_new_template(mock_logger, mock_listdir, bt, audio_list):
         assert template.shape == (256,)
         assert np.isclose(np.linalg.norm(template), 1.0)
 
-        mock_save.assert_called_once_with(username="test_user", embedding=template)
+        mock_save.assert_called_once()
+        assert mock_save.call_args.kwargs["username"] == "test_user"
+        assert np.allclose(mock_save.call_args.kwargs["embedding"], template)
+
+def test_new_template_is_unit_norm(bt, mock_encoder):
+    generator = bt
+    mock_encoder.embed_utterance.side_effect = [np.eye(256, dtype=np.float32)[i] for i in range(3)]
+
+    with patch.object(generator, "_get_username", return_value="test_user"), patch.object(generator, "_save_template") as mock_save:
+        generator.get_new_template([np.ones(256, dtype=np.float32) for _ in range(3)])
+
+    assert np.isclose(np.linalg.norm(generator._template["test_user"]), 1.0) # The plain mean has norm 1/sqrt(3)
+    assert np.array_equal(mock_save.call_args.kwargs["embedding"], generator._template["test_user"])
 
 def test_get_username_valid(bt, caplog):
     generator = bt
@@ -98,55 +113,64 @@ def test_get_username_retry_on_empty(bt, caplog):
             assert caplog.text.count("Invalid Username") >= 1
 
 @patch("core.template_generator.logger")
-def test_load_embedding(mock_logger, bt, mock_embedding):
+def test_load_embedding_migrates_template_files(mock_logger, bt, mock_config_mgr, mock_embedding, tmp_path):
     generator = bt
+    generator._store = MagicMock()
+    generator._store.load.return_value = {}
+    for name in ("file1.biotemplate", "file2.biotemplate"):
+        (tmp_path / name).write_bytes(b"encrypted_data")
+    mock_config_mgr.biometric_config.extract_username.side_effect = lambda file_name: file_name.split(".")[0]
 
-    mock_files = ["file1.biotemplate", "file2.biotemplate"]
-    fake_file_data = mock_embedding.tobytes()
+    loaded = generator._load_embedding()
 
-    with patch.object(generator, "_get_template_files", return_value=mock_files), \
-         patch.object(generator, "_normalize", return_value=mock_embedding), \
-         patch("builtins.open", return_value=BytesIO(fake_file_data)) as mock_open:
+    assert sorted(loaded) == ["file1", "file2"]
+    assert np.allclose(loaded["file1"], mock_embedding / np.linalg.norm(mock_embedding))
+    generator._store.commit.assert_called_once()
+    assert sorted(generator._store.commit.call_args.kwargs["puts"]) == ["file1", "file2"]
+    assert not list(tmp_path.glob("*.biotemplate")) # Removed once they are in the store
 
-        loaded = generator._load_embedding()
-
-        assert "test_user" in loaded
-        assert isinstance(loaded["test_user"], np.ndarray)
-        assert np.allclose(loaded["test_user"], mock_embedding)
+def test_load_embedding_reads_store(bt, mock_embedding):
+    generator = bt
+    generator._store = MagicMock()
+    generator._store.load.return_value = {"test_user": 2 * mock_embedding}
 
-        assert mock_open.call_count == len(mock_files)
+    loaded = generator._load_embedding()
+    assert np.isclose(np.linalg.norm(loaded["test_user"]), 1.0)
+    generator._store.commit.assert_not_called()
 
-@patch("core.template_generator.open", new_callable=MagicMock)
-def test_save_template_success(mock_open, bt, mock_embedding):
+def test_save_template_success(bt, mock_embedding):
     generator = bt
+    generator._writer._store = MagicMock()
+    generator._writer.write("other_user", mock_embedding) # Pending rolling update
 
-    with patch.object(generator._crypt_mgr, "encrypt", return_value=b"encrypted_data"):
-        generator._save_template("test_user", mock_embedding)
-
-        mock_open.assert_called_once()
-        handle = mock_open.return_value.__enter__.return_value
-        handle.write.assert_called_once_with(b"encrypted_data")
+    generator._save_template("test_user", mock_embedding)
+    generator._writer._store.commit.assert_called_once()
+    assert sorted(generator._writer._store.commit.call_args.kwargs["puts"]) == ["other_user", "test_user"]
+    assert generator._writer.pending == 0
 
 @patch("core.template_generator.logger")
-@patch("core.template_generator.open", side_effect=OSError("Disk error"))
-def test_save_template_failure(mock_open, mock_logger, bt, mock_embedding):
+def test_save_template_failure(mock_logger, bt, mock_embedding):
     generator = bt
+    generator._writer._store = MagicMock()
+    generator._writer._store.commit.side_effect = err.FileAccessError("Disk error")
 
     with pytest.raises(Exception) as exc_info:
         generator._save_template("test_user", mock_embedding)
 
     assert "Failed write on Disk" in str(exc_info.value)
-    assert mock_open.call_count == 3
+    assert generator._writer._store.commit.call_count == 3
+    assert generator._writer.pending == 1 # Kept for the next flush
+    generator._writer.discard()
 
 def test_match_embedding_success(bt, mock_embedding):
     generator = bt
     generator._template["test_user"] = mock_embedding  # already normalized
     with patch.object(generator._encoder, "embed_utterance", return_value=mock_embedding), \
-         patch.object(generator, "start_template_update_thread") as mock_thread:
+         patch.object(generator, "_roll_template_update") as mock_update:
 
         audio = np.ones(256, dtype=np.float32)
         assert generator.match_embedding(audio) is True
-        mock_thread.assert_called_once()
+        mock_update.assert_called_once()
 
 def test_match_embedding_no_match(bt, mock_embedding):
     generator = bt
@@ -155,6 +179,103 @@ def test_match_embedding_no_match(bt, mock_embedding):
         audio = np.ones(256, dtype=np.float32)
         assert generator.match_embedding(audio) is False
 
+def test_match_embedding_picks_best_user(bt):
+    generator = bt
+    embedding = np.zeros(256, dtype=np.float32)
+    embedding[:2] = [0.8, 0.6]
+    generator._template["first"] = np.eye(256, dtype=np.float32)[0] # Over the threshold, but not the best match
+    generator._template["best"] = embedding
+    with patch.object(generator._encoder, "embed_utterance", return_value=embedding), \
+         patch.object(generator, "_roll_template_update") as mock_update:
+
+        assert generator.match_embedding(np.ones(256, dtype=np.float32)) is True
+        assert mock_update.call_args.kwargs["username"] == "best"
+        assert [username for username, _ in generator.top_matches(np.ones(256, dtype=np.float32), k=3)] == ["best", "first"]
+
+def test_verify_speaker_leaves_template_update_to_accept(bt, mock_embedding):
+    generator = bt
+    generator._template["test_user"] = mock_embedding
+    with patch.object(generator._encoder, "embed_utterance", return_value=mock_embedding), \
+         patch.object(generator, "_roll_template_update") as mock_update:
+
+        match = generator.verify_speaker(np.ones(256, dtype=np.float32))
+        assert match.username == "test_user"
+        mock_update.assert_not_called()
+
+        generator.accept_match(match)
+        mock_update.assert_called_once_with(username="test_user", embedding=match.embedding)
+
+def test_accepted_match_is_written_behind(bt):
+    generator = bt
+    generator._writer._store = MagicMock()
+    generator._template["test_user"] = np.eye(256, dtype=np.float32)[0]
+    embedding = np.eye(256, dtype=np.float32)[1]
+
+    for _ in range(3):
+        generator.accept_match(SpeakerMatch(username="test_user", similarity=0.9, embedding=embedding))
+
+    generator._writer._store.commit.assert_not_called() # No disk I/O on the command path
+    assert generator._template["test_user"][1] > generator._template["test_user"][0]
+    generator.close()
+    generator._writer._store.commit.assert_called_once()
+    assert np.array_equal(generator._writer._store.commit.call_args.kwargs["puts"]["test_user"], generator._template["test_user"])
+    assert generator.flush_stats.coalesced == 2
+
+def test_enroll_writes_one_transaction(bt):
+    generator = bt
+    generator._writer._store = MagicMock()
+    templates = {f"user_{i}": 2 * np.eye(256, dtype=np.float32)[i] for i in range(5)}
+
+    generator.enroll(templates)
+
+    generator._writer._store.commit.assert_called_once()
+    assert sorted(generator._writer._store.commit.call_args.kwargs["puts"]) == sorted(templates)
+    assert all(generator.is_enrolled(username) for username in templates)
+    assert np.allclose(generator._template["user_3"], np.eye(256)[3])
+
+def test_template_matrix_publishes_snapshots():
+    matrix = TemplateMatrix(dim=4)
+    for i, username in enumerate(["a", "b", "c"]):
+        matrix[username] = np.eye(4)[i]
+    before = matrix.snapshot
+    data = matrix._data
+
+    matrix["d"] = np.eye(4)[3]
+    assert matrix._data is data # Appending needs no copy
+    matrix["b"] = np.eye(4)[3]
+    del matrix["a"]
+
+    assert before.usernames == ("a", "b", "c") # Readers holding the old snapshot see no change
+    assert np.array_equal(before.matrix, np.eye(4, dtype=np.float32)[:3])
+    assert not before.matrix.flags.writeable
+    assert matrix.usernames == ["d", "b", "c"]
+    assert np.array_equal(matrix.matrix, np.eye(4, dtype=np.float32)[[3, 3, 2]])
+    assert matrix.top_k(np.eye(4, dtype=np.float32)[2], k=5)[0] == ("c", 1.0)
+
+def test_template_matrix_readers_never_see_torn_updates():
+    matrix = TemplateMatrix(dim=64, templates={f"user_{i}": np.full(64, i, dtype=np.float32) for i in range(50)})
+    stop = threading.Event()
+    torn = []
+
+    def read():
+        while not stop.is_set():
+            snapshot = matrix.snapshot
+            rows = snapshot.matrix
+            if len(set(snapshot.usernames)) != len(snapshot.usernames) or not np.all(rows == rows[:, :1]):
+                torn.append(snapshot)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    for i in range(300):
+        matrix[f"user_{i % 50}"] = np.full(64, i, dtype=np.float32)
+        if i % 7 == 0:
+            del matrix[f"user_{i % 50}"]
+    stop.set()
+    for reader in readers:
+        reader.join()
+    assert not torn
+
 def test_normalize_zero_vector(bt):
     generator = bt
     with pytest.raises(ValueError):
@@ -170,6 +291,98 @@ def test_get_template_files(mock_listdir, bt):
 @patch("core.template_generator.logger")
 def test_delete_all_templates(mock_logger, mock_remove, bt):
     generator = bt
+    generator._store = MagicMock()
+    generator._writer.write("test_user", np.ones(256, dtype=np.float32))
     with patch.object(generator, "_get_template_files", return_value=["f1.biotemplate", "f2.biotemplate"]):
         generator._delete_all_templates()
         assert mock_remove.call_count == 2
+        generator._store.clear.assert_called_once()
+    assert generator._writer.pending == 0
+
+def clustered_templates(n_users, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.abs(rng.normal(size=(20, 256)))
+    data = centers[rng.integers(0, 20, n_users)] + 0.6 * np.abs(rng.normal(size=(n_users, 256)))
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return TemplateMatrix(dim=256, templates={f"user_{i}": row for i, row in enumerate(data)})
+
+def test_speaker_index_matches_exact_search():
+    templates = clustered_templates(500)
+    index = SpeakerIndex(dim=256, n_lists=0, n_probe=4)
+    index.train(templates)
+
+    assert len(index) == 500
+    assert index.recall(templates.matrix[:50], templates, k=1) == 1.0
+    assert index.search(templates["user_7"], k=1)[0][0] == "user_7"
+
+def test_speaker_index_incremental_updates():
+    templates = clustered_templates(200)
+    index = SpeakerIndex(dim=256, n_lists=8, n_probe=8)
+    index.train(templates)
+
+    new_user = templates["user_3"] # A copy of user_3's voice enrolled under a new name
+    index.add("new_user", new_user)
+    assert {username for username, _ in index.search(new_user, k=2)} == {"user_3", "new_user"}
+
+    index.remove("user_3")
+    index.add("new_user", -new_user) # Moves to another cluster
+    assert index.search(new_user, k=1)[0][0] != "user_3"
+    assert len(index) == 200
+
+def test_speaker_index_centroids_round_trip():
+    templates = clustered_templates(100)
+    index = SpeakerIndex(dim=256, n_lists=5, n_probe=2)
+    index.train(templates)
+
+    restored = SpeakerIndex(dim=256, n_lists=5, n_probe=2)
+    restored.load_centroids(index.to_bytes())
+    restored.rebuild(templates)
+
+    query = templates["user_42"]
+    assert restored.search(query, k=3) == index.search(query, k=3)
+    wrong_dim = SpeakerIndex(dim=8, n_lists=1, n_probe=1)
+    wrong_dim.set_centroids(np.ones((1, 8), dtype=np.float32))
+    with pytest.raises(ValueError):
+        restored.load_centroids(wrong_dim.to_bytes())
+
+def test_generator_searches_through_index(bt, mock_config_mgr, tmp_path):
+    generator = bt
+    mock_config_mgr.basic_info.usr_data_dir = str(tmp_path)
+    mock_config_mgr.biometric_config.index_file = "speaker_index.enc"
+    mock_config_mgr.biometric_config.index_min_users = 100
+    mock_config_mgr.biometric_config.index_lists = 0
+    mock_config_mgr.biometric_config.index_probe = 4
+    generator._template = clustered_templates(150)
+
+    generator._load_index() # No stored index yet, trains one and saves it
+    assert generator._index.trained
+    assert (tmp_path / "speaker_index.enc").read_bytes() == b"encrypted_data"
+
+    with patch.object(generator._index, "search", wraps=generator._index.search) as search, \
+         patch.object(generator._encoder, "embed_utterance", return_value=generator._template["user_5"]):
+        assert generator.top_matches(np.ones(256, dtype=np.float32))[0][0] == "user_5"
+        search.assert_called_once()
+    assert generator.index_recall(k=1, sample=50) == 1.0
+
+def test_deleted_users_leave_the_index(bt, mock_config_mgr, tmp_path):
+    generator = bt
+    mock_config_mgr.biometric_config.index_file = "speaker_index.enc"
+    mock_config_mgr.biometric_config.index_min_users = 100
+    mock_config_mgr.biometric_config.index_lists = 0
+    mock_config_mgr.biometric_config.index_probe = 4
+    generator._template = clustered_templates(150)
+    generator._load_index()
+    generator._writer._store = MagicMock()
+    deleted = generator._template["user_5"]
+
+    generator._delete_template("user_5")
+    assert "user_5" not in {username for username, _ in generator._index.search(deleted, k=5)}
+    assert not generator.is_enrolled("user_5")
+    assert generator._writer._store.commit.call_args.kwargs["deletes"] == ["user_5"]
+    assert len(generator._index) == 149
+
+    index = generator._index
+    generator._delete_all_templates()
+    assert len(index) == 0
+    assert not generator.is_template
+    assert not generator._index.trained
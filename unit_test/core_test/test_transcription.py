@@ -0,0 +1,92 @@
+import time
+import pytest
+import numpy as np
+from threading import Event, Thread
+from unittest.mock import MagicMock
+from config.input_pipe_config import ASRProfile
+from core.transcription import (TranscribedSegment, TranscribedWord, TranscriptionResult, StreamingTranscriber,
+                                transcribe, committed_prefix)
+
+def test_transcribe_shifts_timestamps_by_offset():
+    model = MagicMock()
+    segment = MagicMock(start=0.5, end=1.0, text=" world", words=[MagicMock(start=0.5, end=1.0, word=" world")])
+    model.transcribe.return_value = ([segment], MagicMock(language="en", language_probability=0.9))
+
+    result = transcribe(model, np.zeros(16000, dtype=np.float32), sample_rate=16000, profile=ASRProfile(), offset=2.0)
+
+    assert result.text == " world"
+    assert result.segments[0].start == pytest.approx(2.5)
+    assert result.segments[0].words[0].end == pytest.approx(3.0)
+    assert result.duration == pytest.approx(3.0)
+
+def test_committed_prefix_stops_at_cutoff():
+    result = TranscriptionResult(text=" a b c", duration=1.5, segments=[
+        TranscribedSegment(start=0.0, end=1.5, text=" a b c", words=[TranscribedWord(0.0, 0.4, " a"),
+                                                                    TranscribedWord(0.4, 0.9, " b"),
+                                                                    TranscribedWord(0.9, 1.5, " c")])])
+    assert committed_prefix(result, cutoff=1.2) == (" a b", 0.9)
+    assert committed_prefix(result, cutoff=0.1) == ("", 0.0)
+
+def test_committed_prefix_falls_back_to_segments():
+    result = TranscriptionResult(text=" a b", duration=2.0, segments=[TranscribedSegment(0.0, 0.8, " a"),
+                                                                      TranscribedSegment(0.8, 2.0, " b")])
+    assert committed_prefix(result, cutoff=1.7) == (" a", 0.8)
+
+def test_committed_prefix_stops_at_unsure_words():
+    result = TranscriptionResult(text=" a b c", duration=2.0, segments=[
+        TranscribedSegment(start=0.0, end=1.5, text=" a b c", words=[TranscribedWord(0.0, 0.4, " a", 0.9),
+                                                                    TranscribedWord(0.4, 0.9, " b", 0.6),
+                                                                    TranscribedWord(0.9, 1.5, " c", 0.9)])])
+    assert committed_prefix(result, cutoff=1.7, min_probability=0.8) == (" a", 0.4)
+    assert committed_prefix(result, cutoff=1.7) == (" a b c", 1.5)
+    no_words = TranscriptionResult(text=" a", duration=2.0, segments=[TranscribedSegment(0.0, 0.8, " a")])
+    assert committed_prefix(no_words, cutoff=1.7, min_probability=0.8) == ("", 0.0)
+
+def _decoder(hypotheses, calls):
+    """Fake decode returning the next hypothesis, a list of (start, end, word) in utterance time."""
+    def decode(audio, offset):
+        calls.append((len(audio), offset))
+        words = [TranscribedWord(start, end, text) for start, end, text in hypotheses.pop(0)]
+        return TranscriptionResult(text=''.join(w.text for w in words), duration=offset + len(audio) / 100,
+                                   segments=[TranscribedSegment(offset, offset + len(audio) / 100, '', words)])
+    return decode
+
+def test_streaming_transcriber_commits_agreed_prefix():
+    calls, partials = [], []
+    hypotheses = [[(0.0, 0.5, " open"), (0.5, 0.9, " brow")],
+                  [(0.0, 0.5, " open"), (0.5, 1.2, " browser")],
+                  [(0.5, 1.2, " browser")]]
+    streamer = StreamingTranscriber(decode=_decoder(hypotheses, calls), sample_rate=100, interval=1.0, margin=0.3,
+                                    on_partial=partials.append)
+    with streamer._cond:
+        streamer._agree(streamer._decode(np.zeros(100), 0.0))
+    assert streamer.committed_text == ""
+    assert streamer.partial_text == " open brow"
+
+    with streamer._cond:
+        streamer._agree(streamer._decode(np.zeros(150), 0.0))
+    assert streamer.committed_text == " open" # " browser" changed and ends inside the margin
+    assert streamer.partial_text == " open browser"
+
+    assert streamer.finalize(np.zeros(150)) == " open browser"
+    assert calls[-1] == (100, 0.5) # Only the audio after the committed word
+    assert streamer.committed_text == ""
+
+def test_streaming_transcriber_run_decodes_new_audio():
+    calls, partials = [], []
+    streamer = StreamingTranscriber(decode=_decoder([[(0.0, 0.5, " hi")]], calls), sample_rate=100, interval=1.0,
+                                    on_partial=partials.append)
+    stop_event = Event()
+    worker = Thread(target=streamer.run, args=(stop_event,))
+    worker.start()
+    streamer.update(np.zeros(50)) # Less than interval, nothing to decode yet
+    streamer.update(np.zeros(120))
+    for _ in range(100):
+        if partials:
+            break
+        time.sleep(0.01)
+    stop_event.set()
+    worker.join()
+
+    assert calls == [(120, 0.0)]
+    assert partials == [" hi"]
@@ -0,0 +1,70 @@
+import os
+import pytest
+import numpy as np
+from types import SimpleNamespace
+from config.input_pipe_config import ASRProfile
+from core.transcription_pool import TranscriptionWorkerPool
+import utility.errors as err
+
+class FakeModel:
+    """Says how many samples it got, exits the process when the first sample is negative."""
+
+    def transcribe(self, audio, beam_size, temperature, language, word_timestamps):
+        if audio[0] < 0:
+            os._exit(1)
+        segment = SimpleNamespace(start=0.0, end=len(audio) / 16000, text=f" {len(audio)} samples", words=[])
+        return [segment], SimpleNamespace(language="en", language_probability=1.0)
+
+def fake_model_factory(model_size, device, compute_type):
+    return FakeModel()
+
+def failing_model_factory(model_size, device, compute_type):
+    raise RuntimeError("no model")
+
+def exiting_model_factory(model_size, device, compute_type):
+    os._exit(1)
+
+@pytest.fixture(scope="module")
+def pool():
+    with TranscriptionWorkerPool(processes=2, model_sizes=("tiny",), device="cpu", compute_type="int8",
+                                 sample_rate=16000, health_interval=0.5, model_factory=fake_model_factory) as pool:
+        yield pool
+
+def test_pool_transcribes_through_shared_memory(pool):
+    futures = [pool.submit(np.ones(n, dtype=np.float32), ASRProfile(model_size="tiny"), offset=1.0) for n in (800, 1600, 3200)]
+    results = [future.result(timeout=60) for future in futures]
+
+    assert [result.text for result in results] == [" 800 samples", " 1600 samples", " 3200 samples"]
+    assert results[0].segments[0].start == pytest.approx(1.0)
+
+def test_pool_restarts_crashed_worker(pool):
+    restarts = pool.restarts
+    crashing = pool.submit(np.full(160, -1.0, dtype=np.float32), ASRProfile(model_size="tiny"))
+
+    with pytest.raises(err.TranscriptionWorkerError):
+        crashing.result(timeout=60)
+    assert pool.restarts >= restarts + 2 # Retried once before giving up
+
+    assert pool.transcribe(np.ones(160, dtype=np.float32), ASRProfile(model_size="tiny"), timeout=60).text == " 160 samples"
+
+def test_pool_reports_model_load_failure():
+    with TranscriptionWorkerPool(processes=1, model_sizes=("tiny",), device="cpu", compute_type="int8",
+                                 sample_rate=16000, model_factory=failing_model_factory) as pool:
+        future = pool.submit(np.ones(160, dtype=np.float32), ASRProfile(model_size="tiny"))
+        with pytest.raises(err.ModelLoadError):
+            future.result(timeout=60)
+
+def test_pool_gives_up_on_workers_that_die_while_starting():
+    with TranscriptionWorkerPool(processes=1, model_sizes=("tiny",), device="cpu", compute_type="int8",
+                                 sample_rate=16000, model_factory=exiting_model_factory) as pool:
+        future = pool.submit(np.ones(160, dtype=np.float32), ASRProfile(model_size="tiny"))
+        with pytest.raises(err.ModelLoadError):
+            future.result(timeout=60)
+        assert pool.restarts == TranscriptionWorkerPool._MAX_START_FAILURES - 1
+
+def test_pool_rejects_tasks_after_close():
+    pool = TranscriptionWorkerPool(processes=1, model_sizes=("tiny",), device="cpu", compute_type="int8",
+                                   sample_rate=16000, model_factory=fake_model_factory)
+    pool.close()
+    with pytest.raises(err.TranscriptionWorkerError):
+        pool.submit(np.ones(160, dtype=np.float32), ASRProfile(model_size="tiny"))
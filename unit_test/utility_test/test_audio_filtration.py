@@ -3,7 +3,9 @@ import numpy as np
 from scipy.signal import sosfilt
 from utility.audio_filtration import (
     nyquist_freq_gen, highpass_filter, lowpass_filter, bandpass_filter,
-    filter_audio, normalize_audio, CLIP
+    filter_audio, normalize_audio, pcm16_to_float32, float32_to_pcm16, StreamingBandpassFilter,
+    SpectralNoiseSuppressor,
+    CLIP, PCM16_SCALE
 )
 
 def test_nyquist_freq_gen():
@@ -55,3 +57,79 @@ def test_normalize_audio_zero_peak():
     audio = np.zeros(100, dtype=np.float32)
     normalized = normalize_audio(audio, target_peak=0.5)
     assert np.all(normalized == 0)
+
+def test_pcm16_round_trip_in_place():
+    audio = np.array([0.5, -1.0, 1.0, 0.0], dtype=np.float32)
+    pcm = np.zeros(4, dtype=np.int16)
+    back = np.zeros(4, dtype=np.float32)
+
+    assert float32_to_pcm16(audio, out=pcm) is pcm
+    assert pcm[1] == -PCM16_SCALE and pcm[2] == PCM16_SCALE
+    assert pcm16_to_float32(pcm, out=back) is back
+    assert np.allclose(back, audio, atol=1 / PCM16_SCALE)
+
+def test_float32_to_pcm16_clips_instead_of_wrapping():
+    audio = np.array([1.5, -1.2, 1.0001, 0.25], dtype=np.float32)
+    pcm = float32_to_pcm16(audio)
+    assert list(pcm) == [PCM16_SCALE, -PCM16_SCALE, PCM16_SCALE, int(0.25 * PCM16_SCALE)]
+    assert audio[0] == np.float32(1.5) # Left alone unless clip_in_place
+
+    assert np.array_equal(float32_to_pcm16(audio, clip_in_place=True), pcm)
+    assert audio[0] == 1.0
+
+def test_pcm16_to_float32_allocates_float32():
+    assert pcm16_to_float32(np.ones(3, dtype=np.int16)).dtype == np.float32
+
+def test_bandpass_filter_order():
+    assert bandpass_filter(16000, 300, 3400, order=4).shape == (4, 6)
+
+def test_streaming_filter_matches_whole_signal():
+    fs = 16000
+    audio = (0.5 * np.sin(2 * np.pi * 440 * np.arange(fs) / fs)).astype(np.float32)
+
+    whole = StreamingBandpassFilter(fs, 300, 3400, order=4).process(audio.copy())
+    streaming = StreamingBandpassFilter(fs, 300, 3400, order=4)
+    chunks = [streaming.process(chunk.copy()) for chunk in np.split(audio, 4)]
+
+    assert np.allclose(np.concatenate(chunks), whole, atol=1e-6)
+
+def test_streaming_filter_in_place_float32():
+    streaming = StreamingBandpassFilter(16000, 300, 3400)
+    buffer = np.full(480, 2.0, dtype=np.float32)
+
+    result = streaming.process(buffer, out=buffer)
+    assert result is buffer
+    assert result.dtype == np.float32
+    assert np.max(np.abs(result)) <= CLIP
+
+def test_streaming_filter_reset():
+    streaming = StreamingBandpassFilter(16000, 300, 3400)
+    impulse = np.zeros(64, dtype=np.float32)
+    impulse[0] = 1.0
+
+    first = streaming.process(impulse.copy())
+    streaming.reset()
+    assert np.allclose(streaming.process(impulse.copy()), first)
+
+def test_noise_suppressor_passthrough_is_delayed_input():
+    suppressor = SpectralNoiseSuppressor(16000, threshold=0.0) # Gain is always 1
+    audio = (np.random.default_rng(0).standard_normal(7680 * 2) * 0.1).astype(np.float32)
+
+    output = np.concatenate([suppressor.process(chunk) for chunk in np.split(audio, 2)])
+    assert np.allclose(output[suppressor.hop:], audio[:-suppressor.hop], atol=1e-5)
+
+def test_noise_suppressor_attenuates_stationary_noise():
+    suppressor = SpectralNoiseSuppressor(16000)
+    noise = (np.random.default_rng(1).standard_normal(7680 * 6) * 0.05).astype(np.float32)
+
+    output = np.concatenate([suppressor.process(chunk) for chunk in np.split(noise, 6)])
+    assert output[7680:].std() < 0.5 * noise[7680:].std()
+    assert suppressor.noise_floor.shape == (suppressor.hop + 1,)
+
+def test_noise_suppressor_in_place_and_chunk_check():
+    suppressor = SpectralNoiseSuppressor(16000)
+    chunk = np.zeros(480, dtype=np.float32)
+
+    assert suppressor.process(chunk, out=chunk) is chunk
+    with pytest.raises(ValueError):
+        suppressor.process(np.zeros(100, dtype=np.float32))
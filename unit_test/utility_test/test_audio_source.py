@@ -0,0 +1,108 @@
+import pytest
+import time
+import numpy as np
+import scipy.io.wavfile as wav
+from threading import Event, Thread
+from unittest.mock import MagicMock
+from utility.audio_source import ReplaySource, MicrophoneSource, load_wav, list_wav_files, create_audio_source
+from utility.ring_buffer import AudioRingBuffer
+from utility.audio_filtration import float32_to_pcm16
+import utility.errors as err
+
+@pytest.fixture
+def clip():
+    return np.linspace(-0.5, 0.5, 1600, dtype=np.float32)
+
+def test_load_wav_int16(tmp_path, clip):
+    path = tmp_path / "clip.wav"
+    wav.write(path, 16000, (clip * np.iinfo(np.int16).max).astype(np.int16))
+
+    audio = load_wav(str(path), sample_rate=16000)
+    assert audio.dtype == np.float32
+    assert np.allclose(audio, clip, atol=1e-4)
+
+def test_load_wav_resamples_and_downmixes(tmp_path):
+    path = tmp_path / "stereo.wav"
+    wav.write(path, 8000, np.zeros((800, 2), dtype=np.float32))
+
+    audio = load_wav(str(path), sample_rate=16000)
+    assert audio.ndim == 1
+    assert len(audio) == 1600
+
+def test_load_wav_missing_file(tmp_path):
+    with pytest.raises(err.InvalidAudioError):
+        load_wav(str(tmp_path / "missing.wav"), sample_rate=16000)
+
+def test_list_wav_files(tmp_path):
+    for name in ("b.wav", "a.WAV", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    assert [p.split("/")[-1] for p in list_wav_files(str(tmp_path))] == ["a.WAV", "b.wav"]
+
+def test_replay_fast_feeds_everything_then_closes(clip):
+    source = ReplaySource([clip, clip], sample_rate=16000, realtime=False)
+    ring_buffer = AudioRingBuffer(capacity=4000, dtype=np.int16)
+    source.stream(ring_buffer, Event())
+
+    out = np.empty(3200, dtype=np.int16)
+    assert ring_buffer.read_into(out, timeout=0) is True
+    assert np.array_equal(out, float32_to_pcm16(np.concatenate([clip, clip])))
+    assert ring_buffer.closed
+    assert source.exhausted
+
+def test_replay_fast_waits_for_consumer(clip):
+    source = ReplaySource([clip] * 4, sample_rate=16000, realtime=False)
+    ring_buffer = AudioRingBuffer(capacity=1000, dtype=np.int16) # Smaller than the replayed audio
+    producer = Thread(target=source.stream, args=(ring_buffer, Event()))
+    producer.start()
+
+    out = np.empty(800, dtype=np.int16)
+    received = []
+    while ring_buffer.read_into(out, timeout=1):
+        received.append(out.copy())
+    producer.join(timeout=1)
+
+    assert ring_buffer.overruns == 0
+    assert np.array_equal(np.concatenate(received), float32_to_pcm16(np.concatenate([clip] * 4)))
+
+def test_replay_resumes_after_stop(clip):
+    source = ReplaySource([clip], sample_rate=16000, realtime=True, block_duration=0.01)
+    ring_buffer = AudioRingBuffer(capacity=1600, dtype=np.int16)
+    stop_event = Event()
+
+    producer = Thread(target=source.stream, args=(ring_buffer, stop_event))
+    producer.start()
+    time.sleep(0.03)
+    stop_event.set()
+    producer.join()
+
+    sent = ring_buffer.available
+    assert 0 < sent < len(clip)
+
+    source.stream(ring_buffer, Event()) # Pacing only matters while the source is live
+    assert ring_buffer.available == len(clip)
+
+def test_replay_needs_clips():
+    with pytest.raises(err.InvalidAudioError):
+        ReplaySource([], sample_rate=16000)
+
+def test_microphone_rejects_stereo():
+    with pytest.raises(ValueError):
+        MicrophoneSource(sample_rate=16000, channels=2)
+
+def test_microphone_records_int16_into_int16_buffers():
+    assert MicrophoneSource(sample_rate=16000).dtype == 'int16'
+    with pytest.raises(err.AudioStreamError): # Checked before PortAudio is touched
+        MicrophoneSource(sample_rate=16000, dtype='float32').stream(AudioRingBuffer(capacity=480, dtype=np.int16), Event())
+
+def test_create_audio_source():
+    config = MagicMock(source='microphone', sample_rate=16000, channels=1, dtype='float32', duration=0.48)
+    assert isinstance(create_audio_source(config), MicrophoneSource)
+
+    config.source = 'replay'
+    config.replay_path = ''
+    with pytest.raises(err.AudioStreamError):
+        create_audio_source(config)
+
+    config.source = 'unknown'
+    with pytest.raises(ValueError):
+        create_audio_source(config)
@@ -1,11 +1,17 @@
 import pytest
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from unittest.mock import patch, MagicMock
-from utility.encrypt import CryptManager
+from utility.encrypt import CryptManager, clear_key_cache
 import utility.errors as err
 import keyring.errors
 
 
+@pytest.fixture(autouse=True)
+def empty_key_cache():
+    clear_key_cache()
+    yield
+    clear_key_cache()
+
 @pytest.fixture
 def mock_config():
     cfg = MagicMock()
@@ -88,3 +94,43 @@ def test_decrypt_fails_with_exception(mock_config):
             cm = CryptManager(mock_config)
             with pytest.raises(err.EncryptionError):
                 cm.decrypt(b"\x00" * 20)
+
+def test_keyring_is_read_once_per_process(mock_config):
+    with patch("utility.encrypt.keyring") as mock_keyring:
+        mock_keyring.get_password.return_value = AESGCM.generate_key(128).hex()
+
+        first = CryptManager(mock_config)
+        second = CryptManager(mock_config)
+
+        mock_keyring.get_password.assert_called_once()
+        assert second.decrypt(first.encrypt(b"melody")) == b"melody"
+
+def test_clear_key_cache_zeroes_the_key(mock_config):
+    with patch("utility.encrypt.keyring") as mock_keyring:
+        mock_keyring.get_password.return_value = AESGCM.generate_key(128).hex()
+        cm = CryptManager(mock_config)
+        key = cm._key.key
+
+        clear_key_cache()
+
+        assert key == bytearray(16)
+        with pytest.raises(err.EncryptionError):
+            cm.encrypt(b"data")
+        CryptManager(mock_config)
+        assert mock_keyring.get_password.call_count == 2
+
+def test_bulk_encrypt_decrypt_keeps_order(mock_config, monkeypatch):
+    monkeypatch.setattr(CryptManager, "_ITEMS_PER_THREAD", 1)
+    monkeypatch.setattr("utility.encrypt.os.cpu_count", lambda: 4)
+    with patch("utility.encrypt.keyring") as mock_keyring:
+        mock_keyring.get_password.return_value = AESGCM.generate_key(128).hex()
+        cm = CryptManager(mock_config)
+
+        items = [f"template {i}".encode() for i in range(10)]
+        ciphers = cm.encrypt_many(items, threads=4)
+        assert cm.decrypt_many(ciphers, threads=4) == items
+
+        ciphers[3] = b"\x00" * 40
+        assert cm.decrypt_many(ciphers, threads=4, strict=False)[3] is None
+        with pytest.raises(err.EncryptionError):
+            cm.decrypt_many(ciphers, threads=4)
@@ -0,0 +1,60 @@
+import pytest
+from config.input_pipe_config import EndpointConfig
+from utility.endpointing import Endpointer
+
+FRAME_MS = 30
+MAX_FRAMES = 34 # ~1 second
+
+@pytest.fixture
+def endpointer():
+    return Endpointer(EndpointConfig(), frame_duration_ms=FRAME_MS, max_frames=MAX_FRAMES,
+                      known_commands=("Play Music",))
+
+def speak(endpointer, frames: int, pause: int = 0) -> None:
+    for _ in range(frames):
+        endpointer.observe(True)
+    for _ in range(pause):
+        endpointer.observe(False)
+
+def test_fixed_limit_when_not_adaptive():
+    endpointer = Endpointer(EndpointConfig(adaptive=False), FRAME_MS, MAX_FRAMES)
+    speak(endpointer, 100)
+    assert endpointer.silence_limit() == MAX_FRAMES
+
+def test_short_utterance_keeps_full_timeout(endpointer):
+    speak(endpointer, 20) # 600 ms, just the wake word
+    assert endpointer.silence_limit() == MAX_FRAMES
+
+def test_long_utterance_uses_min_silence(endpointer):
+    speak(endpointer, 60)
+    assert endpointer.silence_limit() == 10 # 300 ms
+
+def test_mid_utterance_pauses_stretch_limit(endpointer):
+    for _ in range(4):
+        speak(endpointer, 15, pause=12) # 360 ms pauses
+    speak(endpointer, 5)
+    assert endpointer.silence_limit() == 18 # 1.5 * 360 ms
+
+def test_noise_adds_margin(endpointer):
+    speak(endpointer, 60)
+    endpointer.observe_noise(-40.0) # 10 dB over the reference
+    assert endpointer.silence_limit() == 14 # 300 ms + 100 ms
+
+def test_known_command_ends_early(endpointer):
+    speak(endpointer, 20)
+    endpointer.observe_transcript(" Melody, play music.")
+    assert endpointer.command_matched
+    assert endpointer.silence_limit() == 5
+
+def test_limit_never_exceeds_max():
+    endpointer = Endpointer(EndpointConfig(noise_margin_ms_per_db=100.0), FRAME_MS, MAX_FRAMES)
+    speak(endpointer, 60)
+    endpointer.observe_noise(0.0)
+    assert endpointer.silence_limit() == MAX_FRAMES
+
+def test_reset(endpointer):
+    speak(endpointer, 60)
+    endpointer.observe_transcript("play music")
+    endpointer.reset()
+    assert not endpointer.command_matched
+    assert endpointer.silence_limit() == MAX_FRAMES
@@ -0,0 +1,14 @@
+import numpy as np
+from utility.audio_source import ReplaySource
+from utility.record import record
+
+def test_record_from_replay_source():
+    clip = np.full(16000, 0.5, dtype=np.float32)
+    source = ReplaySource([clip], sample_rate=16000, realtime=False)
+
+    recording = record(1, 16000, False, source=source)
+
+    assert recording.dtype == np.float32
+    assert len(recording) == 16000
+    assert np.all(recording[:8000] == 0) # The first half second is muted
+    assert np.allclose(recording[8000:], 0.5, atol=1e-4)
@@ -0,0 +1,79 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from utility.ring_buffer import AudioRingBuffer
+
+@pytest.fixture
+def ring_buffer():
+    return AudioRingBuffer(capacity=8, dtype=np.float32)
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        AudioRingBuffer(capacity=0)
+
+def test_write_then_read(ring_buffer):
+    ring_buffer.write(np.arange(5, dtype=np.float32))
+    out = np.empty(5, dtype=np.float32)
+
+    assert ring_buffer.read_into(out, timeout=0) is True
+    assert np.array_equal(out, np.arange(5))
+    assert ring_buffer.available == 0
+
+def test_read_wraps_around(ring_buffer):
+    out = np.empty(6, dtype=np.float32)
+    ring_buffer.write(np.zeros(6, dtype=np.float32))
+    ring_buffer.read_into(out, timeout=0)
+
+    ring_buffer.write(np.arange(6, dtype=np.float32)) # Crosses the end of the buffer
+    assert ring_buffer.read_into(out, timeout=0) is True
+    assert np.array_equal(out, np.arange(6))
+
+def test_read_times_out_when_not_enough_samples(ring_buffer):
+    ring_buffer.write(np.ones(3, dtype=np.float32))
+    out = np.empty(4, dtype=np.float32)
+
+    assert ring_buffer.read_into(out, timeout=0.01) is False
+    assert ring_buffer.available == 3
+
+def test_overrun_drops_oldest_samples(ring_buffer):
+    ring_buffer.write(np.arange(6, dtype=np.float32))
+    ring_buffer.write(np.arange(6, 12, dtype=np.float32))
+
+    out = np.empty(8, dtype=np.float32)
+    assert ring_buffer.read_into(out, timeout=0) is True
+    assert np.array_equal(out, np.arange(4, 12))
+    assert ring_buffer.overruns == 4
+
+def test_overruns_are_logged_by_the_reader(ring_buffer):
+    with patch("utility.ring_buffer.logger") as mock_logger:
+        ring_buffer.write(np.arange(12, dtype=np.float32))
+        mock_logger.warning.assert_not_called() # Nothing on the audio thread
+
+        ring_buffer.read_into(np.empty(4, dtype=np.float32), timeout=0)
+        ring_buffer.read_into(np.empty(4, dtype=np.float32), timeout=0)
+
+    mock_logger.warning.assert_called_once()
+    assert "4 samples" in mock_logger.warning.call_args.args[0]
+
+def test_read_larger_than_capacity(ring_buffer):
+    with pytest.raises(ValueError):
+        ring_buffer.read_into(np.empty(9, dtype=np.float32))
+
+def test_clear(ring_buffer):
+    ring_buffer.write(np.ones(4, dtype=np.float32))
+    ring_buffer.clear()
+    assert ring_buffer.available == 0
+
+def test_blocking_write_stops_when_full(ring_buffer):
+    written = ring_buffer.write(np.arange(12, dtype=np.float32), block=True, timeout=0.01)
+
+    assert written == 8
+    assert ring_buffer.overruns == 0
+
+def test_close_releases_waiting_reader(ring_buffer):
+    ring_buffer.write(np.ones(3, dtype=np.float32))
+    ring_buffer.close()
+
+    assert ring_buffer.read_into(np.empty(4, dtype=np.float32), timeout=None) is False
+    ring_buffer.clear()
+    assert ring_buffer.closed is False
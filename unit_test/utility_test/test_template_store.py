@@ -0,0 +1,227 @@
+import os
+import struct
+import time
+import pytest
+import numpy as np
+from unittest.mock import MagicMock, patch
+from utility.encrypt import CryptManager, clear_key_cache
+from utility.template_store import TemplateStore, TemplateWriteBehind
+import utility.errors as err
+
+def crypt_config():
+    config = MagicMock()
+    config.basic_info.app_name = "test-app"
+    config.biometric_config.nonce_bytes = 12
+    return config
+
+@pytest.fixture(autouse=True)
+def fixed_key():
+    clear_key_cache()
+    with patch("utility.encrypt.keyring") as mock_keyring:
+        mock_keyring.get_password.return_value = bytes(32).hex()
+        yield
+    clear_key_cache()
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "templates.store")
+
+def make_store(path, **kwargs):
+    return TemplateStore(path=path, crypt_mgr=CryptManager(crypt_config()), dim=8, **kwargs)
+
+def embedding(seed):
+    return np.random.default_rng(seed).normal(size=8).astype(np.float32)
+
+def test_round_trip(store_path):
+    store = make_store(store_path)
+    store.commit(puts={"alice": embedding(0), "bob": embedding(1)})
+    store.put("alice", embedding(2))
+    store.delete("bob")
+
+    loaded = make_store(store_path).load()
+    assert list(loaded) == ["alice"]
+    assert np.array_equal(loaded["alice"], embedding(2))
+
+def test_update_only_appends_the_changed_user(store_path):
+    store = make_store(store_path)
+    store.commit(puts={f"user_{i}": embedding(i) for i in range(50)})
+    size = os.path.getsize(store_path)
+    with open(store_path, "rb") as f:
+        before = f.read()
+
+    store.put("user_7", embedding(100))
+
+    with open(store_path, "rb") as f:
+        after = f.read()
+    assert after.startswith(before)
+    assert len(after) - size < 200 # One record and a commit marker
+
+def test_uncommitted_tail_is_dropped_and_cut_off(store_path):
+    store = make_store(store_path)
+    store.put("alice", embedding(0))
+    committed = os.path.getsize(store_path)
+    store.commit(puts={"bob": embedding(1), "carol": embedding(2)})
+
+    with open(store_path, "r+b") as f: # Crash before the commit marker was fully written
+        f.truncate(os.path.getsize(store_path) - 10)
+
+    reopened = make_store(store_path)
+    assert list(reopened.load()) == ["alice"]
+    reopened.put("dave", embedding(3))
+    assert sorted(make_store(store_path).load()) == ["alice", "dave"]
+    assert os.path.getsize(store_path) > committed
+
+def test_damaged_record_is_skipped(store_path):
+    store = make_store(store_path)
+    store.put("alice", embedding(0))
+    store.put("bob", embedding(1))
+    store.put("bob", embedding(2))
+    store.put("carol", embedding(3))
+
+    data = bytearray(open(store_path, "rb").read())
+    data[-180] ^= 0xFF # Inside bob's second record, carol's transaction follows
+    open(store_path, "wb").write(bytes(data))
+
+    damaged = make_store(store_path)
+    loaded = damaged.load()
+    assert sorted(loaded) == ["alice", "bob", "carol"]
+    assert np.array_equal(loaded["bob"], embedding(1)) # The damaged update is lost, not the user
+    damaged.put("dave", embedding(4))
+    assert sorted(make_store(store_path).load()) == ["alice", "bob", "carol", "dave"]
+
+def test_garbage_tail_is_cut_off(store_path):
+    store = make_store(store_path)
+    store.put("alice", embedding(0))
+    committed = os.path.getsize(store_path)
+    with open(store_path, "ab") as f: # Crash left a full length prefix but not the record behind it
+        f.write(struct.pack("<I", 40) + bytes(40))
+
+    reopened = make_store(store_path)
+    assert list(reopened.load()) == ["alice"]
+    reopened.put("bob", embedding(1))
+    assert sorted(make_store(store_path).load()) == ["alice", "bob"]
+    assert os.path.getsize(store_path) > committed
+
+def test_wrong_key_leaves_the_store_alone(store_path):
+    make_store(store_path).commit(puts={f"user_{i}": embedding(i) for i in range(50)})
+    size = os.path.getsize(store_path)
+
+    clear_key_cache()
+    with patch("utility.encrypt.keyring") as other_keyring:
+        other_keyring.get_password.return_value = bytes(range(32)).hex()
+        store = make_store(store_path)
+        assert store.load() == {}
+        with pytest.raises(err.TemplateLoadError): # Would mix two keys in one file
+            store.put("mallory", embedding(100))
+    clear_key_cache()
+
+    assert os.path.getsize(store_path) == size
+    assert len(make_store(store_path).load()) == 50
+
+def test_compaction_replaces_file_atomically(store_path):
+    store = make_store(store_path, compact_ratio=0.5)
+    store._MIN_COMPACT_BYTES = 0
+    store.commit(puts={f"user_{i}": embedding(i) for i in range(10)})
+    for i in range(20):
+        store.put("user_0", embedding(100 + i))
+
+    assert os.path.getsize(store_path) < 2 * 11 * 100 # Superseded records are gone
+    assert not os.path.exists(store_path + ".tmp")
+    loaded = make_store(store_path).load()
+    assert len(loaded) == 10
+    assert np.array_equal(loaded["user_0"], embedding(119))
+
+def test_commit_loads_before_appending(store_path):
+    make_store(store_path).put("alice", embedding(0))
+    make_store(store_path).put("bob", embedding(1)) # Fresh instance, never loaded
+    assert sorted(make_store(store_path).load()) == ["alice", "bob"]
+
+def test_wrong_format_is_rejected(store_path):
+    make_store(store_path).put("alice", embedding(0))
+    with pytest.raises(err.TemplateLoadError):
+        TemplateStore(path=store_path, crypt_mgr=CryptManager(crypt_config()), dim=16).load()
+
+def test_clear(store_path):
+    store = make_store(store_path)
+    store.put("alice", embedding(0))
+    store.clear()
+    assert not os.path.exists(store_path)
+    assert len(store) == 0
+    assert store.load() == {}
+
+def test_parallel_decrypt_keeps_order(store_path, monkeypatch):
+    store = make_store(store_path)
+    for i in range(20):
+        store.put(f"user_{i % 5}", embedding(i))
+
+    monkeypatch.setattr(CryptManager, "_ITEMS_PER_THREAD", 1)
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    loaded = make_store(store_path, decrypt_threads=4).load()
+    assert all(np.array_equal(loaded[f"user_{i}"], embedding(15 + i)) for i in range(5))
+
+def test_write_behind_coalesces_until_flush(store_path):
+    store = make_store(store_path)
+    writer = TemplateWriteBehind(store, flush_interval=60.0)
+    for i in range(5):
+        writer.write("alice", embedding(i))
+    writer.write("bob", embedding(10))
+    assert not os.path.exists(store_path)
+
+    assert writer.flush() == 2
+    assert writer.stats.coalesced == 4 and writer.stats.flushes == 1
+    loaded = make_store(store_path).load()
+    assert np.array_equal(loaded["alice"], embedding(4))
+    writer.close()
+
+def test_write_behind_flushes_on_interval_and_close(store_path):
+    store = make_store(store_path)
+    writer = TemplateWriteBehind(store, flush_interval=0.05)
+    writer.write("alice", embedding(0))
+    deadline = time.monotonic() + 5
+    while not writer.stats.flushes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert list(make_store(store_path).load()) == ["alice"]
+
+    writer._flush_interval = 60.0
+    writer.write("bob", embedding(1))
+    writer.close()
+    assert sorted(make_store(store_path).load()) == ["alice", "bob"]
+
+def test_failed_flush_keeps_newer_writes(store_path, monkeypatch):
+    store = make_store(store_path)
+    writer = TemplateWriteBehind(store, flush_interval=60.0)
+    writer.write("alice", embedding(0))
+    writer.write("bob", embedding(1))
+
+    def failing_commit(puts=None, deletes=()):
+        writer.write("alice", embedding(2)) # Arrives while the batch is being written
+        raise err.FileAccessError("Disk full")
+    monkeypatch.setattr(store, "commit", failing_commit)
+    with pytest.raises(err.FileAccessError):
+        writer.flush()
+    monkeypatch.undo()
+
+    assert writer.flush() == 2
+    loaded = make_store(store_path).load()
+    assert np.array_equal(loaded["alice"], embedding(2))
+    assert np.array_equal(loaded["bob"], embedding(1))
+    writer.close()
+
+def test_writer_survives_unexpected_commit_errors(store_path, monkeypatch):
+    store = make_store(store_path)
+    writer = TemplateWriteBehind(store, flush_interval=0.02)
+    failures = []
+
+    def failing_commit(puts=None, deletes=()):
+        failures.append(puts)
+        raise err.EncryptionError("Encryption key was cleared.")
+    monkeypatch.setattr(store, "commit", failing_commit)
+    writer.write("alice", embedding(0))
+    deadline = time.monotonic() + 5
+    while len(failures) < 2 and time.monotonic() < deadline: # Retried, so the thread is still alive
+        time.sleep(0.01)
+    monkeypatch.undo()
+
+    assert len(failures) >= 2
+    writer.close()
+    assert list(make_store(store_path).load()) == ["alice"]
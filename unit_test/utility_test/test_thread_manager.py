@@ -172,3 +172,14 @@ def test_get_thread_status_created(thread_manager):
     thread_manager.active_threads["CreatedThread"] = ThreadEvent(mock_thread, mock_event)
 
     assert thread_manager.get_thread_status("CreatedThread") == ThreadStatus.CREATED
+
+def test_get_worker_pool_reuses_named_pool(thread_manager):
+    pool = thread_manager.get_worker_pool("Checks", max_workers=2)
+    assert thread_manager.get_worker_pool("Checks") is pool
+    assert pool.submit(lambda: 42).result(timeout=5) == 42
+    assert [stats.name for stats in thread_manager.worker_pool_stats()] == ["Checks"]
+
+    thread_manager.shutdown_worker_pools()
+    assert thread_manager.worker_pools == {}
+    with pytest.raises(err.WorkerPoolShutdownError):
+        pool.submit(lambda: None)
@@ -0,0 +1,53 @@
+import pytest
+import numpy as np
+from utility.utterance_buffer import UtteranceBuffer
+from utility.audio_filtration import PCM16_SCALE
+
+@pytest.fixture
+def utterance():
+    return UtteranceBuffer(initial_capacity=960)
+
+def frame(value: int) -> bytes:
+    return np.full(480, value, dtype=np.int16).tobytes()
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        UtteranceBuffer(initial_capacity=0)
+
+def test_append_converts_to_float32(utterance):
+    utterance.append_pcm16(frame(PCM16_SCALE))
+    utterance.append_pcm16(memoryview(frame(0)))
+
+    audio = utterance.view()
+    assert audio.dtype == np.float32
+    assert len(utterance) == 960
+    assert utterance.frame_count == 2
+    assert np.allclose(audio[:480], 1.0) and np.allclose(audio[480:], 0.0)
+
+def test_grows_and_keeps_earlier_views_valid(utterance):
+    utterance.append_pcm16(frame(100))
+    head = utterance.head(480)
+
+    for _ in range(4):
+        utterance.append_pcm16(frame(200))
+
+    assert utterance.capacity >= len(utterance) == 2400
+    assert np.allclose(head, 100 / PCM16_SCALE)
+    assert np.allclose(utterance.tail(480), 200 / PCM16_SCALE)
+
+def test_views_share_memory_and_are_read_only(utterance):
+    utterance.append_pcm16(frame(1))
+    first, second = utterance.view(), utterance.head(240)
+
+    assert np.shares_memory(first, second)
+    with pytest.raises(ValueError):
+        first[0] = 0.5
+
+def test_clear_keeps_capacity(utterance):
+    for _ in range(3):
+        utterance.append_pcm16(frame(1))
+    capacity = utterance.capacity
+
+    utterance.clear()
+    assert len(utterance) == 0 and utterance.frame_count == 0
+    assert utterance.capacity == capacity
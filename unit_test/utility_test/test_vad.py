@@ -0,0 +1,81 @@
+import pytest
+import numpy as np
+from unittest.mock import MagicMock, patch
+from config.input_pipe_config import VADConfig
+from utility.VAD import EnergyGate, SpeechVAD, SpectralVAD, create_vad_backend
+
+@pytest.fixture
+def gate():
+    config = MagicMock(gate_threshold_db=6.0, gate_min_dbfs=-60.0, gate_smoothing=0.5)
+    return EnergyGate(config)
+
+def frames(*amplitudes) -> np.ndarray:
+    return np.stack([np.full(480, amplitude, dtype=np.int16) for amplitude in amplitudes])
+
+def test_frame_energy_does_not_overflow(gate):
+    energy = gate.frame_energy(frames(30000, -30000))
+    assert np.allclose(energy, 30000.0 ** 2)
+
+def test_mask_passes_frames_above_floor(gate):
+    mask = gate.mask(frames(100, 100, 2000, 100))
+    assert mask.tolist() == [False, False, True, False]
+    assert gate.noise_floor == pytest.approx(100.0 ** 2)
+
+def test_mask_uses_minimum_floor_for_digital_silence(gate):
+    mask = gate.mask(frames(0, 1, 0))
+    assert not mask.any()
+
+def test_noise_floor_drops_fast_and_rises_slowly(gate):
+    gate.mask(frames(1000, 5000))
+    gate.mask(frames(100, 5000))
+    assert gate.noise_floor == pytest.approx(100.0 ** 2)
+
+    gate.mask(frames(1000, 5000))
+    assert 100.0 ** 2 < gate.noise_floor < 1000.0 ** 2
+
+def voiced(seconds: float, amplitude: float, seed: int = 0) -> np.ndarray:
+    t = np.arange(int(16000 * seconds)) / 16000
+    phase = 2 * np.pi * np.cumsum(150 + 30 * np.sin(2 * np.pi * 3 * t)) / 16000
+    return amplitude * sum(np.sin(k * phase) / k for k in range(1, 20))
+
+def to_frames(audio: np.ndarray) -> np.ndarray:
+    return (audio * 32767).astype(np.int16).reshape(-1, 480)
+
+def test_webrtc_batch_skips_gated_frames():
+    vad = SpeechVAD(VADConfig())
+    frames = np.zeros((3, 480), dtype=np.int16)
+
+    with patch.object(vad, "isSpeech", return_value=True) as is_speech:
+        mask = vad.is_speech_batch(frames, candidates=np.array([True, False, True]))
+
+    assert mask.tolist() == [True, False, True]
+    assert is_speech.call_count == 2
+    assert all(len(call.args[0]) == 960 for call in is_speech.call_args_list)
+
+def test_spectral_vad_separates_speech_from_noise():
+    vad = SpectralVAD(VADConfig(backend='spectral'))
+    rng = np.random.default_rng(0)
+    noise = rng.standard_normal(15360 * 2) * 0.02 # Two 0.96 s chunks of 32 frames
+
+    silence_mask = vad.is_speech_batch(to_frames(noise[:15360]))
+    speech_mask = vad.is_speech_batch(to_frames(noise[15360:] + voiced(0.96, 0.2)))
+
+    assert silence_mask.mean() < 0.1
+    assert speech_mask.mean() > 0.9
+
+def test_spectral_vad_hangover_carries_across_chunks():
+    config = VADConfig(backend='spectral', spectral_hangover_frames=2)
+    vad = SpectralVAD(config)
+    vad.noise_spectrum = np.full(int(vad._band.sum()), 1.0)
+
+    loud = to_frames(voiced(0.03, 0.5))
+    quiet = np.zeros((4, 480), dtype=np.int16)
+
+    assert vad.is_speech_batch(loud).tolist() == [True]
+    assert vad.is_speech_batch(quiet).tolist() == [True, True, False, False]
+
+def test_create_vad_backend():
+    assert isinstance(create_vad_backend(VADConfig(backend='webrtc')), SpeechVAD)
+    assert isinstance(create_vad_backend(VADConfig(backend='spectral')), SpectralVAD)
+    with pytest.raises(ValueError):
+        create_vad_backend(VADConfig(backend='unknown'))
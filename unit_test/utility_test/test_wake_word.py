@@ -0,0 +1,93 @@
+import pytest
+import numpy as np
+from unittest.mock import MagicMock, patch
+from config.input_pipe_config import WakeWordConfig
+from utility.wake_word import (KeywordSpotter, MFCCExtractor, TranscriptWakeWordDetector, create_wake_word_detector,
+                               subsequence_dtw)
+
+SAMPLE_RATE = 16000
+MELODY = [(300, 2300), (500, 1500), (700, 1200), (300, 800), (400, 2000)]
+OTHER = [(700, 1200), (300, 2300), (300, 800), (600, 1000), (500, 1500)]
+
+def vowel(formants, duration, f0):
+    """Harmonics of f0 shaped by two formants, a rough stand-in for a voiced syllable."""
+    t = np.arange(int(SAMPLE_RATE * duration)) / SAMPLE_RATE
+    harmonics = np.arange(1, 25) * f0
+    amplitudes = sum(np.exp(-((harmonics - formant) / 120) ** 2) for formant in formants) + 0.02
+    return (amplitudes @ np.sin(2 * np.pi * np.outer(harmonics, t))) * np.hanning(len(t))
+
+def word(syllables, rate=1.0, f0=140):
+    return 0.1 * np.concatenate([vowel(formants, 0.15 / rate, f0) for formants in syllables]).astype(np.float32)
+
+@pytest.fixture
+def spotter():
+    spotter = KeywordSpotter(WakeWordConfig(threshold=0.1), sample_rate=SAMPLE_RATE)
+    spotter.enroll([word(MELODY, rate, f0) for rate, f0 in [(1.0, 140), (0.9, 150), (1.1, 130)]])
+    return spotter
+
+def utterance(syllables, rate, f0):
+    rng = np.random.default_rng(0)
+    audio = np.concatenate([np.zeros(3000, dtype=np.float32), word(syllables, rate, f0), word(OTHER[:2], 1.0, f0)])
+    return audio + 0.003 * rng.standard_normal(len(audio)).astype(np.float32)
+
+def test_streamed_features_match_whole_clip():
+    extractor = MFCCExtractor(sample_rate=SAMPLE_RATE)
+    audio = np.random.default_rng(1).standard_normal(8000).astype(np.float32)
+
+    streamed = np.concatenate([extractor.push(chunk) for chunk in np.array_split(audio, 7)])
+
+    np.testing.assert_allclose(streamed, extractor(audio), rtol=1e-4, atol=1e-4)
+
+def test_subsequence_dtw_finds_embedded_query():
+    series = np.random.default_rng(2).standard_normal((60, 12))
+    assert subsequence_dtw(series[20:35], series) == pytest.approx(0.0, abs=1e-6)
+    assert subsequence_dtw(series[:40], series[:10]) == np.inf # Too short even at twice the speaking rate
+
+@pytest.mark.parametrize("rate, f0", [(1.25, 160), (0.8, 120)])
+def test_spotter_detects_wake_word_while_audio_arrives(spotter, rate, f0):
+    audio = utterance(MELODY, rate, f0)
+    assert any(spotter.push(chunk) for chunk in np.array_split(audio, len(audio) // 480))
+    assert spotter.detect(audio)
+
+def test_spotter_rejects_other_words(spotter):
+    audio = utterance(OTHER, 1.0, 140)
+    assert not any(spotter.push(chunk) for chunk in np.array_split(audio, len(audio) // 480))
+    assert spotter.last_score > spotter.threshold
+
+def test_unenrolled_spotter_is_not_ready():
+    spotter = KeywordSpotter(WakeWordConfig(), sample_rate=SAMPLE_RATE)
+    assert not spotter.ready
+    assert not spotter.push(np.ones(4800, dtype=np.float32))
+
+def test_spotter_templates_round_trip(spotter, tmp_path):
+    crypt_mgr = MagicMock(encrypt=lambda data: data[::-1], decrypt=lambda data: data[::-1])
+    path = str(tmp_path / "keywords.enc")
+    spotter.save(path, crypt_mgr)
+
+    loaded = KeywordSpotter(WakeWordConfig(), sample_rate=SAMPLE_RATE)
+    loaded.load(path, crypt_mgr)
+
+    assert len(loaded.templates) == 3
+    for original, restored in zip(spotter.templates, loaded.templates):
+        np.testing.assert_allclose(original, restored, atol=1e-5)
+
+def test_enrolling_another_user_keeps_earlier_templates(spotter):
+    earlier = spotter.templates
+    spotter.enroll([word(OTHER, 1.0, 200)])
+
+    assert len(spotter.templates) == 4
+    for original, kept in zip(earlier, spotter.templates):
+        np.testing.assert_allclose(original, kept, atol=1e-5)
+    assert spotter.detect(utterance(MELODY, 1.0, 140)) and spotter.detect(utterance(OTHER, 1.0, 200))
+
+def test_transcript_detector_uses_stub():
+    with patch("utility.wake_word.wud.wake_up_detection_stub", return_value=True) as stub:
+        assert TranscriptWakeWordDetector().detect(np.zeros(10, dtype=np.float32), transcript="hey melody")
+    stub.assert_called_once_with(ip="hey melody")
+    assert not TranscriptWakeWordDetector().push(np.ones(4800, dtype=np.float32)) # Only decides on the transcript
+
+def test_create_wake_word_detector_rejects_unknown_engine():
+    config_mgr = MagicMock()
+    config_mgr.wake_word_config.engine = 'unknown'
+    with pytest.raises(ValueError):
+        create_wake_word_detector(config_mgr)
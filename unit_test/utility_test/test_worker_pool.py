@@ -0,0 +1,83 @@
+import pytest
+from threading import Event
+from utility.worker_pool import Priority, WorkerPool
+import utility.errors as err
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(name="TestPool", max_workers=1)
+    yield pool
+    pool.shutdown(cancel_futures=True)
+
+def block(pool):
+    busy, release = Event(), Event()
+    pool.submit(lambda: busy.set() or release.wait(timeout=5))
+    assert busy.wait(timeout=5)
+    return release
+
+def test_futures_carry_results_and_exceptions(pool):
+    def fail():
+        raise ValueError("bad audio")
+
+    assert pool.submit(lambda a, b=0: a + b, 2, b=3).result(timeout=5) == 5
+    with pytest.raises(ValueError):
+        pool.submit(fail).result(timeout=5)
+
+    stats = pool.stats
+    assert stats.completed == 1 and stats.failed == 1 and stats.workers == 1
+
+def test_priority_order(pool):
+    release = block(pool)
+    order = []
+    futures = [pool.submit(order.append, name, priority=priority)
+               for name, priority in (("low", Priority.LOW), ("normal", Priority.NORMAL), ("high", Priority.HIGH), ("normal 2", Priority.NORMAL))]
+    assert pool.stats.queued == 4
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert order == ["high", "normal", "normal 2", "low"]
+
+def test_workers_are_reused():
+    pool = WorkerPool(name="Reused", max_workers=3)
+    for i in range(50):
+        assert pool.submit(lambda x: x * 2, i).result(timeout=5) == 2 * i
+    assert pool.stats.workers == 1 # Never more than one task at a time
+    pool.shutdown()
+
+def test_bounded_queue_rejects():
+    bounded = WorkerPool(name="Bounded", max_workers=1, max_queue=1)
+    release = block(bounded)
+    bounded.submit(lambda: None)
+    with pytest.raises(err.WorkerPoolFullError):
+        bounded.submit(lambda: None)
+    assert bounded.stats.rejected == 1 and bounded.stats.max_queued == 1
+    release.set()
+    bounded.shutdown()
+
+def test_cancelled_tasks_do_not_run(pool):
+    release = block(pool)
+    ran = []
+    future = pool.submit(ran.append, 1)
+    assert future.cancel()
+    release.set()
+    pool.submit(lambda: None).result(timeout=5)
+    assert ran == [] and pool.stats.cancelled == 1
+
+def test_shutdown(pool):
+    release = block(pool)
+    queued = pool.submit(lambda: None)
+    release.set()
+    pool.shutdown(cancel_futures=True)
+    assert queued.cancelled() or queued.done()
+    with pytest.raises(err.WorkerPoolShutdownError):
+        pool.submit(lambda: None)
+
+def test_cancelled_tasks_free_their_queue_slot():
+    bounded = WorkerPool(name="Bounded", max_workers=1, max_queue=1)
+    release = block(bounded)
+    assert bounded.submit(lambda: None).cancel()
+    queued = bounded.submit(lambda: "fresh")
+    release.set()
+    assert queued.result(timeout=5) == "fresh"
+    assert bounded.stats.rejected == 0 and bounded.stats.cancelled == 1
+    bounded.shutdown()
@@ -1,13 +1,162 @@
+from abc import ABC, abstractmethod
 import webrtcvad
+import numpy as np
 from config.input_pipe_config import VADConfig
+from utility.logger import get_logger
 
-class SpeechVAD:
+logger = get_logger(__name__)
+
+class VADBackend(ABC):
+    """Scores a batch of equally sized int16 frames at once."""
+
+    @abstractmethod
+    def is_speech_batch(self, frames: np.ndarray, candidates: np.ndarray | None = None) -> np.ndarray:
+        """
+        frames is an (n_frames, frame_samples) int16 array. Returns a boolean mask
+        with one entry per frame. Frames where candidates is False are treated
+        as silence without being scored.
+        """
+
+
+class SpeechVAD(VADBackend):
 
     def __init__(self, config:VADConfig):
         self.config = config
         self.vad = webrtcvad.Vad(config.aggressiveness)
-        print("Aggressiveness: ",config.aggressiveness)
+        logger.debug(f"Aggressiveness: {config.aggressiveness}")
 
     def isSpeech(self, frame:bytes)->bool:
         """Listening for Speech"""
-        return self.vad.is_speech(frame,self.config.sample_rate)
\ No newline at end of file
+        return self.vad.is_speech(frame,self.config.sample_rate)
+
+    def is_speech_batch(self, frames: np.ndarray, candidates: np.ndarray | None = None) -> np.ndarray:
+        mask = np.zeros(len(frames), dtype=bool)
+        for i, frame in enumerate(frames): # webrtcvad only takes one frame per call
+            if candidates is None or candidates[i]:
+                mask[i] = self.isSpeech(memoryview(frame).cast('B'))
+        return mask
+
+
+class SpectralVAD(VADBackend):
+    """
+    Pure NumPy VAD that scores a whole chunk with one rfft.
+
+    A frame counts as speech when its speech-band energy is spectral_energy_db
+    above a tracked noise spectrum. A frame also counts when its log-spectral
+    flux (the mean rise over the previous frame) shows an onset and its energy
+    is at least half that far above the noise. A hangover keeps short pauses
+    inside words as speech. Unlike webrtcvad, any frame length and sample rate
+    work.
+    """
+
+    _EPSILON = 1e-10
+
+    def __init__(self, config: VADConfig):
+        frame_samples = int(config.sample_rate * config.frame_duration_ms / 1000)
+        freqs = np.fft.rfftfreq(frame_samples, d=1 / config.sample_rate)
+        self._band = (freqs >= config.spectral_low_hz) & (freqs <= config.spectral_high_hz)
+        self._window = np.hanning(frame_samples).astype(np.float32)
+        self._energy_db = config.spectral_energy_db
+        self._flux_db = config.spectral_flux_db
+        self._hangover = config.spectral_hangover_frames
+        self._smoothing = config.spectral_noise_smoothing
+
+        self.noise_spectrum: np.ndarray | None = None
+        self._previous_log_power: np.ndarray | None = None
+        self._frames_since_speech = self._hangover + 1
+
+    def is_speech_batch(self, frames: np.ndarray, candidates: np.ndarray | None = None) -> np.ndarray:
+        if len(frames) == 0:
+            return np.zeros(0, dtype=bool)
+
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1))[:, self._band] ** 2
+        log_power = 10 * np.log10(power + self._EPSILON)
+
+        if self.noise_spectrum is None:
+            self.noise_spectrum = self._quietest_frames(power)
+
+        snr_db = 10 * np.log10(power.sum(axis=1) / (self.noise_spectrum.sum() + self._EPSILON) + self._EPSILON)
+
+        previous = log_power[:1] if self._previous_log_power is None else self._previous_log_power[np.newaxis]
+        flux_db = np.maximum(np.diff(log_power, axis=0, prepend=previous), 0).mean(axis=1)
+        self._previous_log_power = log_power[-1]
+
+        mask = (snr_db > self._energy_db) | ((flux_db > self._flux_db) & (snr_db > self._energy_db / 2))
+        if candidates is not None:
+            mask &= candidates
+
+        self._update_noise_spectrum(power, mask)
+        return self._apply_hangover(mask)
+
+    def _quietest_frames(self, power: np.ndarray) -> np.ndarray:
+        energy = power.sum(axis=1)
+        count = max(1, len(energy) // 5)
+        return power[np.argpartition(energy, count - 1)[:count]].mean(axis=0)
+
+    def _update_noise_spectrum(self, power: np.ndarray, mask: np.ndarray) -> None:
+        if mask.all():
+            return # Nothing but speech in this chunk, keep the old estimate
+        candidate = power[~mask].mean(axis=0)
+        smoothed = self._smoothing * self.noise_spectrum + (1 - self._smoothing) * candidate
+        self.noise_spectrum = np.where(candidate < self.noise_spectrum, candidate, smoothed)
+
+    def _apply_hangover(self, mask: np.ndarray) -> np.ndarray:
+        # Distance of every frame to the latest speech frame, carried over from the previous chunk
+        index = np.arange(len(mask))
+        last_speech = np.where(mask, index, -self._frames_since_speech - 1)
+        last_speech = np.maximum.accumulate(last_speech)
+        since_speech = index - last_speech
+
+        self._frames_since_speech = min(int(since_speech[-1]), self._hangover + 1)
+        return since_speech <= self._hangover
+
+
+def create_vad_backend(config: VADConfig) -> VADBackend:
+    if config.backend == 'webrtc':
+        return SpeechVAD(config)
+    if config.backend == 'spectral':
+        return SpectralVAD(config)
+
+    raise ValueError(f"Unknown VAD backend: {config.backend}")
+
+
+class EnergyGate:
+    """
+    Cheap pre-check that runs before webrtcvad.
+
+    Per-frame energy for a whole chunk is computed with one einsum over the
+    int16 frames and compared with an adaptive noise floor. Only frames
+    gate_threshold_db above that floor, and above gate_min_dbfs, are worth
+    sending to webrtcvad. Everything else is treated as silence. The floor
+    follows the quietest frame of each chunk: it drops straight away and
+    rises slowly.
+    """
+
+    _FULL_SCALE = np.iinfo(np.int16).max
+
+    def __init__(self, config: VADConfig):
+        self._ratio = 10 ** (config.gate_threshold_db / 10) # dB to energy ratio
+        self._min_energy = (self._FULL_SCALE * 10 ** (config.gate_min_dbfs / 20)) ** 2
+        self._smoothing = config.gate_smoothing
+        self.noise_floor: float | None = None
+
+    @property
+    def noise_floor_dbfs(self) -> float | None:
+        if self.noise_floor is None:
+            return None
+        return 10 * np.log10(max(self.noise_floor, 1.0) / self._FULL_SCALE ** 2)
+
+    def frame_energy(self, frames: np.ndarray) -> np.ndarray:
+        """Mean squared amplitude of each row of an (n_frames, frame_samples) int16 array."""
+        return np.einsum('ij,ij->i', frames, frames, dtype=np.float64, casting='unsafe') / frames.shape[1]
+
+    def mask(self, frames: np.ndarray) -> np.ndarray:
+        energy = self.frame_energy(frames)
+        self._update_noise_floor(float(energy.min()))
+        return energy > max(self.noise_floor, self._min_energy) * self._ratio
+
+    def _update_noise_floor(self, candidate: float) -> None:
+        if self.noise_floor is None or candidate < self.noise_floor:
+            self.noise_floor = candidate
+        else:
+            self.noise_floor = self._smoothing * self.noise_floor + (1 - self._smoothing) * candidate
@@ -1,14 +1,18 @@
 from scipy.signal import butter, sosfilt
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 """
  Nyquist frequency is half the sampling rate of a signal.  
  It's the highest frequency that can be accurately represented without aliasing.
 
  CLIP is 1.0 because, that is the highest value in float32 audio data.
+
+ PCM16_SCALE maps float32 audio in [-1, 1] onto int16 samples, the pipeline's canonical frame format.
 """
 
 CLIP=1.0
+PCM16_SCALE = np.iinfo(np.int16).max
 
 
 def nyquist_freq_gen(sample_rate: int) -> float:
@@ -24,11 +28,11 @@ def lowpass_filter(sample_rate: int, cutoff: int):
 
     return butter(N=1, Wn=normalized_freq, btype='low', analog=False, output='sos')
 
-def bandpass_filter(sample_rate: int, low_cutoff: int, high_cutoff: int):
+def bandpass_filter(sample_rate: int, low_cutoff: int, high_cutoff: int, order: int = 1):
     normalized_low = low_cutoff/nyquist_freq_gen(sample_rate=sample_rate)
     normalized_high = high_cutoff/nyquist_freq_gen(sample_rate=sample_rate)
 
-    return butter(N=1, Wn=[normalized_low, normalized_high], btype='band', analog=False, output='sos')
+    return butter(N=order, Wn=[normalized_low, normalized_high], btype='band', analog=False, output='sos')
 
 def filter_audio(audio: np.ndarray, sos_filter) -> np.ndarray:
     data = sosfilt(sos_filter, audio)
@@ -36,6 +40,114 @@ def filter_audio(audio: np.ndarray, sos_filter) -> np.ndarray:
 
     return np.clip(data, -CLIP, CLIP)
 
+class StreamingBandpassFilter:
+    """
+    Band-pass filter for audio that arrives in chunks.
+
+    The sosfilt state (zi) is carried from one chunk to the next, so filtering
+    chunk by chunk gives the same output as filtering the whole stream at once,
+    without a restart transient at every chunk boundary. Coefficients and state
+    are float32, so sosfilt stays in float32 and never builds float64 temporaries.
+    """
+
+    def __init__(self, sample_rate: int, low_cutoff: int, high_cutoff: int, order: int = 1):
+        self._sos = bandpass_filter(sample_rate=sample_rate,
+                                    low_cutoff=low_cutoff,
+                                    high_cutoff=high_cutoff,
+                                    order=order).astype(np.float32)
+        self._zi = np.zeros((self._sos.shape[0], 2), dtype=np.float32)
+
+    def process(self, audio: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """Filters a float32 chunk and writes the clipped result to out (which may be audio itself)."""
+        filtered, self._zi = sosfilt(self._sos, audio, zi=self._zi)
+        if out is None:
+            out = filtered
+        return np.clip(filtered, -CLIP, CLIP, out=out)
+
+    def reset(self) -> None:
+        """Forgets the carried state, call it when the stream restarts after a gap."""
+        self._zi.fill(0)
+
+class SpectralNoiseSuppressor:
+    """
+    Streaming spectral-gating noise suppressor.
+
+    Each chunk is cut into 50% overlapping sqrt-Hann frames, all frames are
+    transformed with a single rfft and every bin is attenuated by how far it
+    sits above a per-bin noise-floor estimate. The frames are resynthesised
+    with overlap-add, so a chunk comes back with the same length, delayed by
+    one hop. The noise floor follows the quietest frames of each chunk. It
+    drops straight away and rises slowly, so speech does not pull it up.
+    """
+
+    _EPSILON = 1e-10
+
+    def __init__(self, sample_rate: int, frame_duration_ms: int = 30, threshold: float = 1.5,
+                 gain_floor: float = 0.1, noise_smoothing: float = 0.95):
+        self._hop = int(sample_rate * frame_duration_ms / 1000) // 2
+        if self._hop <= 0:
+            raise ValueError("Noise suppression frame is too short.")
+
+        frame_length = 2 * self._hop
+        # Periodic sqrt-Hann used for analysis and synthesis sums to one at 50% overlap
+        self._window = np.sqrt(0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame_length) / frame_length)).astype(np.float32)
+        self._threshold = threshold
+        self._gain_floor = gain_floor
+        self._noise_smoothing = noise_smoothing
+
+        self._history = np.zeros(self._hop, dtype=np.float32) # Last hop of the previous input chunk
+        self._overlap = np.zeros(self._hop, dtype=np.float32) # Second half of the last synthesised frame
+        self.noise_floor: np.ndarray | None = None
+
+    @property
+    def hop(self) -> int:
+        return self._hop
+
+    def process(self, audio: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """Suppresses noise in a float32 chunk whose length is a multiple of hop. out may be audio itself."""
+        if len(audio) % self._hop:
+            raise ValueError(f"Chunk length must be a multiple of {self._hop} samples.")
+
+        signal = np.concatenate((self._history, audio))
+        self._history = signal[-self._hop:].copy()
+
+        frames = sliding_window_view(signal, 2 * self._hop)[::self._hop] * self._window
+        spectrum = np.fft.rfft(frames, axis=1)
+        magnitude = np.abs(spectrum)
+
+        self._update_noise_floor(magnitude)
+        gain = np.clip(1 - self._threshold * self.noise_floor / (magnitude + self._EPSILON), self._gain_floor, 1.0)
+
+        frames = np.fft.irfft(spectrum * gain, n=2 * self._hop, axis=1).astype(np.float32) * self._window
+
+        # Overlap-add: each output hop is the first half of a frame plus the second half of the one before it
+        output = frames[:, :self._hop]
+        output[0] += self._overlap
+        output[1:] += frames[:-1, self._hop:]
+        self._overlap = frames[-1, self._hop:].copy()
+
+        if out is None:
+            out = np.empty(len(audio), dtype=np.float32)
+        return np.clip(output.reshape(-1), -CLIP, CLIP, out=out)
+
+    def _update_noise_floor(self, magnitude: np.ndarray) -> None:
+        energy = magnitude.sum(axis=1)
+        quiet_count = max(1, len(energy) // 5)
+        quietest = np.argpartition(energy, quiet_count - 1)[:quiet_count]
+        candidate = magnitude[quietest].mean(axis=0)
+
+        if self.noise_floor is None:
+            self.noise_floor = candidate
+            return
+
+        smoothed = self._noise_smoothing * self.noise_floor + (1 - self._noise_smoothing) * candidate
+        self.noise_floor = np.where(candidate < self.noise_floor, candidate, smoothed)
+
+    def reset(self) -> None:
+        """Drops the overlap state after a stream gap. The noise floor is kept, the room has not changed."""
+        self._history.fill(0)
+        self._overlap.fill(0)
+
 def normalize_audio(audio: np.ndarray, target_peak: float) -> np.ndarray:
     peak = np.max(np.abs(audio))
 
@@ -43,3 +155,16 @@ def normalize_audio(audio: np.ndarray, target_peak: float) -> np.ndarray:
         return audio
     
     return (audio / peak) * target_peak
+
+def pcm16_to_float32(audio: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    return np.multiply(audio, np.float32(1 / PCM16_SCALE), out=out, dtype=np.float32)
+
+def float32_to_pcm16(audio: np.ndarray, out: np.ndarray | None = None, clip_in_place: bool = False) -> np.ndarray:
+    """
+    Scales float audio to int16. Samples beyond +-1.0 are clipped first, the cast would wrap them to the other sign.
+    With clip_in_place the clipping overwrites audio instead of a copy, for scratch buffers on the hot path.
+    """
+    if out is None:
+        out = np.empty(audio.shape, dtype=np.int16)
+    clipped = np.clip(audio, -1.0, 1.0, out=audio if clip_in_place else None)
+    return np.multiply(clipped, PCM16_SCALE, out=out, casting='unsafe')
@@ -0,0 +1,168 @@
+from abc import ABC, abstractmethod
+from math import gcd
+import os
+import time
+from threading import Event
+import numpy as np
+import scipy.io.wavfile as wav
+from scipy.signal import resample_poly
+from config.input_pipe_config import AudioConfig
+from utility.ring_buffer import AudioRingBuffer
+from utility.audio_filtration import float32_to_pcm16
+from utility.logger import get_logger
+import utility.errors as err
+
+logger = get_logger(__name__)
+
+class AudioSource(ABC):
+    """Produces mono audio into a ring buffer, the InputPipeline reads it from there."""
+
+    @abstractmethod
+    def stream(self, ring_buffer: AudioRingBuffer, stop_event: Event) -> None:
+        """Feeds samples into ring_buffer until stop_event is set or the source runs out."""
+
+
+class MicrophoneSource(AudioSource):
+    def __init__(self, sample_rate: int, channels: int = 1, dtype: str = 'int16', warmup_duration: float = 0.0):
+        if channels != 1: # Checks if the audio is mono
+            raise ValueError("Only mono audio (1 channel) supported for VAD.")
+
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype = dtype
+        self.warmup_duration = warmup_duration
+
+    def stream(self, ring_buffer: AudioRingBuffer, stop_event: Event) -> None:
+        if np.dtype(self.dtype) != ring_buffer.dtype: # The callback copies without converting
+            raise err.AudioStreamError(f"Microphone records {self.dtype} but the ring buffer holds {ring_buffer.dtype}")
+        import sounddevice as sd # Imported here so headless replay runs do not need PortAudio
+
+        statuses = [] # Appended on the PortAudio thread, logged from this one
+
+        def callback(indata: np.ndarray, frames: int, time_info, status) -> None:
+            # Runs on the PortAudio thread, keep it to a single copy into the ring buffer
+            if status:
+                statuses.append(status)
+            ring_buffer.write(indata[:, 0])
+
+        def report_statuses() -> None:
+            while statuses:
+                logger.warning(f"Audio stream status: {statuses.pop(0)}")
+
+        with sd.InputStream(samplerate=self.sample_rate,
+                            channels=self.channels,
+                            dtype=self.dtype,
+                            callback=callback):
+            # Discard the first samples to remove startup noise
+            if self.warmup_duration > 0:
+                stop_event.wait(self.warmup_duration)
+                ring_buffer.clear()
+
+            logger.debug("Starting recording...")
+            while not stop_event.wait(1.0):
+                report_statuses()
+            report_statuses()
+
+
+class ReplaySource(AudioSource):
+    """
+    Replays in-memory clips or WAV files into the pipeline as int16 PCM.
+
+    With realtime=True blocks are paced at the sample rate like a microphone,
+    otherwise they are pushed as fast as the consumer drains the ring buffer.
+    The replay position survives stop/start, so consecutive get_command() calls
+    walk through the input. The ring buffer is closed once every clip is sent.
+    """
+
+    def __init__(self, clips: list[np.ndarray], sample_rate: int, realtime: bool = True,
+                 block_duration: float = 0.03, loop: bool = False):
+        if not clips:
+            raise err.InvalidAudioError("Replay source needs at least one clip")
+
+        audio = np.concatenate([np.asarray(clip).ravel() for clip in clips])
+        self._audio = audio if audio.dtype == np.int16 else float32_to_pcm16(audio) # Converted once, not per block
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+        self.loop = loop
+        self._block_size = max(1, int(sample_rate * block_duration))
+        self._position = 0
+
+    @classmethod
+    def from_wav(cls, paths: list[str], sample_rate: int, **kwargs) -> 'ReplaySource':
+        return cls([load_wav(path, sample_rate=sample_rate) for path in paths], sample_rate=sample_rate, **kwargs)
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.loop and self._position >= len(self._audio)
+
+    def rewind(self) -> None:
+        self._position = 0
+
+    def stream(self, ring_buffer: AudioRingBuffer, stop_event: Event) -> None:
+        block_duration = self._block_size / self.sample_rate
+        next_deadline = time.perf_counter()
+
+        while not stop_event.is_set():
+            if self._position >= len(self._audio):
+                if not self.loop:
+                    logger.info("Replay source exhausted")
+                    ring_buffer.close()
+                    return
+                self._position = 0
+
+            block = self._audio[self._position:self._position + self._block_size]
+
+            if self.realtime:
+                next_deadline += block_duration
+                stop_event.wait(max(0.0, next_deadline - time.perf_counter()))
+                self._position += ring_buffer.write(block)
+            else:
+                # Waits for the consumer, timing out now and then to re-check the stop event
+                self._position += ring_buffer.write(block, block=True, timeout=0.1)
+
+
+def load_wav(path: str, sample_rate: int) -> np.ndarray:
+    """Loads a WAV file as mono float32 in [-1, 1], resampled to sample_rate."""
+    try:
+        file_rate, data = wav.read(path)
+    except (OSError, ValueError) as e:
+        raise err.InvalidAudioError(f"Could not read {path}") from e
+
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+
+    if np.issubdtype(data.dtype, np.integer):
+        if data.dtype == np.uint8: # 8 bit WAV is unsigned
+            audio = (data.astype(np.float32) - 128) / 128
+        else:
+            audio = data.astype(np.float32) / np.iinfo(data.dtype).max
+    else:
+        audio = data.astype(np.float32)
+
+    if file_rate != sample_rate:
+        factor = gcd(file_rate, sample_rate)
+        audio = resample_poly(audio, sample_rate // factor, file_rate // factor).astype(np.float32)
+
+    return audio
+
+
+def list_wav_files(path: str) -> list[str]:
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith('.wav'))
+    return [path]
+
+
+def create_audio_source(config: AudioConfig) -> AudioSource:
+    if config.source == 'microphone':
+        return MicrophoneSource(sample_rate=config.sample_rate,
+                                channels=config.channels,
+                                dtype=config.dtype,
+                                warmup_duration=config.duration)
+    if config.source == 'replay':
+        if not config.replay_path:
+            raise err.AudioStreamError("Replay source selected but no replay_path configured")
+        return ReplaySource.from_wav(list_wav_files(config.replay_path),
+                                     sample_rate=config.sample_rate,
+                                     realtime=config.replay_realtime)
+
+    raise ValueError(f"Unknown audio source: {config.source}")
@@ -0,0 +1,70 @@
+from math import ceil
+from config.input_pipe_config import EndpointConfig
+
+class Endpointer:
+    """
+    Decides how much trailing silence ends the current utterance.
+
+    A fixed one second timeout is only kept while the utterance is short
+    (usually the wake word on its own, with the command still to come). After
+    that the limit drops towards min_silence_ms. It is stretched for speakers
+    who pause a lot mid-sentence and in noisy rooms, where VAD decisions are
+    less reliable. Once the transcript already contains a known command the
+    utterance is ended after command_silence_ms. The limit never exceeds
+    max_frames, which is also the limit when adaptive endpointing is off.
+    """
+
+    def __init__(self, config: EndpointConfig, frame_duration_ms: int, max_frames: int, known_commands: tuple[str, ...] = ()):
+        self._config = config
+        self._frame_duration_ms = frame_duration_ms
+        self._max_frames = max_frames
+        self._known_commands = tuple(command.lower() for command in known_commands)
+        self.noise_dbfs: float | None = None
+        self.reset()
+
+    def reset(self) -> None:
+        self._speech_frames = 0
+        self._current_pause = 0
+        self._pauses: list[int] = []
+        self.command_matched = False
+
+    def observe(self, is_speech: bool) -> None:
+        if is_speech:
+            if self._current_pause > 0 and self._speech_frames > 0: # Pause between two stretches of speech
+                self._pauses.append(self._current_pause)
+            self._speech_frames += 1
+            self._current_pause = 0
+        elif self._speech_frames > 0:
+            self._current_pause += 1
+
+    def observe_transcript(self, transcript: str) -> None:
+        text = transcript.lower()
+        if any(command in text for command in self._known_commands):
+            self.command_matched = True
+
+    def observe_noise(self, noise_dbfs: float) -> None:
+        self.noise_dbfs = noise_dbfs
+
+    def silence_limit(self) -> int:
+        """Number of consecutive silent frames that ends the utterance."""
+        config = self._config
+        if not config.adaptive:
+            return self._max_frames
+
+        if self.command_matched:
+            return self._to_frames(config.command_silence_ms)
+
+        if self._speech_frames * self._frame_duration_ms < config.short_utterance_ms:
+            return self._max_frames
+
+        limit_ms = config.min_silence_ms
+        if self._pauses:
+            mean_pause_ms = sum(self._pauses) / len(self._pauses) * self._frame_duration_ms
+            limit_ms = max(limit_ms, config.pause_factor * mean_pause_ms)
+        if self.noise_dbfs is not None:
+            limit_ms += max(0.0, self.noise_dbfs - config.noise_reference_dbfs) * config.noise_margin_ms_per_db
+
+        return self._to_frames(limit_ms)
+
+    def _to_frames(self, duration_ms: float) -> int:
+        return max(1, min(self._max_frames, int(ceil(duration_ms / self._frame_duration_ms))))
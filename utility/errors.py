@@ -38,10 +38,18 @@ class AudioStreamError(InputPipelineError):
     def __init__(self, *args):
         super().__init__(*args)
 
+class AudioSourceExhaustedError(AudioStreamError):
+    def __init__(self, *args):
+        super().__init__(*args)
+
 class TranscriptionError(InputPipelineError):
     def __init__(self, *args):
         super().__init__(*args)
 
+class TranscriptionWorkerError(TranscriptionError):
+    def __init__(self, *args):
+        super().__init__(*args)
+
 class WakeUpError(InputPipelineError):
     def __init__(self, *args):
         super().__init__(*args)
@@ -60,4 +68,12 @@ class ThreadNotFoundError(ThreadError):
 
 class ThreadAlreadyExistsError(ThreadError):
     def __init__(self, *args):
-        super().__init__(*args)
\ No newline at end of file
+        super().__init__(*args)
+
+class WorkerPoolFullError(ThreadError):
+    def __init__(self, *args):
+        super().__init__(*args)
+
+class WorkerPoolShutdownError(ThreadError):
+    def __init__(self, *args):
+        super().__init__(*args)
@@ -1,18 +1,32 @@
-import sounddevice as sd
 import numpy as np
 import scipy.io.wavfile as wav
 from scipy.signal import butter, sosfilt
 import os
 import datetime
+from threading import Thread, Event
+from utility.audio_filtration import pcm16_to_float32
+from utility.audio_source import AudioSource, MicrophoneSource
+from utility.ring_buffer import AudioRingBuffer
+
+def record(duration, sample_rate, write, source: AudioSource | None = None) -> np.ndarray:
+    if source is None:
+        source = MicrophoneSource(sample_rate=sample_rate)
+
+    frames = int(duration * sample_rate)
+    ring_buffer = AudioRingBuffer(capacity=frames, dtype=np.int16) # Sources write int16 PCM
+    stop_event = Event()
+    capture_thread = Thread(target=source.stream, args=(ring_buffer, stop_event), name='RecordThread')
 
-def record(duration, sample_rate, write) -> np.ndarray:
     print("Recording...")
-    recording = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1, dtype='float32')
-    sd.wait()
+    capture_thread.start()
+    pcm = np.zeros(frames, dtype=np.int16)
+    ring_buffer.read_into(pcm, timeout=duration + 5) # Leaves silence if the source ends early
+    stop_event.set()
+    capture_thread.join()
     print("Recording finished.")
+    recording = pcm16_to_float32(pcm)
     recording[:int(0.5 * sample_rate)] = 0
 
-    recording = recording.flatten()
     print("Non-Filtered:\ndtype: ", recording.dtype, "ndim: ", recording.ndim)
     
     if write:
@@ -0,0 +1,141 @@
+from threading import Condition
+import numpy as np
+from utility.logger import get_logger
+
+logger = get_logger(__name__)
+
+class AudioRingBuffer:
+    """
+    Fixed-size, preallocated single-producer/single-consumer sample buffer.
+
+    The producer (usually the sounddevice callback) writes blocks with write(),
+    the consumer copies fixed-size chunks out with read_into(). When the
+    consumer falls behind the oldest samples are overwritten and counted in
+    `overruns` so capture never blocks the audio thread. The reader logs new
+    overruns, the audio thread never does. Producers that can
+    wait (file replay) pass block=True to write as space frees up instead. close() marks the end of the
+    stream so a waiting consumer returns straight away.
+    """
+
+    def __init__(self, capacity: int, dtype=np.float32) -> None:
+        if capacity <= 0:
+            raise ValueError("Ring buffer capacity must be positive.")
+
+        self._buffer = np.zeros(capacity, dtype=dtype)
+        self._capacity = capacity
+        self._read_pos = 0
+        self._write_pos = 0
+        self._available = 0
+        self._closed = False
+        self._cond = Condition()
+        self.overruns = 0
+        self._reported_overruns = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._buffer.dtype
+
+    @property
+    def available(self) -> int:
+        with self._cond:
+            return self._available
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def write(self, data: np.ndarray, block: bool = False, timeout: float | None = None) -> int:
+        """
+        Writes data and returns the number of samples written.
+
+        Without block the oldest samples are overwritten when the buffer is full.
+        With block the data is written in pieces as space frees up, stopping
+        early if no space appears within timeout.
+        """
+        n = len(data)
+        if n == 0:
+            return 0
+
+        with self._cond:
+            if not block:
+                self._copy_in(data)
+                return n
+
+            written = 0
+            while written < n:
+                if not self._cond.wait_for(lambda: self._available < self._capacity, timeout=timeout):
+                    break
+                free = self._capacity - self._available
+                piece = data[written:written + free]
+                self._copy_in(piece)
+                written += len(piece)
+            return written
+
+    def _copy_in(self, data: np.ndarray) -> None:
+        # Caller must hold self._cond
+        n = len(data)
+        if n > self._capacity: # Only the newest samples fit
+            data = data[-self._capacity:]
+            self.overruns += n - self._capacity
+            n = self._capacity
+
+        overflow = self._available + n - self._capacity
+        if overflow > 0:
+            self._read_pos = (self._read_pos + overflow) % self._capacity
+            self._available -= overflow
+            self.overruns += overflow
+
+        first = min(n, self._capacity - self._write_pos)
+        self._buffer[self._write_pos:self._write_pos + first] = data[:first]
+        if first < n:
+            self._buffer[:n - first] = data[first:]
+
+        self._write_pos = (self._write_pos + n) % self._capacity
+        self._available += n
+        self._cond.notify_all()
+
+    def read_into(self, out: np.ndarray, timeout: float | None = None) -> bool:
+        """Copies len(out) samples into out. Returns False if they did not arrive within timeout."""
+        n = len(out)
+        if n > self._capacity:
+            raise ValueError("Requested read is larger than the ring buffer.")
+
+        with self._cond:
+            dropped = self.overruns - self._reported_overruns
+            self._reported_overruns = self.overruns
+        if dropped: # Reported here, logging takes locks and does I/O the audio thread can not afford
+            logger.warning(f"Ring buffer overrun, dropped {dropped} samples")
+
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._available >= n or self._closed, timeout=timeout):
+                return False
+            if self._available < n: # Closed before enough samples arrived
+                return False
+
+            first = min(n, self._capacity - self._read_pos)
+            out[:first] = self._buffer[self._read_pos:self._read_pos + first]
+            if first < n:
+                out[first:] = self._buffer[:n - first]
+
+            self._read_pos = (self._read_pos + n) % self._capacity
+            self._available -= n
+            self._cond.notify_all()
+            return True
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def clear(self) -> None:
+        """Drops buffered samples and reopens a closed buffer."""
+        with self._cond:
+            self._read_pos = 0
+            self._write_pos = 0
+            self._available = 0
+            self._closed = False
+            self._cond.notify_all()
@@ -0,0 +1,397 @@
+from dataclasses import dataclass
+import os
+import struct
+import time
+from threading import Event, Lock, Thread
+from typing import Iterable
+import numpy as np
+from utility.encrypt import CryptManager
+from utility.logger import get_logger
+import utility.errors as err
+
+logger = get_logger(__name__)
+
+class TemplateStore:
+    """
+    All biometric templates in one encrypted, append-only file.
+
+    The file starts with a plain header (magic, format version, embedding
+    size) followed by length-prefixed records that are encrypted one by one:
+    a put (username and embedding), a delete or a commit marker. commit()
+    appends the records of one transaction and a single commit marker and
+    fsyncs once, so a crash mid-write only loses the uncommitted tail, which
+    the next commit cuts off. Other records that fail to decrypt are damaged
+    and skipped. When none decrypts the file was written with another key:
+    load() returns no templates and commit() raises TemplateLoadError rather
+    than mixing keys in one file. An update only appends the users it changes.
+
+    load() reads the file in one go, decrypts all records on decrypt_threads
+    threads and replays them up to the last commit marker. The in-memory index
+    keeps where each user's latest record lives. Once superseded records take
+    more than compact_ratio times the space of the live ones, the live records
+    are copied (still encrypted) into a new file that atomically replaces the
+    old one.
+    """
+
+    MAGIC = b'MTPL'
+    VERSION = 1
+    _HEADER = struct.Struct('<4sHH')
+    _LENGTH = struct.Struct('<I')
+    _KIND = struct.Struct('<BH') # Record kind, username length
+    _PUT, _DELETE, _COMMIT = 1, 2, 3
+    _MIN_COMPACT_BYTES = 64 * 1024 # Small stores are not worth compacting
+
+    def __init__(self, path: str, crypt_mgr: CryptManager, dim: int, compact_ratio: float = 1.0, decrypt_threads: int = 4):
+        self._path = path
+        self._crypt_mgr = crypt_mgr
+        self._dim = dim
+        self._compact_ratio = compact_ratio
+        self._decrypt_threads = decrypt_threads
+        self._lock = Lock()
+        self._loaded = False
+        self._reset()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._index
+
+    def load(self) -> dict[str, np.ndarray]:
+        with self._lock:
+            return self._load()
+
+    def put(self, username: str, embedding: np.ndarray) -> None:
+        self.commit(puts={username: embedding})
+
+    def delete(self, username: str) -> None:
+        self.commit(deletes=(username,))
+
+    def commit(self, puts: dict[str, np.ndarray] | None = None, deletes: Iterable[str] = ()) -> None:
+        """Writes every put and delete as one transaction, either all of them survive a crash or none."""
+        puts = puts or {}
+        with self._lock:
+            if not self._loaded: # Never append behind data we have not seen
+                self._load()
+            self._check_writable()
+
+            deletes = [username for username in deletes if username in self._index and username not in puts]
+            records = [(username, self._encode(self._PUT, username, embedding)) for username, embedding in puts.items()]
+            records += [(username, self._encode(self._DELETE, username)) for username in deletes]
+            records.append((None, self._encode(self._COMMIT)))
+            ciphers = self._crypt_mgr.encrypt_many([record for _, record in records], threads=self._decrypt_threads)
+            frames = [(username, self._frame(cipher)) for (username, _), cipher in zip(records, ciphers)]
+
+            index = dict(self._index)
+            try:
+                new_file = not os.path.exists(self._path)
+                if new_file:
+                    self._reset()
+                    index = {}
+                with open(self._path, 'w+b' if new_file else 'r+b') as f:
+                    if new_file:
+                        f.write(self._HEADER.pack(self.MAGIC, self.VERSION, self._dim))
+                        self._end = f.tell()
+                    f.seek(self._end)
+                    f.truncate() # Drops whatever a crashed commit left behind
+                    offset = self._end
+                    for username, frame in frames:
+                        if username in puts:
+                            index[username] = (offset, len(frame))
+                        elif username is not None:
+                            index.pop(username)
+                        f.write(frame)
+                        offset += len(frame)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                raise err.FileAccessError(f"Could not write template store {self._path}") from e
+
+            self._index, self._end = index, offset
+            self._live_bytes = sum(size for _, size in index.values())
+            garbage = self._end - self._HEADER.size - self._live_bytes
+            if garbage > max(self._MIN_COMPACT_BYTES, self._compact_ratio * self._live_bytes):
+                self._compact()
+
+    def compact(self) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._check_writable()
+            if os.path.exists(self._path):
+                self._compact()
+
+    def clear(self) -> None:
+        with self._lock:
+            try:
+                os.remove(self._path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                raise err.FileAccessError(f"Could not delete template store {self._path}") from e
+            self._reset()
+            self._loaded = True
+
+    def _check_writable(self) -> None:
+        # Caller must hold self._lock
+        if self._foreign_key:
+            raise err.TemplateLoadError(f"Template store {self._path} was written with another key, not writing to it. "
+                                        f"Restore the key or clear the store")
+
+    def _reset(self) -> None:
+        self._index: dict[str, tuple[int, int]] = {} # Username to offset and size of its latest put record
+        self._foreign_key = False # The file was written with another key, appending would mix keys
+        self._live_bytes = 0
+        self._end = 0 # End of the last committed transaction
+
+    def _load(self) -> dict[str, np.ndarray]:
+        # Caller must hold self._lock. Stays unloaded if this raises, so commit() never appends to a store it could not read
+        self._reset()
+        self._loaded = False
+        try:
+            with open(self._path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._loaded = True
+            return {}
+        except OSError as e:
+            raise err.FileAccessError(f"Could not read template store {self._path}") from e
+
+        if len(data) < self._HEADER.size:
+            raise err.TemplateLoadError(f"Template store {self._path} has no header")
+        magic, version, dim = self._HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION or dim != self._dim:
+            raise err.TemplateLoadError(f"Template store {self._path} has an unsupported format")
+
+        frames = self._split(data)
+        records = self._decrypt_all(data, frames)
+        torn = self._torn_tail(records)
+        if torn < len(records):
+            logger.warning(f"Template store {self._path} has a torn tail at byte {frames[torn][0]}, ignoring the rest")
+            frames, records = frames[:torn], records[:torn]
+        if records and not any(record is not None for record in records):
+            logger.error(f"No record of template store {self._path} decrypts, it was written with another key. "
+                         f"Starting without templates and leaving the file untouched")
+            self._foreign_key = True
+            self._loaded = True
+            return {}
+        damaged = [start for (start, _), record in zip(frames, records) if record is None]
+        if damaged:
+            logger.error(f"Skipping {len(damaged)} damaged records of template store {self._path} at bytes {damaged}")
+
+        templates: dict[str, np.ndarray] = {}
+        pending = []
+        self._end = self._HEADER.size
+        for (start, stop), record in zip(frames, records):
+            if record is None: # Its user keeps their previous template, if any
+                continue
+            kind, username, embedding = self._decode(record)
+            if kind != self._COMMIT:
+                pending.append((kind, username, embedding, start, stop))
+                continue
+
+            for kind, username, embedding, record_start, record_stop in pending:
+                if kind == self._PUT:
+                    templates[username] = embedding
+                    self._index[username] = (record_start, record_stop - record_start)
+                else:
+                    templates.pop(username, None)
+                    self._index.pop(username, None)
+            pending = []
+            self._end = stop
+
+        if pending:
+            logger.warning(f"Dropping {len(pending)} uncommitted records from {self._path}")
+        self._live_bytes = sum(size for _, size in self._index.values())
+        self._loaded = True
+        return templates
+
+    @staticmethod
+    def _torn_tail(records: list[bytes | None]) -> int:
+        """
+        Where a crashed write left records that do not decrypt, len(records) if it did not.
+
+        Only an unbroken run of bad records at the very end after at least one
+        good one counts: the key is right and nothing after them was committed.
+        A bad record followed by a good one, or a file without any good record
+        (another key), is not a torn write.
+        """
+        torn = len(records)
+        while torn > 0 and records[torn - 1] is None:
+            torn -= 1
+        return torn if torn > 0 else len(records)
+
+    def _split(self, data: bytes) -> list[tuple[int, int]]:
+        """Start and end of every complete record, a torn last record is left out."""
+        frames = []
+        start = self._HEADER.size
+        while start + self._LENGTH.size <= len(data):
+            stop = start + self._LENGTH.size + self._LENGTH.unpack_from(data, start)[0]
+            if stop > len(data):
+                break
+            frames.append((start, stop))
+            start = stop
+        return frames
+
+    def _decrypt_all(self, data: bytes, frames: list[tuple[int, int]]) -> list[bytes | None]:
+        ciphers = [data[start + self._LENGTH.size:stop] for start, stop in frames]
+        return self._crypt_mgr.decrypt_many(ciphers, threads=self._decrypt_threads, strict=False)
+
+    def _encode(self, kind: int, username: str = '', embedding: np.ndarray | None = None) -> bytes:
+        name = username.encode('utf-8')
+        record = self._KIND.pack(kind, len(name)) + name
+        if embedding is not None:
+            record += np.asarray(embedding, dtype=np.float32).reshape(self._dim).tobytes()
+        return record
+
+    def _decode(self, record: bytes) -> tuple[int, str, np.ndarray | None]:
+        kind, name_length = self._KIND.unpack_from(record)
+        name_end = self._KIND.size + name_length
+        username = record[self._KIND.size:name_end].decode('utf-8')
+        embedding = np.frombuffer(record, dtype=np.float32, offset=name_end) if kind == self._PUT else None
+        return kind, username, embedding
+
+    def _frame(self, cipher: bytes) -> bytes:
+        return self._LENGTH.pack(len(cipher)) + cipher
+
+    def _compact(self) -> None:
+        # Caller must hold self._lock
+        staging = self._path + '.tmp'
+        index = {}
+        try:
+            with open(self._path, 'rb') as src, open(staging, 'wb') as dst:
+                dst.write(self._HEADER.pack(self.MAGIC, self.VERSION, self._dim))
+                for username, (offset, size) in self._index.items():
+                    src.seek(offset)
+                    index[username] = (dst.tell(), size)
+                    dst.write(src.read(size))
+                dst.write(self._frame(self._crypt_mgr.encrypt(self._encode(self._COMMIT))))
+                end = dst.tell()
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(staging, self._path)
+        except OSError as e:
+            raise err.FileAccessError(f"Could not compact template store {self._path}") from e
+        self._fsync_directory()
+
+        logger.info(f"Compacted template store from {self._end} to {end} bytes")
+        self._index, self._end = index, end
+
+    def _fsync_directory(self) -> None:
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self._path)), os.O_RDONLY)
+        except OSError: # Directories can not be opened on Windows
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+@dataclass
+class FlushStats:
+    flushes: int = 0
+    records: int = 0 # Templates written
+    coalesced: int = 0 # Updates replaced by a newer one of the same user before they were written
+    last_ms: float = 0.0
+    max_ms: float = 0.0
+    total_ms: float = 0.0
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.flushes if self.flushes else 0.0
+
+
+class TemplateWriteBehind:
+    """
+    Buffers template writes and commits them to a TemplateStore in batches.
+
+    write() and delete() only keep the latest change per user, so any number
+    of updates of one user between two flushes cost a single record. A
+    background thread commits everything buffered as one transaction (one
+    fsync) every flush_interval seconds. flush() commits right away and
+    close() writes what is left. A failed flush keeps its batch for the next
+    one, unless a newer update of the same user arrived in the meantime.
+    """
+
+    def __init__(self, store: TemplateStore, flush_interval: float = 5.0):
+        self._store = store
+        self._flush_interval = flush_interval
+        self._pending: dict[str, np.ndarray | None] = {} # None deletes the user
+        self._lock = Lock()
+        self._flush_lock = Lock() # One commit at a time
+        self._closing = Event()
+        self.stats = FlushStats()
+        self._thread = Thread(target=self._run, name='TemplateWriteBehind', daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def write(self, username: str, embedding: np.ndarray) -> None:
+        with self._lock:
+            if username in self._pending:
+                self.stats.coalesced += 1
+            self._pending[username] = embedding
+
+    def delete(self, username: str) -> None:
+        """Deletes the user with the next flush, replacing any update still buffered."""
+        with self._lock:
+            self._pending[username] = None
+
+    def flush(self) -> int:
+        """Commits the buffered templates and deletes, returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                self._store.commit(puts={username: embedding for username, embedding in batch.items() if embedding is not None},
+                                   deletes=[username for username, embedding in batch.items() if embedding is None])
+            except Exception: # Whatever failed, the batch is kept for the next flush
+                with self._lock:
+                    self._pending = {**batch, **self._pending}
+                raise
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            stats = self.stats
+            stats.flushes += 1
+            stats.records += len(batch)
+            stats.last_ms = elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.total_ms += elapsed_ms
+            logger.debug(f"Flushed {len(batch)} templates in {elapsed_ms:.1f}ms")
+            return len(batch)
+
+    def discard(self) -> None:
+        """Drops the buffered templates, waits for a flush that is already writing."""
+        with self._flush_lock, self._lock:
+            self._pending = {}
+
+    def close(self) -> None:
+        if self._closing.is_set():
+            return
+        self._closing.set()
+        self._thread.join()
+        self.flush()
+        stats = self.stats
+        logger.info(f"Template writer closed after {stats.flushes} flushes, {stats.records} templates written, "
+                    f"{stats.coalesced} updates coalesced, mean flush {stats.mean_ms:.1f}ms, max {stats.max_ms:.1f}ms")
+
+    def _run(self) -> None:
+        while not self._closing.wait(self._flush_interval):
+            try:
+                self.flush()
+            except Exception as e: # The thread must outlive any one failure or later updates are never written
+                logger.error(f"Template flush failed, retrying in {self._flush_interval}s: {e}")
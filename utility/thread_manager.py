@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from threading import Thread, Event
 from utility.logger import get_logger
+from utility.worker_pool import WorkerPool, WorkerPoolStats
 import utility.errors as err
 from enum import Enum
 
@@ -18,8 +19,32 @@ class ThreadEvent:
     stop_event: Event
 
 class ThreadManager:
+    # Long-running loops get a named thread and a stop event.
+    # Short tasks go to named worker pools, see get_worker_pool().
+
     def __init__(self) -> None:
         self.active_threads: dict[str, ThreadEvent] = {}
+        self.worker_pools: dict[str, WorkerPool] = {}
+
+    def get_worker_pool(self, name: str, max_workers: int = 1, max_queue: int = 0) -> WorkerPool:
+        """The worker pool called name, created with max_workers and max_queue on first use."""
+        pool = self.worker_pools.get(name)
+        if pool is None:
+            pool = WorkerPool(name=name, max_workers=max_workers, max_queue=max_queue)
+            self.worker_pools[name] = pool
+        return pool
+
+    def worker_pool_stats(self) -> list[WorkerPoolStats]:
+        return [pool.stats for pool in self.worker_pools.values()]
+
+    def shutdown_worker_pools(self, cancel_futures: bool = True) -> None:
+        for name in list(self.worker_pools.keys()):
+            pool = self.worker_pools.pop(name)
+            pool.shutdown(cancel_futures=cancel_futures)
+            stats = pool.stats
+            logger.debug(f"Worker pool {name}: {stats.completed} done, {stats.failed} failed, {stats.cancelled} cancelled, "
+                         f"{stats.rejected} rejected, max queue {stats.max_queued}, mean wait {stats.mean_wait_ms:.1f}ms, "
+                         f"utilization {stats.utilization:.1%}")
 
     def create_new_thread(self, target: callable, name: str, args: tuple=(), autostart=False) -> str | None:
         if name in self.active_threads:
@@ -0,0 +1,70 @@
+import numpy as np
+from utility.audio_filtration import pcm16_to_float32
+
+class UtteranceBuffer:
+    """
+    Growable float32 buffer that accumulates the speech frames of one utterance.
+
+    Frames arrive as int16 PCM and are converted once on append. Capacity doubles
+    when full and is kept across clear(), so a long-running pipeline settles on
+    a single allocation. view() returns read-only slices of the same memory, so
+    the wake check, biometric match and transcription never copy the audio.
+    A view stays valid after the buffer grows, but clear() lets later appends
+    overwrite it.
+    """
+
+    def __init__(self, initial_capacity: int) -> None:
+        if initial_capacity <= 0:
+            raise ValueError("Utterance buffer capacity must be positive.")
+
+        self._data = np.zeros(initial_capacity, dtype=np.float32)
+        self._length = 0
+        self._frame_count = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def frame_count(self) -> int:
+        return self._frame_count
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    def append_pcm16(self, frame) -> None:
+        pcm = np.frombuffer(frame, dtype=np.int16)
+        end = self._length + len(pcm)
+        self._reserve(end)
+
+        pcm16_to_float32(pcm, out=self._data[self._length:end])
+        self._length = end
+        self._frame_count += 1
+
+    def view(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        stop = self._length if stop is None else min(stop, self._length)
+        view = self._data[start:stop]
+        view.flags.writeable = False
+        return view
+
+    def head(self, samples: int) -> np.ndarray:
+        return self.view(0, samples)
+
+    def tail(self, samples: int) -> np.ndarray:
+        return self.view(max(0, self._length - samples))
+
+    def clear(self) -> None:
+        self._length = 0
+        self._frame_count = 0
+
+    def _reserve(self, required: int) -> None:
+        if required <= len(self._data):
+            return
+
+        capacity = len(self._data)
+        while capacity < required:
+            capacity *= 2
+
+        grown = np.zeros(capacity, dtype=np.float32)
+        grown[:self._length] = self._data[:self._length]
+        self._data = grown
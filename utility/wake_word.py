@@ -0,0 +1,270 @@
+from abc import ABC, abstractmethod
+from io import BytesIO
+import os
+import numpy as np
+from scipy.fft import dct
+from config.input_pipe_config import WakeWordConfig
+import stubs.wake_up_detection as wud
+from utility.encrypt import CryptManager
+from utility.logger import get_logger
+import utility.errors as err
+
+logger = get_logger(__name__)
+
+class WakeWordDetector(ABC):
+    """Decides whether an utterance starts with the wake word."""
+
+    needs_transcript: bool = False # True when detect() needs the ASR transcript of the audio
+
+    @property
+    def ready(self) -> bool:
+        return True
+
+    @abstractmethod
+    def detect(self, audio: np.ndarray, transcript: str = '') -> bool:
+        """Checks a whole clip of float32 audio."""
+
+    def push(self, audio: np.ndarray) -> bool:
+        """
+        Feeds the next piece of the utterance, returns True once the wake word was heard.
+
+        Detectors that need a transcript can not spot the wake word while audio
+        arrives and always return False, callers check needs_transcript first.
+        """
+        return False
+
+    def reset(self) -> None:
+        """Forgets the audio pushed so far."""
+
+    def enroll(self, samples: list[np.ndarray]) -> None:
+        """Learns the wake word from utterances collected during template generation."""
+
+
+class TranscriptWakeWordDetector(WakeWordDetector):
+    """Fuzzy matches the wake phrase in the Whisper transcript."""
+
+    needs_transcript = True
+
+    def detect(self, audio: np.ndarray, transcript: str = '') -> bool:
+        return wud.wake_up_detection_stub(ip=transcript)
+
+
+def mel_filterbank(sample_rate: int, n_fft: int, n_mels: int, low_hz: float, high_hz: float) -> np.ndarray:
+    """(n_mels, n_fft // 2 + 1) triangular filters, evenly spaced on the mel scale."""
+    to_mel = lambda hz: 2595 * np.log10(1 + hz / 700)
+    to_hz = lambda mel: 700 * (10 ** (mel / 2595) - 1)
+
+    edges = to_hz(np.linspace(to_mel(low_hz), to_mel(high_hz), n_mels + 2))
+    freqs = np.fft.rfftfreq(n_fft, d=1 / sample_rate)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (freqs - lower) / (center - lower)
+    falling = (upper - freqs) / (upper - center)
+    return np.maximum(0, np.minimum(rising, falling)).astype(np.float32)
+
+
+class MFCCExtractor:
+    """
+    MFCCs for streamed audio, frames that straddle two pushes are kept for the next one.
+
+    c0 is dropped so the features do not depend on loudness.
+    """
+
+    _EPSILON = 1e-10
+    _PRE_EMPHASIS = 0.97
+
+    def __init__(self, sample_rate: int, n_mfcc: int = 13, n_mels: int = 26, frame_ms: int = 25, hop_ms: int = 10,
+                 low_hz: float = 100.0, high_hz: float | None = None):
+        self._frame = int(sample_rate * frame_ms / 1000)
+        self._hop = int(sample_rate * hop_ms / 1000)
+        self._n_fft = 1 << (self._frame - 1).bit_length()
+        self._n_mfcc = n_mfcc
+        self._window = np.hamming(self._frame).astype(np.float32)
+        self._filterbank = mel_filterbank(sample_rate, self._n_fft, n_mels, low_hz, high_hz or sample_rate / 2)
+        self.reset()
+
+    @property
+    def n_features(self) -> int:
+        return self._n_mfcc - 1
+
+    def reset(self) -> None:
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._last_sample = 0.0
+
+    def __call__(self, audio: np.ndarray) -> np.ndarray:
+        """MFCCs of a whole clip."""
+        self.reset()
+        features = self.push(audio)
+        self.reset()
+        return features
+
+    def push(self, audio: np.ndarray) -> np.ndarray:
+        """(n_frames, n_features) features of every frame completed by audio."""
+        audio = np.asarray(audio, dtype=np.float32)
+        if len(audio) == 0:
+            return np.zeros((0, self.n_features), dtype=np.float32)
+
+        emphasized = np.empty_like(audio)
+        emphasized[0] = audio[0] - self._PRE_EMPHASIS * self._last_sample
+        emphasized[1:] = audio[1:] - self._PRE_EMPHASIS * audio[:-1]
+        self._last_sample = float(audio[-1])
+
+        samples = np.concatenate([self._pending, emphasized])
+        n_frames = 0 if len(samples) < self._frame else 1 + (len(samples) - self._frame) // self._hop
+        self._pending = samples[n_frames * self._hop:]
+        if n_frames == 0:
+            return np.zeros((0, self.n_features), dtype=np.float32)
+
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self._frame)[::self._hop][:n_frames]
+        power = np.abs(np.fft.rfft(frames * self._window, n=self._n_fft, axis=1)) ** 2
+        log_mel = np.log(power @ self._filterbank.T + self._EPSILON)
+        return dct(log_mel, type=2, norm='ortho', axis=1)[:, 1:self._n_mfcc].astype(np.float32)
+
+
+def subsequence_dtw(query: np.ndarray, series: np.ndarray) -> float:
+    """
+    Lowest mean frame distance of query aligned to any stretch of series.
+
+    Frames are compared by cosine distance. Steps of (1,1), (1,2) and (2,1)
+    let the speaking rate vary between half and twice the query's, and keep
+    every row of the cost matrix a pure function of the two rows above it,
+    so each row is computed with one vectorized update.
+    """
+    m, n = len(query), len(series)
+    if m == 0 or n < (m + 1) // 2:
+        return np.inf
+
+    unit = lambda x: x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-10)
+    cost = 1.0 - unit(query) @ unit(series).T
+
+    two_back = np.full(n, np.inf)
+    one_back = cost[0].copy() # The match may start anywhere in series
+    for i in range(1, m):
+        best = np.full(n, np.inf)
+        best[1:] = one_back[:-1]
+        best[2:] = np.minimum(best[2:], one_back[:-2])
+        best[1:] = np.minimum(best[1:], two_back[:-1])
+        two_back, one_back = one_back, cost[i] + best
+
+    return float(one_back.min() / m)
+
+
+class KeywordSpotter(WakeWordDetector):
+    """
+    Spots the wake word without ASR by matching MFCCs against the enrollment utterances.
+
+    push() extracts features for each new piece of audio and scores the most
+    recent window (twice the longest enrollment utterance) against every
+    template with subsequence DTW. Features are mean-normalized per window and
+    per template, so channel and loudness differences cancel out. The wake word
+    is detected once the best score is at or below threshold; last_score holds
+    the latest score for tuning.
+    """
+
+    def __init__(self, config: WakeWordConfig, sample_rate: int, templates: list[np.ndarray] | None = None):
+        self._config = config
+        self._extractor = MFCCExtractor(sample_rate=sample_rate,
+                                        n_mfcc=config.n_mfcc,
+                                        n_mels=config.n_mels,
+                                        frame_ms=config.frame_ms,
+                                        hop_ms=config.hop_ms)
+        self.threshold = config.threshold
+        self.last_score = np.inf
+        self._templates: list[np.ndarray] = []
+        self._set_templates(templates or [])
+        self.reset()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._templates)
+
+    @property
+    def templates(self) -> list[np.ndarray]:
+        return list(self._templates)
+
+    def reset(self) -> None:
+        self._extractor.reset()
+        self._features = np.zeros((0, self._extractor.n_features), dtype=np.float32)
+        self.last_score = np.inf
+
+    def detect(self, audio: np.ndarray, transcript: str = '') -> bool:
+        return self.score(self._extractor(audio)) <= self.threshold
+
+    def push(self, audio: np.ndarray) -> bool:
+        features = self._extractor.push(audio)
+        if len(features) == 0:
+            return self.last_score <= self.threshold
+
+        self._features = np.concatenate([self._features, features])[-self._window:]
+        self.last_score = self.score(self._features)
+        return self.last_score <= self.threshold
+
+    def score(self, features: np.ndarray) -> float:
+        if not self._templates or len(features) == 0:
+            return np.inf
+        features = features - features.mean(axis=0)
+        return min(subsequence_dtw(template, features) for template in self._templates)
+
+    def features(self, audio: np.ndarray) -> np.ndarray:
+        """MFCCs of a whole enrollment clip, as add_templates() takes them."""
+        return self._extractor(audio)
+
+    def enroll(self, samples: list[np.ndarray]) -> None:
+        self.add_templates([self.features(sample) for sample in samples])
+
+    def add_templates(self, templates: list[np.ndarray]) -> None:
+        """Adds templates next to those of users enrolled before."""
+        self._set_templates(self._templates + list(templates))
+        self.reset()
+
+    def save(self, path: str, crypt_mgr: CryptManager) -> None:
+        buffer = BytesIO()
+        np.savez(buffer, *self._templates)
+        try:
+            with open(path, 'wb') as f:
+                f.write(crypt_mgr.encrypt(buffer.getvalue()))
+        except OSError as e:
+            raise err.FileAccessError(f"Could not save keyword templates to {path}") from e
+
+    def load(self, path: str, crypt_mgr: CryptManager) -> None:
+        """Loads templates saved by save(), a missing file leaves the spotter unenrolled."""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'rb') as f:
+                archive = np.load(BytesIO(crypt_mgr.decrypt(f.read())), allow_pickle=False)
+            self._set_templates([archive[name] for name in archive.files])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping keyword templates {path} due to error: {e}")
+
+    def _set_templates(self, templates: list[np.ndarray]) -> None:
+        self._templates = [template - template.mean(axis=0) for template in templates if len(template) > 0]
+        longest = max((len(template) for template in self._templates), default=0)
+        self._window = max(1, 2 * longest)
+
+
+class EnrolledKeywordSpotter(KeywordSpotter):
+    """KeywordSpotter whose templates live encrypted in the user data directory."""
+
+    def __init__(self, config: WakeWordConfig, sample_rate: int, path: str, crypt_mgr: CryptManager):
+        super().__init__(config=config, sample_rate=sample_rate)
+        self._path = path
+        self._crypt_mgr = crypt_mgr
+        self.load(path, crypt_mgr)
+
+    def add_templates(self, templates: list[np.ndarray]) -> None:
+        super().add_templates(templates)
+        self.save(self._path, self._crypt_mgr)
+        logger.info(f"Keyword spotter enrolled with {len(self._templates)} utterances")
+
+
+def create_wake_word_detector(config_mgr) -> WakeWordDetector:
+    config = config_mgr.wake_word_config
+    if config.engine == 'transcript':
+        return TranscriptWakeWordDetector()
+    if config.engine == 'keyword':
+        return EnrolledKeywordSpotter(config=config,
+                                      sample_rate=config_mgr.audio_config.sample_rate,
+                                      path=os.path.join(config_mgr.basic_info.usr_data_dir, config.template_file),
+                                      crypt_mgr=CryptManager(config=config_mgr))
+
+    raise ValueError(f"Unknown wake word engine: {config.engine}")
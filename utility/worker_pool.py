@@ -0,0 +1,177 @@
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from enum import IntEnum
+import heapq
+import itertools
+import time
+from threading import Condition, Thread
+from utility.logger import get_logger
+import utility.errors as err
+
+logger = get_logger(__name__)
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 10
+    LOW = 20
+
+
+@dataclass
+class WorkerPoolStats:
+    name: str
+    workers: int # Started so far, at most max_workers
+    max_workers: int
+    queued: int
+    active: int
+    max_queued: int # Deepest the queue has been
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    rejected: int = 0
+    busy_seconds: float = 0.0
+    utilization: float = 0.0 # Share of max_workers * lifetime spent running tasks
+    mean_wait_ms: float = 0.0
+    max_wait_ms: float = 0.0
+
+
+@dataclass
+class _WorkItem:
+    future: Future
+    fn: callable
+    args: tuple
+    kwargs: dict
+    submitted: float
+
+
+class WorkerPool(Executor):
+    """
+    Named, bounded pool of worker threads that run tasks by priority.
+
+    Workers are started on demand up to max_workers and then kept, so
+    submitting a task never creates a thread once the pool is warm, and task
+    names can not collide. Lower Priority values run first, equal priorities
+    in submission order. With max_queue set, submit() raises
+    WorkerPoolFullError instead of queueing more than max_queue tasks, tasks
+    cancelled while queued do not count. Futures carry the result or
+    exception, cancelling one that has not started yet keeps it from running.
+    """
+
+    def __init__(self, name: str, max_workers: int = 1, max_queue: int = 0):
+        if max_workers < 1:
+            raise ValueError("A worker pool needs at least one worker")
+        self.name = name
+        self._max_workers = max_workers
+        self._max_queue = max_queue
+        self._queue: list[tuple[int, int, _WorkItem]] = []
+        self._order = itertools.count()
+        self._condition = Condition()
+        self._threads: list[Thread] = []
+        self._idle = 0
+        self._active = 0
+        self._shutdown = False
+        self._created = time.perf_counter()
+        self._stats = WorkerPoolStats(name=name, workers=0, max_workers=max_workers, queued=0, active=0, max_queued=0)
+        self._wait_seconds = 0.0
+
+    def submit(self, fn, /, *args, priority: int = Priority.NORMAL, **kwargs) -> Future:
+        """Queues fn(*args, **kwargs). priority is taken by the pool and not passed on to fn."""
+        with self._condition:
+            if self._shutdown:
+                raise err.WorkerPoolShutdownError(f"Worker pool {self.name} is shut down")
+            if self._max_queue and len(self._queue) >= self._max_queue:
+                self._drop_cancelled()
+            if self._max_queue and len(self._queue) >= self._max_queue:
+                self._stats.rejected += 1
+                raise err.WorkerPoolFullError(f"Worker pool {self.name} already has {len(self._queue)} queued tasks")
+
+            future = Future()
+            heapq.heappush(self._queue, (priority, next(self._order), _WorkItem(future, fn, args, kwargs, time.perf_counter())))
+            self._stats.submitted += 1
+            self._stats.max_queued = max(self._stats.max_queued, len(self._queue))
+            if self._idle < len(self._queue) and len(self._threads) < self._max_workers:
+                self._start_worker()
+            self._condition.notify()
+            return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._condition:
+            self._shutdown = True
+            if cancel_futures:
+                for _, _, item in self._queue:
+                    if item.future.cancel():
+                        self._stats.cancelled += 1
+                self._queue.clear()
+            self._condition.notify_all()
+            threads = list(self._threads)
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    @property
+    def stats(self) -> WorkerPoolStats:
+        with self._condition:
+            stats = WorkerPoolStats(**vars(self._stats))
+            stats.workers = len(self._threads)
+            stats.queued = len(self._queue)
+            stats.active = self._active
+            started = stats.completed + stats.failed
+            stats.mean_wait_ms = 1000 * self._wait_seconds / started if started else 0.0
+        lifetime = time.perf_counter() - self._created
+        stats.utilization = stats.busy_seconds / (self._max_workers * lifetime) if lifetime > 0 else 0.0
+        return stats
+
+    def _drop_cancelled(self) -> None:
+        # Caller must hold self._condition. Cancelled tasks otherwise take queue slots until a worker pops them
+        live = [entry for entry in self._queue if not entry[2].future.cancelled()]
+        self._stats.cancelled += len(self._queue) - len(live)
+        heapq.heapify(live)
+        self._queue = live
+
+    def _start_worker(self) -> None:
+        # Caller must hold self._condition
+        thread = Thread(target=self._work, name=f"{self.name}_{len(self._threads)}", daemon=True)
+        self._threads.append(thread)
+        self._idle += 1
+        thread.start()
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+                if not self._queue: # Shut down and drained
+                    self._idle -= 1
+                    return
+                _, _, item = heapq.heappop(self._queue)
+                if not item.future.set_running_or_notify_cancel():
+                    self._stats.cancelled += 1
+                    continue
+                waited = time.perf_counter() - item.submitted
+                self._wait_seconds += waited
+                self._stats.max_wait_ms = max(self._stats.max_wait_ms, 1000 * waited)
+                self._idle -= 1
+                self._active += 1
+
+            start = time.perf_counter()
+            result, error = None, None
+            try:
+                result = item.fn(*item.args, **item.kwargs)
+            except BaseException as e:
+                error = e
+
+            with self._condition: # Idle again before the caller sees the result, so its next task reuses this worker
+                self._active -= 1
+                self._idle += 1
+                self._stats.busy_seconds += time.perf_counter() - start
+                if error is None:
+                    self._stats.completed += 1
+                else:
+                    self._stats.failed += 1
+
+            if error is None:
+                item.future.set_result(result)
+            else:
+                item.future.set_exception(error)
+            del item, result, error # Drops the task's arguments and result before waiting for the next one